@@ -0,0 +1,151 @@
+'''
+Benchmark of the crawler against the local genexus server
+
+Reports revisions/s, requests/s, peak memory and insert rate of SQLite
+for GxCrawler.get_data and Process.capture_data in several modes.
+
+Ex: python benchmarks/bench_crawler.py --days 7 --latency 0.02
+    python benchmarks/bench_crawler.py --json results.json
+'''
+import os
+import sys
+import json
+import time
+import datetime
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'gxcrawler'))
+
+from fakeserver import FakeGxServer  # noqa: E402
+from gxcrawler import GxCrawler  # noqa: E402
+from database import DataBase  # noqa: E402
+from process import Process  # noqa: E402
+from config import Config  # noqa: E402
+
+
+CRAWLER_SCENARIOS = {
+    'serial': {},
+    'workers-8': {'max_workers': 8},
+    'adaptive-page': {'max_workers': 8, 'adaptive_page_size': True},
+    'adaptive-concurrency': {'max_workers': 16,
+                             'adaptive_concurrency': True},
+}
+
+PROCESS_SCENARIOS = {
+    'default': {},
+    'stream-workers-8': {'stream': True, 'max_workers': 8},
+    'pipeline-8': {'pipeline': True, 'max_workers': 8},
+}
+
+
+def measure(server, function):
+    '''
+    Run the function measuring time, requests and peak memory
+    Returns:
+    -------
+        result, measures: Tuple<Any, Dict>
+    '''
+    requests_before = sum(server.requests.values())
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    requests = sum(server.requests.values()) - requests_before
+    return result, {
+        'seconds': seconds,
+        'requests': requests,
+        'requests_per_second': requests / seconds,
+        'peak_memory_mb': peak / 1024 / 1024,
+    }
+
+
+def bench_crawler(server, initial_date, final_date):
+    '''
+    Benchmark of GxCrawler.get_data
+    '''
+    results = {}
+    for name, options in CRAWLER_SCENARIOS.items():
+        gxcrawler = GxCrawler('user', 'password', server.url_base,
+                              server.kb_name, **options)
+        pages, measures = measure(
+            server, lambda: gxcrawler.get_data(initial_date, final_date))
+        revisions = sum(len(page) for page in pages)
+        measures['revisions'] = revisions
+        measures['revisions_per_second'] = revisions / measures['seconds']
+        results[f'get_data/{name}'] = measures
+    return results
+
+
+def bench_process(server, initial_date, final_date):
+    '''
+    Benchmark of Process.capture_data, with a new database per scenario
+    '''
+    os.environ.update({'GX_USER': 'user', 'GX_PASSWORD': 'password',
+                       'GX_URL': server.url_base, 'GX_KBNAME': server.kb_name})
+    config = Config(method='ENV')
+    results = {}
+    cwd = os.getcwd()
+    for name, options in PROCESS_SCENARIOS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                DataBase().construct_schema()
+                process = Process(**options)
+                _, measures = measure(
+                    server, lambda: process.capture_data(
+                        initial_date, final_date, config=config))
+            finally:
+                os.chdir(cwd)
+        revisions = process.statistics['revisions']
+        measures['revisions'] = revisions
+        measures['revisions_per_second'] = revisions / measures['seconds']
+        measures['insert_rows_per_second'] = \
+            process.statistics['rows_per_second']
+        results[f'capture_data/{name}'] = measures
+    return results
+
+
+def print_results(results):
+    print(f'{"scenario":<32}{"revisions/s":>12}{"requests/s":>12}'
+          f'{"peak MB":>10}{"insert rows/s":>15}')
+    for name, measures in results.items():
+        insert = measures.get('insert_rows_per_second')
+        insert = f'{insert:>15.0f}' if insert is not None else f'{"-":>15}'
+        print(f'{name:<32}{measures["revisions_per_second"]:>12.1f}'
+              f'{measures["requests_per_second"]:>12.1f}'
+              f'{measures["peak_memory_mb"]:>10.2f}{insert}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--revisions-per-day', type=int, default=50)
+    parser.add_argument('--objects-per-revision', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='seconds added to each response')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='requests answered at the same time, the '
+                             'others fail with status 503')
+    parser.add_argument('--json', help='file to write the results')
+    args = parser.parse_args()
+
+    final_day = datetime.datetime(2020, 11, 30)
+    first_day = final_day - datetime.timedelta(days=args.days - 1)
+    with FakeGxServer(revisions_per_day=args.revisions_per_day,
+                      objects_per_revision=args.objects_per_revision,
+                      latency=args.latency,
+                      max_in_flight=args.max_in_flight,
+                      last_day=final_day.date()) as fake_server:
+        bench_results = bench_crawler(fake_server, first_day, final_day)
+        bench_results.update(bench_process(fake_server, first_day,
+                                           final_day))
+
+    print_results(bench_results)
+    if args.json:
+        with open(args.json, 'w') as f_results:
+            json.dump(bench_results, f_results, indent=2)
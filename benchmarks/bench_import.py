@@ -0,0 +1,135 @@
+'''
+Benchmark of the start of the command line
+
+Runs each command in a new interpreter and reports the median and the
+minimum of the wall time, with the time of the interpreter alone, the
+import of the modules and the commands of database of gxcrawler/cli.py,
+which must not import requests and lxml. With --importtime the slowest
+imports of each command are listed (python -X importtime).
+
+Ex: python benchmarks/bench_import.py --repeat 20
+    python benchmarks/bench_import.py --importtime --json results.json
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+GXCRAWLER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                         'gxcrawler')
+CLI = os.path.join(GXCRAWLER, 'cli.py')
+
+sys.path.insert(0, GXCRAWLER)
+
+from database import DataBase  # noqa: E402
+from bench_queries import generate_revisions  # noqa: E402
+
+
+def get_commands(database_path, directory):
+    '''
+    Commands of the benchmark
+    Returns:
+    -------
+        commands: Dict<String, List<String>>
+    '''
+    cli = [sys.executable, CLI, '--database', database_path]
+    return {
+        'python': [sys.executable, '-c', 'pass'],
+        'import database': [sys.executable, '-c', 'import database'],
+        'import process': [sys.executable, '-c', 'import process'],
+        'cli --help': [sys.executable, CLI, '--help'],
+        'cli init-db': cli + ['init-db'],
+        'cli query revision': cli + ['query', 'revision', '100'],
+        'cli query search': cli + ['query', 'search', 'invoice'],
+        'cli query activity': cli + ['query', 'activity', '2020-11-01',
+                                     '2020-11-30'],
+        'cli export': cli + ['export', os.path.join(directory, 'e.jsonl.gz'),
+                             '--since-build', '990'],
+    }
+
+
+def run(command, repeat):
+    '''
+    Wall time of the command, in milliseconds
+    Returns:
+    -------
+        times: List<float>
+    '''
+    environment = dict(os.environ, PYTHONPATH=GXCRAWLER)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=environment, cwd=GXCRAWLER, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def get_imports(command, limit=5, exclude=()):
+    '''
+    Slowest imports of the command, by cumulative time of python
+    -X importtime
+    Params:
+    ------
+        exclude: Iterable<String> (modules of the start of the interpreter)
+    Returns:
+    -------
+        imports: List<Tuple<String, float>> (module and milliseconds)
+    '''
+    environment = dict(os.environ, PYTHONPATH=GXCRAWLER)
+    process = subprocess.run(
+        [command[0], '-X', 'importtime'] + command[1:], env=environment,
+        cwd=GXCRAWLER, check=True, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, text=True)
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        # Only the imports of top level
+        if module.startswith('  ') or module.strip() in exclude:
+            continue
+        imports.append((module.strip(), int(cumulative) / 1000))
+    return sorted(imports, key=lambda item: -item[1])[:limit]
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    arg_parser.add_argument('--importtime', action='store_true',
+                            help='list the slowest imports of each command')
+    arg_parser.add_argument('--json', help='file to write the results')
+    args = arg_parser.parse_args()
+
+    bench_results = {}
+    with tempfile.TemporaryDirectory() as bench_directory:
+        bench_path = os.path.join(bench_directory, 'database.db')
+        bench_database = DataBase(bench_path)
+        bench_database.construct_schema()
+        bench_database.insert_revisions(
+            generate_revisions(1000, 5, 500, 10, 30), batch_size=1000)
+        bench_database.conn.close()
+
+        bench_commands = get_commands(bench_path, bench_directory)
+        startup = [module for module, _ in get_imports(
+            bench_commands['python'], limit=None)] + ['site']
+        print(f'{"command":<22}{"median ms":>12}{"min ms":>10}')
+        for name, bench_command in bench_commands.items():
+            bench_times = run(bench_command, args.repeat)
+            bench_results[name] = {'median_ms': statistics.median(bench_times),
+                                   'min_ms': min(bench_times)}
+            print(f'{name:<22}{bench_results[name]["median_ms"]:>12.1f}'
+                  f'{bench_results[name]["min_ms"]:>10.1f}')
+            if args.importtime:
+                bench_results[name]['imports'] = get_imports(
+                    bench_command, exclude=startup)
+                for module, milliseconds in bench_results[name]['imports']:
+                    print(f'    {module:<30}{milliseconds:>8.1f}')
+
+    if args.json:
+        with open(args.json, 'w') as f_results:
+            json.dump(bench_results, f_results, indent=2)
@@ -0,0 +1,156 @@
+'''
+Micro-benchmark of the parsing of the responses of the genexus server
+
+Compares the previous parsing (json decoded for the count and again for
+the rows, keys built for each value) with ResponseParser, on large pages
+of the grid and revisions with many objects, or on the responses
+recorded by a ResponseCache.
+
+Ex: python benchmarks/bench_parser.py --rows 320 --objects 999
+    python benchmarks/bench_parser.py --cache cache
+'''
+import os
+import sys
+import json
+import gzip
+import timeit
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'gxcrawler'))
+
+import response_parser  # noqa: E402
+from response_parser import ResponseParser, REVISION_FIELDS, \
+    OBJECT_FIELDS  # noqa: E402
+from fakeserver import FakeGxServer  # noqa: E402
+
+
+def previous_grid(text):
+    '''
+    Parsing of a page of the grid before ResponseParser
+    '''
+    grids = json.loads(text).get('gxGrids')
+    count = grids[0]['Count'] if grids else 0
+    rows = []
+    for res in json.loads(text)['gxValues']:
+        for commit in range(1, count + 1):
+            rows.append((commit, {field: res[f'{prefix}{str(commit).zfill(4)}']
+                                  for prefix, field in REVISION_FIELDS}))
+    return rows
+
+
+def previous_objects(text, limit=1000):
+    '''
+    Parsing of the objects of a revision before ResponseParser
+    '''
+    values = json.loads(text)['gxValues'][1]
+    objects = []
+    row = 1
+    while row < limit:
+        if f'{OBJECT_FIELDS[0][0]}{str(row).zfill(4)}' not in values.keys():
+            break
+        objects.append({field: values[f'{prefix}{str(row).zfill(4)}']
+                        for prefix, field in OBJECT_FIELDS})
+        row += 1
+    return objects
+
+
+def parser_grid(parser, content):
+    response_json = parser.loads(content)
+    return parser.get_rows(response_json, parser.get_count(response_json))
+
+
+def parser_objects(parser, content):
+    return parser.get_objects(parser.loads(content))
+
+
+def generate_responses(rows, objects):
+    '''
+    Large responses of the local server
+    Returns:
+    -------
+        grids, objects: Tuple<List<bytes>, List<bytes>>
+    '''
+    day = datetime.date(2020, 11, 30)
+    server = FakeGxServer(revisions_per_day=rows, objects_per_revision=objects,
+                          last_day=day)
+    try:
+        grid = json.dumps(server.get_grid(rows, 1, day, day)).encode('utf-8')
+        revision = json.dumps(
+            server.get_objects(day.toordinal() * rows)).encode('utf-8')
+    finally:
+        server.stop()
+    return [grid], [revision]
+
+
+def load_cache(directory):
+    '''
+    Responses recorded by a ResponseCache
+    Returns:
+    -------
+        grids, objects: Tuple<List<bytes>, List<bytes>>
+    '''
+    grids, objects = [], []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith('.json.gz'):
+                continue
+            with gzip.open(os.path.join(root, name), 'rt',
+                           encoding='utf-8') as f_cache:
+                entry = json.load(f_cache)
+            text = entry['text']
+            if '"gxGrids"' in text:
+                grids.append(text.encode('utf-8'))
+            elif 'W0077v' in text:
+                objects.append(text.encode('utf-8'))
+    return grids, objects
+
+
+def bench(name, function, responses, number):
+    if not responses:
+        return
+    seconds = min(timeit.repeat(
+        lambda: [function(response) for response in responses],
+        number=number, repeat=5)) / number
+    size = sum(len(response) for response in responses) / 1024 / 1024
+    print(f'{name:<28}{seconds * 1000:>10.3f} ms{size / seconds:>10.1f} MB/s')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arg_parser.add_argument('--rows', type=int, default=320,
+                            help='rows of the page of the grid')
+    arg_parser.add_argument('--objects', type=int, default=999,
+                            help='objects of the revision')
+    arg_parser.add_argument('--cache', help='directory of a ResponseCache')
+    arg_parser.add_argument('--number', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    if args.cache:
+        grid_responses, object_responses = load_cache(args.cache)
+    else:
+        grid_responses, object_responses = generate_responses(args.rows,
+                                                              args.objects)
+    print(f'{len(grid_responses)} pages of grid, {len(object_responses)} '
+          f'responses of objects')
+
+    backends = [('json', None)]
+    if response_parser.orjson is not None:
+        backends.append(('orjson', response_parser.orjson))
+    orjson = response_parser.orjson
+    try:
+        bench('grid/previous', previous_grid, grid_responses, args.number)
+        bench('objects/previous', previous_objects, object_responses,
+              args.number)
+        for backend, module in backends:
+            response_parser.orjson = module
+            parser = ResponseParser()
+            bench(f'grid/parser-{backend}',
+                  lambda content: parser_grid(parser, content),
+                  grid_responses, args.number)
+            bench(f'objects/parser-{backend}',
+                  lambda content: parser_objects(parser, content),
+                  object_responses, args.number)
+    finally:
+        response_parser.orjson = orjson
@@ -0,0 +1,169 @@
+'''
+Benchmark of the queries of DataBase on a large synthetic database
+
+Writes millions of generated rows of revision_objects and measures the
+queries of history without the secondary indexes, the time to create
+them after the ingestion and the queries with them.
+
+The search by words is compared with LIKE over revision and
+revision_objects, and the rollup tables with the GROUP BY of the whole
+history.
+
+Ex: python benchmarks/bench_queries.py --revisions 500000 --objects 6
+    python benchmarks/bench_queries.py --storage normalized
+'''
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'gxcrawler'))
+
+from database import DataBase  # noqa: E402
+
+
+OBJECT_TYPES = ('Procedure', 'Transaction', 'WebPanel', 'DataProvider',
+                'SDT', 'Domain')
+WORDS = tuple(f'{prefix}{suffix}' for prefix in (
+    'fix', 'add', 'remove', 'change', 'refactor', 'invoice', 'customer',
+    'report', 'tax', 'order', 'stock', 'price', 'login', 'grid', 'export',
+    'import', 'layout', 'rule', 'event', 'query') for suffix in (
+    '', 'ed', 'ing', 's', 'er'))
+
+
+def generate_revisions(revisions, objects_per_revision, distinct_objects,
+                       users, days):
+    '''
+    Revisions in the format of GxCrawler, spread over the days before
+    2020-11-30
+    Returns:
+    -------
+        revisions: Generator<Dict>
+    '''
+    generator = random.Random(0)
+    last_day = datetime.datetime(2020, 11, 30, 23, 59)
+    minutes = days * 24 * 60
+    for build in range(1, revisions + 1):
+        date = last_day - datetime.timedelta(
+            minutes=minutes * (revisions - build) // revisions)
+        user = f'user{generator.randrange(users)}'
+        entities = generator.sample(range(distinct_objects),
+                                    objects_per_revision)
+        yield {
+            'revision_build': build,
+            'revision_date': date.strftime('%m/%d/%y %I:%M %p'),
+            'revision_seconds': build % 60,
+            'revision_user': user,
+            'revision_comment': ' '.join(generator.sample(WORDS, 6)),
+            'revision_name': f'Revision {build}',
+            'revision_operation': 'Commit',
+            'revision_objects': [{
+                'object_type': OBJECT_TYPES[entity % len(OBJECT_TYPES)],
+                'object_name': f'Object{entity}',
+                'object_gu_id': f'{entity:08x}-0000-4000-8000-{entity:012x}',
+                'object_entity_id': entity,
+                'object_operation': 'Update',
+            } for entity in entities],
+        }
+
+
+def get_queries(database):
+    '''
+    Queries of the benchmark
+    Returns:
+    -------
+        queries: Dict<String, Callable>
+    '''
+    return {
+        'object-history': lambda: database.get_object_history(
+            f'{1234:08x}-0000-4000-8000-{1234:012x}'),
+        'user-in-month': lambda: database.get_revisions_by_user(
+            'user7', datetime.date(2020, 6, 1), datetime.date(2020, 6, 30)),
+        'most-changed-in-month': lambda: database.get_most_changed_objects(
+            datetime.date(2020, 11, 1), datetime.date(2020, 11, 30)),
+        'revision-with-objects': lambda: database.get_revision(123456),
+        'search-like': lambda: database.conn.execute('''
+            SELECT revision_build FROM revision
+            WHERE revision_comment LIKE '%invoiced%'
+                AND revision_comment LIKE '%taxing%'
+            UNION
+            SELECT revision_build FROM revision_objects_flat
+            WHERE object_name LIKE '%Object1234%'
+            LIMIT 20''').fetchall(),
+        'search-fts': lambda: database.search('invoiced taxing'),
+        'search-fts-object': lambda: database.search('Object1234'),
+        'activity-group-by': lambda: database.conn.execute(f'''
+            SELECT {DataBase.REVISION_DAY} AS day, revision_user, COUNT(*)
+            FROM revision
+            GROUP BY 1, 2''').fetchall(),
+        'activity-rollup': lambda: database.get_activity_by_user(
+            datetime.date(2018, 1, 1), datetime.date(2020, 11, 30)),
+        'churn-group-by': lambda: database.conn.execute(f'''
+            SELECT {DataBase.REVISION_DAY} AS day, object_type,
+                object_operation, COUNT(*)
+            FROM revision_objects_flat
+            JOIN revision
+                ON revision.revision_build =
+                    revision_objects_flat.revision_build
+            GROUP BY 1, 2, 3''').fetchall(),
+        'churn-rollup': lambda: database.get_object_churn(
+            datetime.date(2018, 1, 1), datetime.date(2020, 11, 30)),
+    }
+
+
+def measure_queries(queries, repeat=3):
+    '''
+    Best time of each query, in milliseconds
+    '''
+    results = {}
+    for name, query in queries.items():
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            query()
+            times.append(time.perf_counter() - start)
+        results[name] = min(times) * 1000
+    return results
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arg_parser.add_argument('--revisions', type=int, default=400000)
+    arg_parser.add_argument('--objects', type=int, default=6,
+                            help='objects per revision')
+    arg_parser.add_argument('--distinct-objects', type=int, default=50000)
+    arg_parser.add_argument('--users', type=int, default=40)
+    arg_parser.add_argument('--days', type=int, default=730)
+    arg_parser.add_argument('--storage', choices=DataBase.STORAGES,
+                            default='flat')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = DataBase(os.path.join(directory, 'database.db'))
+        database.construct_schema(args.storage)
+        start = time.perf_counter()
+        statistics = database.insert_revisions(
+            generate_revisions(args.revisions, args.objects,
+                               args.distinct_objects, args.users, args.days),
+            batch_size=5000, journal_mode='WAL', synchronous='OFF')
+        print(f'{statistics["revisions"]} revisions and '
+              f'{statistics["objects"]} objects written in '
+              f'{time.perf_counter() - start:.1f}s '
+              f'({statistics["rows_per_second"]:.0f} rows/s)')
+
+        queries = get_queries(database)
+        without_indexes = measure_queries(queries, repeat=1)
+        start = time.perf_counter()
+        database.create_indexes()
+        print(f'indexes created in {time.perf_counter() - start:.1f}s')
+        with_indexes = measure_queries(queries)
+        database.conn.close()
+
+    print(f'{"query":<26}{"no indexes ms":>16}{"indexes ms":>14}')
+    for query_name in queries:
+        print(f'{query_name:<26}{without_indexes[query_name]:>16.2f}'
+              f'{with_indexes[query_name]:>14.2f}')
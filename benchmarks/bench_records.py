@@ -0,0 +1,133 @@
+'''
+Benchmark of the memory of the revisions kept by a capture
+
+Parses the same generated responses as dicts, as the previous parser, and
+as the records Revision and RevisionObject, and reports the memory held
+by the parsed revisions (tracemalloc), the time of parsing and the insert
+rate in SQLite.
+
+Ex: python benchmarks/bench_records.py --revisions 50000 --objects 8
+'''
+import os
+import sys
+import time
+import argparse
+import datetime
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'gxcrawler'))
+
+from fakeserver import FakeGxServer  # noqa: E402
+from response_parser import (ResponseParser, REVISION_KEYS,  # noqa: E402
+                             OBJECT_KEYS)
+from database import DataBase  # noqa: E402
+
+
+def generate_responses(revisions, objects_per_revision, rows_per_page=100):
+    '''
+    Responses of the grid and of the objects of the local server
+    Returns:
+    -------
+        responses: List<Tuple<Dict, List<Dict>>> (page of the grid and the
+                   objects of each row)
+    '''
+    server = FakeGxServer(revisions_per_day=rows_per_page,
+                          objects_per_revision=objects_per_revision,
+                          last_day=datetime.date(2020, 11, 30))
+    responses = []
+    try:
+        day = server.last_day
+        while len(responses) * rows_per_page < revisions:
+            grid = server.get_grid(rows_per_page, 1, day, day)
+            builds = [int(value) for key, value in grid['gxValues'][0].items()
+                      if key.startswith('vBUILD_')]
+            responses.append((grid, [server.get_objects(build)
+                                     for build in builds]))
+            day -= datetime.timedelta(days=1)
+    finally:
+        server.stop()
+    return responses
+
+
+def parse_dicts(responses, parser):
+    '''
+    Revisions as dicts of strings, as the previous parser
+    '''
+    revisions = []
+    for grid, objects in responses:
+        values = grid['gxValues'][0]
+        count = parser.get_count(grid)
+        for row, response in zip(range(1, count + 1), objects):
+            revision = {field: values[key]
+                        for key, field in REVISION_KEYS.get(row)}
+            object_values = response['gxValues'][1]
+            revision['revision_objects'] = []
+            for object_row in range(1, parser.limit_per_revision):
+                keys = OBJECT_KEYS.get(object_row)
+                if keys[0][0] not in object_values:
+                    break
+                revision['revision_objects'].append(
+                    {field: object_values[key] for key, field in keys})
+            revisions.append(revision)
+    return revisions
+
+
+def parse_records(responses, parser):
+    '''
+    Revisions as records
+    '''
+    revisions = []
+    for grid, objects in responses:
+        for (_, revision), response in zip(
+                parser.get_rows(grid, parser.get_count(grid)), objects):
+            revision['revision_objects'] = parser.get_objects(response)
+            revisions.append(revision)
+    return revisions
+
+
+def measure(parse, responses, parser, directory):
+    '''
+    Memory held by the revisions, time of parsing and insert rate
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    revisions = parse(responses, parser)
+    seconds = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    database = DataBase(os.path.join(directory, f'{parse.__name__}.db'))
+    database.construct_schema()
+    statistics = database.insert_revisions(revisions, batch_size=5000,
+                                           journal_mode='WAL',
+                                           synchronous='OFF')
+    database.conn.close()
+    return {
+        'memory_mb': memory / 1024 / 1024,
+        'parse_seconds': seconds,
+        'insert_rows_per_second': statistics['rows_per_second'],
+    }
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arg_parser.add_argument('--revisions', type=int, default=50000)
+    arg_parser.add_argument('--objects', type=int, default=8,
+                            help='objects per revision')
+    args = arg_parser.parse_args()
+
+    bench_responses = generate_responses(args.revisions, args.objects)
+    bench_parser = ResponseParser()
+    print(f'{len(bench_responses) * 100} revisions with {args.objects} '
+          f'objects')
+    print(f'{"parser":<16}{"memory MB":>12}{"parse s":>10}'
+          f'{"insert rows/s":>16}')
+    with tempfile.TemporaryDirectory() as bench_directory:
+        for bench_parse in (parse_dicts, parse_records):
+            results = measure(bench_parse, bench_responses, bench_parser,
+                              bench_directory)
+            print(f'{bench_parse.__name__:<16}{results["memory_mb"]:>12.1f}'
+                  f'{results["parse_seconds"]:>10.2f}'
+                  f'{results["insert_rows_per_second"]:>16.0f}')
@@ -0,0 +1,105 @@
+'''
+Benchmark of the storages of the objects of revisions in SQLite
+
+Writes the same generated revisions in a flat and in a normalized
+database and reports the size of the file, the insert rate and the time
+of scans of revision_objects.
+
+Ex: python benchmarks/bench_storage.py --days 90 --objects-per-revision 8
+'''
+import os
+import sys
+import time
+import argparse
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'gxcrawler'))
+
+from fakeserver import FakeGxServer  # noqa: E402
+from response_parser import ResponseParser  # noqa: E402
+from database import DataBase  # noqa: E402
+
+
+QUERIES = {
+    'count-by-type': '''
+        SELECT object_type, COUNT(*)
+        FROM revision_objects_flat
+        GROUP BY object_type''',
+    'history-of-object': '''
+        SELECT revision_build, object_operation
+        FROM revision_objects_flat
+        WHERE object_name = 'Object1234' ''',
+    'revisions-by-user': '''
+        SELECT revision.revision_user, COUNT(*)
+        FROM revision_objects_flat
+        JOIN revision
+            ON revision.revision_build = revision_objects_flat.revision_build
+        GROUP BY revision.revision_user''',
+}
+
+
+def generate_revisions(days, revisions_per_day, objects_per_revision):
+    '''
+    Revisions parsed from the responses of the local server
+    Returns:
+    -------
+        revisions: List<Dict>
+    '''
+    parser = ResponseParser()
+    last_day = datetime.date(2020, 11, 30)
+    server = FakeGxServer(revisions_per_day=revisions_per_day,
+                          objects_per_revision=objects_per_revision,
+                          last_day=last_day)
+    revisions = []
+    try:
+        for day in range(days):
+            date = last_day - datetime.timedelta(days=day)
+            grid = server.get_grid(revisions_per_day, 1, date, date)
+            for _, revision in parser.get_rows(grid, revisions_per_day):
+                revision['revision_objects'] = parser.get_objects(
+                    server.get_objects(int(revision['revision_build'])))
+                revisions.append(revision)
+    finally:
+        server.stop()
+    return revisions
+
+
+def bench_storage(storage, revisions, directory):
+    path = os.path.join(directory, f'{storage}.db')
+    database = DataBase(path)
+    database.construct_schema(storage)
+    statistics = database.insert_revisions(revisions)
+    database.conn.execute('VACUUM')
+    results = {
+        'size_mb': os.path.getsize(path) / 1024 / 1024,
+        'insert_rows_per_second': statistics['rows_per_second'],
+    }
+    for name, query in QUERIES.items():
+        start = time.perf_counter()
+        database.conn.execute(query).fetchall()
+        results[name] = (time.perf_counter() - start) * 1000
+    database.conn.close()
+    return results
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    arg_parser.add_argument('--days', type=int, default=30)
+    arg_parser.add_argument('--revisions-per-day', type=int, default=200)
+    arg_parser.add_argument('--objects-per-revision', type=int, default=8)
+    args = arg_parser.parse_args()
+
+    bench_revisions = generate_revisions(args.days, args.revisions_per_day,
+                                         args.objects_per_revision)
+    print(f'{len(bench_revisions)} revisions')
+    print(f'{"storage":<12}{"size MB":>10}{"insert rows/s":>15}' +
+          ''.join(f'{name + " ms":>22}' for name in QUERIES))
+    with tempfile.TemporaryDirectory() as bench_directory:
+        for bench_storage_name in DataBase.STORAGES:
+            measures = bench_storage(bench_storage_name, bench_revisions,
+                                     bench_directory)
+            print(f'{bench_storage_name:<12}{measures["size_mb"]:>10.2f}'
+                  f'{measures["insert_rows_per_second"]:>15.0f}' +
+                  ''.join(f'{measures[name]:>22.2f}' for name in QUERIES))
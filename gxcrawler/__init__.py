@@ -1,8 +1,38 @@
-from gxcrawler import GxCrawler
-from config import Config
-from database import DataBase
-from process import Process
+'''
+Crawler of the activity of the genexus server 16
+
+The classes are imported when used, so that the use of the database does
+not import the libraries of http and html (requests and lxml)
+'''
+import sys
+import importlib
 
 __version__ = '0.1'
-__all__ = ['gxcrawler', 'config', 'database',
-            'process']
+__all__ = ['GxCrawler', 'Config', 'DataBase', 'Process']
+
+# Module of each class
+MODULES = {'GxCrawler': 'gxcrawler', 'Config': 'config',
+           'DataBase': 'database', 'Process': 'process'}
+
+
+def __getattr__(name):
+    '''
+    Import the class in its first use
+    '''
+    if name not in MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute '
+                             f'{name!r}')
+    module = importlib.import_module(MODULES[name])
+    if module is sys.modules[__name__]:
+        # The module gxcrawler is found only with its directory before
+        # the directory of the package in sys.path
+        raise ImportError(f'{name} requires the directory {__path__[0]} '
+                          f'in sys.path before the directory of the '
+                          f'package')
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,483 @@
+'''
+Asynchronous crawler of the genexus server 16
+
+Same output of GxCrawler, with the requests running in an event loop
+'''
+import json
+import asyncio
+import datetime
+
+import aiohttp
+from lxml import etree
+
+from session import is_expired
+from throttle import get_backoff, RETRY_STATUS
+from response_parser import ResponseParser, REVISION_FIELDS, OBJECT_FIELDS
+
+
+class AsyncGxCrawler():
+    '''
+    Crawler data in genexus server 16 with asyncio
+    '''
+
+    def __init__(self, user_login, user_password, url_base, kb_name,
+                 max_concurrency=10, semaphore=None, rows_per_page=10,
+                 max_retries=3, backoff=0.5):
+        '''
+        Class responsible for obtaining data from the genexus server
+        using coroutines
+        Params:
+        ------
+        user_login:         String (user login server)
+        user_password:      String (password login server)
+        url_base:           String (initial url of address of gxserver)
+        kb_name:            String (name of kb of data)
+        max_concurrency:    int (limit of requests in flight)
+        semaphore:          asyncio.Semaphore (limit shared with other
+                            crawlers, replaces max_concurrency)
+        rows_per_page:      int (rows requested per page of the grid)
+        max_retries:        int (attempts repeated after a connection error
+                            or a server overloaded)
+        backoff:            float (seconds of the first wait between
+                            attempts, doubled at each attempt, with jitter)
+
+        Ex: async with AsyncGxCrawler('user', 'password',
+                                      'http://192.168.1.1/GeneXusServer16',
+                                      kb_name='App') as gxcrawler:
+                async for page in gxcrawler.iter_data(date, date):
+                    ...
+        '''
+        self.session = None
+        self.user = user_login
+        self.password = user_password
+        self.url_base = url_base
+        self.kb_name = kb_name
+        self.X_GXAUTH_TOKEN = None
+        self.GX_AUTH_ACTIVITY = None
+        self.authenticated = False
+        self.logins = 0
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.semaphore = semaphore
+        self.max_retries = max(0, int(max_retries))
+        self.backoff = backoff
+        # Revisions whose list of objects could not be obtained
+        self.failed_revisions = []
+        self.prefix_gx = [prefix for prefix, _ in REVISION_FIELDS]
+        self.prefix_gx_objects = [prefix for prefix, _ in OBJECT_FIELDS]
+        self.LIMIT_PAGES = 1000
+        self.LIMITE_PER_REVISION = 1000
+        self.parser = ResponseParser(self.LIMITE_PER_REVISION)
+        self.rows_per_page = max(1, int(rows_per_page))
+        # The server returned a full page with rows_per_page rows
+        self.__page_size_confirmed = False
+
+        self.descriptions = dict(REVISION_FIELDS)
+        self.descriptions_objects = dict(OBJECT_FIELDS)
+        # Login of the tasks that found the session expired at the same time
+        self.__login_lock = None
+
+        self.__headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
+            'Accept': '*/*',
+            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        }
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
+
+    async def open(self):
+        '''
+        Open the http session, the connector keeps a connection for each
+        request in flight
+        '''
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.__login_lock is None:
+            self.__login_lock = asyncio.Lock()
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            # The servers are usually addressed by ip, whose cookies are
+            # refused by the default cookie jar
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.CookieJar(unsafe=True))
+
+    async def close(self):
+        '''
+        Close the http session
+        '''
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            self.authenticated = False
+            self.__login_lock = None
+
+    def __format_date_req_param(self, date_time):
+        '''
+        Method for return date hour in format expected in request.
+        Ex: 10/26/20 11:51 AM to 2020/10/26 13:13:00
+        '''
+        return (date_time[3:5]+'/'+date_time[0:2]+'/'+'20'+date_time[6:8]
+                + ' ' + date_time[9:14]+':00')
+
+    def __format_date_filter(self, date):
+        '''
+        Method for return the date in format of the grid filter
+        Params:
+        ------
+            date: datetime
+        Returns:
+        -------
+            date: String
+        '''
+        return f'{date.year}{date.month}{str(date.day).zfill(2)}'
+
+    def __get_headers(self, **headers):
+        '''
+        Method to return the common headers with the headers of request
+        '''
+        return {**self.__headers, **headers}
+
+    async def __send(self, method, url, headers, data=None):
+        '''
+        Method to make a request limited by the semaphore, repeating it
+        after a connection error or a response of server overloaded
+        Params:
+        ------
+            method:     String
+            url:        String
+            headers:    Dict
+            data:       String
+        Returns:
+        -------
+            status, text, redirected: Tuple<int, String, bool> (redirected
+                                      to the login page)
+        '''
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    async with self.session.request(
+                            method, url, headers=headers,
+                            data=data) as response:
+                        status, text = response.status, await response.text()
+                        redirected = bool(response.history) and \
+                            '/main.aspx' in str(response.url)
+                if status not in RETRY_STATUS or \
+                        attempt >= self.max_retries:
+                    return status, text, redirected
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+            attempt += 1
+            # The wait is out of the semaphore, freeing the slot
+            await asyncio.sleep(get_backoff(attempt, self.backoff))
+
+    async def __request(self, method, url, headers, data=None,
+                        activity_token=False):
+        '''
+        Method to make a request with the authenticated session, logging
+        in again and repeating the request once when the session expired
+        Params:
+        ------
+            method:         String
+            url:            String
+            headers:        Dict
+            data:           String
+            activity_token: bool (send the token of the page activity in
+                            header X-GXAUTH-TOKEN)
+        Returns:
+        -------
+            status, text: Tuple<int, String>
+        '''
+        await self.ensure_login()
+        logins = self.logins
+        if activity_token:
+            headers = {**headers, 'X-GXAUTH-TOKEN': self.GX_AUTH_ACTIVITY}
+        status, text, redirected = await self.__send(method, url, headers,
+                                                     data)
+        if not is_expired(status, text[:512].encode(), redirected):
+            return status, text
+
+        async with self.__login_lock:
+            # Other task may have logged in again meanwhile
+            if self.logins == logins:
+                await self.login()
+        if activity_token:
+            headers = {**headers, 'X-GXAUTH-TOKEN': self.GX_AUTH_ACTIVITY}
+        status, text, _ = await self.__send(method, url, headers, data)
+        return status, text
+
+    async def login(self):
+        '''
+        Method of login in server and get tokens of authentication
+        '''
+        await self.open()
+        # A new login must not reuse the cookies of the expired session
+        self.session.cookie_jar.clear()
+        url = f'{self.url_base}/main.aspx'
+        headers = self.__get_headers(
+            Accept='text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            **{'Upgrade-Insecure-Requests': '1'})
+        _, text, _ = await self.__send('GET', url, headers)
+
+        tree = etree.HTML(text)
+        tree = tree.xpath('./body/form/div[2]//input')[0]
+        self.X_GXAUTH_TOKEN = json.loads(
+            tree.attrib.get('value')).get('GX_AUTH_W0010MAINLOGIN')
+
+        # login page
+        url = f'{self.url_base}/main.aspx?gxfullajaxEvt,gx-no-cache=1603735860022'
+        headers = self.__get_headers(**{
+            'GxAjaxRequest': '1',
+            'Content-Type': 'application/json',
+            'X-GXAUTH-TOKEN': self.X_GXAUTH_TOKEN,
+            'Referer': f'{self.url_base}/main.aspx',
+        })
+        payload = '{"MPage":false,"cmpCtx":"W0010","parms":[{"s":"Local","v":[["Local","Local"]]},"Local","'+self.user+'","'+self.password+'","",false,false],"hsh":[],"objClass":"mainlogin","pkgName":"Artech.GeneXusServer","events":["ENTER"],"grids":{}}'
+        await self.__send('GET', url, headers, payload)
+
+        # Page after login (dashboard)
+        url = f'{self.url_base}/dashboard.aspx'
+        headers = self.__get_headers(**{
+            'X-SPA-MP': 'masterpagebeforelogin',
+            'X-SPA-REQUEST': '1',
+            'Referer': f'{self.url_base}/main.aspx',
+        })
+        await self.__send('GET', url, headers)
+
+        url = f'{self.url_base}/activity.aspx?{self.kb_name}'
+        headers = self.__get_headers(**{
+            'X-SPA-MP': 'masterpage',
+            'X-SPA-REQUEST': '1',
+            'Referer': f'{self.url_base}/dashboard.aspx',
+        })
+        _, text, _ = await self.__send('GET', url, headers)
+
+        # Defining the authentication key to obtain the list of objects
+        # in the event activity
+        tree = etree.HTML(text)
+        tree = tree.xpath('./body/script')[0]
+        index = tree.text.index('GX_AUTH_ACTIVITY')
+        index_final = tree.text.index('"', index+19)
+        self.GX_AUTH_ACTIVITY = tree.text[index+19: index_final]
+        self.authenticated = True
+        self.logins += 1
+
+    async def ensure_login(self):
+        '''
+        Login in server only if the session is not authenticated
+        '''
+        await self.open()
+        async with self.__login_lock:
+            if not self.authenticated:
+                await self.login()
+
+    async def get_data(self, initial_date=None, final_date=None):
+        '''
+        Method to obtain the data, same result of GxCrawler.get_data
+        Params:
+        ------
+            initial_date: datetime
+            final_date: datetime
+        Returns:
+        -------
+            revisions: List<List<Revision>> (pages of revisions)
+        '''
+        return [page async for page in self.iter_data(initial_date,
+                                                      final_date)]
+
+    async def iter_data(self, initial_date=None, final_date=None):
+        '''
+        Method to obtain the data page by page, the objects of the
+        revisions of a page are requested while the next grid page is
+        being obtained. The requests of the pages not returned are
+        cancelled when the iteration is closed early or fails.
+        Params:
+        ------
+            initial_date: datetime
+            final_date: datetime
+        Returns:
+        -------
+            revisions: AsyncGenerator<List<Revision>> (pages of revisions)
+        '''
+        # The login is made only once per session
+        await self.ensure_login()
+
+        if initial_date is None or final_date is None:
+            initial_date = final_date = datetime.datetime.today()
+
+        initial_data_parm = self.__format_date_filter(initial_date)
+        final_data_parm = self.__format_date_filter(final_date)
+
+        # Rows and tasks of the page not returned yet
+        pending = None
+        tasks = []
+        page_size = self.rows_per_page
+        offset = 0
+        probing = False
+        try:
+            while offset // page_size < self.LIMIT_PAGES:
+                pagina = offset // page_size + 1
+                count, response_json = await self.__get_grid_page(
+                    initial_data_parm, final_data_parm, pagina, page_size)
+                if count == 0:
+                    break
+                if probing:
+                    # The short first page was the limit of rows of the
+                    # server
+                    self.rows_per_page = page_size
+                    self.__page_size_confirmed = True
+                    probing = False
+                if count == page_size and page_size == self.rows_per_page:
+                    self.__page_size_confirmed = True
+
+                commits = self.__get_commit_rows(response_json, count)
+                tasks = [asyncio.ensure_future(
+                    self.__get_revision(commit_dados, commit))
+                    for commit, commit_dados in commits]
+                if pending is not None:
+                    yield await self.__wait_page(*pending)
+                pending = commits, tasks
+                if count < page_size:
+                    if self.__page_size_confirmed or offset > 0:
+                        # A short page is the last one
+                        break
+                    # A short first page is the whole period or the limit
+                    # of rows of the server, to be confirmed by the next
+                    # page
+                    page_size = count
+                    probing = True
+                offset += page_size
+
+            if pending is not None:
+                yield await self.__wait_page(*pending)
+        finally:
+            # The iteration closed early or failed, the requests of the
+            # pages not returned must not outlive it
+            running = [task for task in
+                       set(tasks + (pending[1] if pending else []))
+                       if not task.done()]
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def __get_grid_page(self, initial_date, final_date, pagina,
+                              page_size):
+        '''
+        Method to get a page of the activity grid
+        Params:
+        ------
+        initial_date: String (Date format YYYYMMMDD)
+        final_date: String (Date format YYYYMMMDD)
+        pagina: int
+        page_size: int (rows per page)
+
+        Returns:
+        -------
+        count, response_json: Tuple<int, Dict>
+        '''
+        url = f'{self.url_base}/activity.aspx?gxajaxGridRefresh_Activitygrid,{page_size},{pagina},{initial_date},{final_date},,1633,false,gx-no-cache=1603737012264'
+        headers = self.__get_headers(**{
+            'GxAjaxRequest': '1',
+            'Referer': f'{self.url_base}/activity.aspx?{self.kb_name}',
+        })
+        _, text = await self.__request('GET', url, headers)
+        response_json = self.parser.loads(text)
+        return self.parser.get_count(response_json), response_json
+
+    def __get_commit_rows(self, response_json, quantidade_operacoes):
+        '''
+        Method to return the rows of the grid without the objects
+        Params:
+        ------
+        response_json: Dict
+        quantidade_operacoes: int
+
+        Returns:
+        -------
+        commits: List<Tuple<int, Dict>>
+        '''
+        return self.parser.get_rows(response_json, quantidade_operacoes)
+
+    async def __wait_page(self, commits, tasks):
+        '''
+        Method to wait the revisions of a page, in the order of the grid.
+        A failure in one row is recorded in failed_revisions without
+        losing the other rows of the page.
+        Params:
+        ------
+        commits: List<Tuple<int, Dict>> (row of grid and revision)
+        tasks: List<Task> (task of the objects of each row)
+
+        Returns:
+        -------
+        revisions: List<Revision>
+        '''
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        page = []
+        for (grid_row, commit_dados), result in zip(commits, results):
+            if isinstance(result, BaseException):
+                self.failed_revisions.append(
+                    {'revision': commit_dados, 'grid_row': grid_row,
+                     'error': result})
+            else:
+                page.append(result)
+        return page
+
+    async def __get_revision(self, commit_dados, grid_row):
+        '''
+        Method to include the objects in revision
+        Returns:
+        -------
+        commit_dados: Revision
+        '''
+        commit_dados['revision_objects'] = await self.__get_commit_objects(
+            param0=commit_dados['revision_name'],
+            param1=self.__format_date_req_param(
+                commit_dados['revision_date']),
+            param2=commit_dados['revision_operation'],
+            param3=str(commit_dados['revision_build']),
+            param4=commit_dados['revision_user'],
+            param5=commit_dados['revision_comment'],
+            grid_row=grid_row)
+        return commit_dados
+
+    async def __get_commit_objects(self, param0=None, param1=None,
+                                   param2=None, param3=None, param4=None,
+                                   param5=None, grid_row=None):
+        '''
+        Method to return the list of objects related to a server operation
+        Returns:
+        -------
+        revision_obj:   List<RevisionObject>
+        '''
+        url = f'{self.url_base}/activity.aspx?gxfullajaxEvt,{self.kb_name},gx-no-cache=1603740836511'
+        headers = self.__get_headers(**{
+            'GxAjaxRequest': '1',
+            'Content-Type': 'application/json',
+            'Referer': f'{self.url_base}/activity.aspx?{self.kb_name}',
+        })
+        payload = (
+            '{"MPage":false,"cmpCtx":"",'
+            '"parms":["'+param0+'","'+param1+'","'+param2+'",'+param3+','
+            '"'+param4+'","'+param5+'",true],'
+            '"hsh":[],"objClass":"activity","pkgName":"Artech.GeneXusServer",'
+            '"events":["ACTIVITYGRID.ONLINEACTIVATE"],"grid":45,'
+            '"grids":{"Activitygrid":{"id":45,"lastRow":2,"pRow":""}},'
+            '"row":"'+str(grid_row).zfill(4)+'","pRow":""}')
+
+        status, text = await self.__request('POST', url, headers, payload,
+                                            activity_token=True)
+
+        if status != 200:
+            # Without the objects the revision would be written incomplete
+            raise ValueError(f'Server answered with status {status}')
+        return self.parser.get_objects(self.parser.loads(text))
@@ -0,0 +1,351 @@
+'''
+Backfill of long periods
+
+Split the period in partitions crawled in parallel, each worker with its
+own authenticated session, and a single writer in database
+'''
+import time
+import queue
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from gxcrawler import GxCrawler
+from database import DataBase
+from config import Config
+
+
+class Backfill():
+    '''
+    Class of parallel capture of a period partitioned by date
+    '''
+    PARTITIONS = {'day': 1, 'week': 7}
+
+    def __init__(self, workers=4, partition='day', max_workers=1,
+                 batch_size=500, journal_mode=None, synchronous=None,
+                 queue_size=100, rows_per_page=10, adaptive_page_size=False,
+                 defer_indexes=True, upsert=False, cache=None, max_retries=3,
+                 adaptive_concurrency=False):
+        '''
+        Class of parallel capture of a period
+        Params:
+        ------
+            workers: int (partitions crawled at the same time)
+            partition: String (day or week)
+            max_workers: int (parallel requests of objects per grid page
+                         in each worker)
+            batch_size: int (revisions per transaction in database)
+            journal_mode: String (journal mode of database while injecting,
+                          ex: WAL, the mode of the database is kept when
+                          not informed)
+            synchronous: String (synchronous of database while injecting,
+                         ex: NORMAL, kept when not informed)
+            queue_size: int (pages waiting for the writer, the workers
+                        wait when it is full)
+            rows_per_page: int (rows per page of the grid)
+            adaptive_page_size: bool (adapt the rows per page to the limit
+                                of the server)
+            defer_indexes: bool (drop the secondary indexes of database
+                           during the backfill and create them at the end)
+            upsert: bool (replace the revisions already in database, for
+                    periods overlapping the ones already captured)
+            cache: ResponseCache (responses of the server recorded in disk,
+                   shared by the workers)
+            max_retries: int (attempts repeated when the server fails)
+            adaptive_concurrency: bool (adjust the requests in flight of
+                                  each worker, up to max_workers, to the
+                                  latency and errors of the server)
+
+        Ex: backfill = Backfill(workers=8, partition='week')
+            backfill.run(datetime.datetime(2020, 1, 1),
+                         datetime.datetime(2020, 12, 31))
+        '''
+        if partition not in self.PARTITIONS:
+            raise ValueError(f'Invalid partition: {partition}')
+
+        self.workers = max(1, int(workers))
+        self.partition = partition
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.queue_size = queue_size
+        self.rows_per_page = rows_per_page
+        self.adaptive_page_size = adaptive_page_size
+        self.defer_indexes = defer_indexes
+        self.upsert = upsert
+        self.cache = cache
+        self.max_retries = max_retries
+        self.adaptive_concurrency = adaptive_concurrency
+        # Callables hook(event, data) of the crawlers and of the database
+        self.hooks = []
+        # Partitions that could not be crawled, to run again
+        self.failed_partitions = []
+        self.__configuration = None
+        self.__checkpoints = {}
+        self.__local = threading.local()
+        self.__stop = threading.Event()
+
+    def add_hook(self, hook):
+        '''
+        Register a callable hook(event, data) in the crawler of each worker
+        and in the database of the run, see GxCrawler.add_hook and
+        DataBase.add_hook. The hook is called by the workers at the same
+        time.
+
+        Ex: metrics = Metrics()
+            backfill.add_hook(metrics)
+        '''
+        if hook not in self.hooks:
+            self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        '''
+        Remove a hook registered by add_hook, from the next run
+        '''
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+
+    def get_partitions(self, initial_date, final_date):
+        '''
+        Split the period in partitions
+        Params:
+        ------
+            initial_date: datetime
+            final_date: datetime
+        Returns:
+        -------
+            partitions: List<Tuple<datetime, datetime>>
+        '''
+        days = datetime.timedelta(days=self.PARTITIONS[self.partition])
+        partitions = []
+        date = initial_date
+        while date <= final_date:
+            partitions.append(
+                (date, min(date + days - datetime.timedelta(days=1),
+                           final_date)))
+            date += days
+        return partitions
+
+    def run(self, initial_date, final_date, config=None, database=None,
+            job_id=None):
+        '''
+        Capture the period and write in database
+        Params:
+        ------
+            initial_date: datetime
+            final_date: datetime
+            config: Config
+            database: DataBase
+            job_id: String (job mode, each page is written with the
+                    checkpoint of the job and running the same job again
+                    resumes after the last page written)
+        Returns:
+        -------
+            statistics: Dict (statistics of DataBase.insert_revisions)
+        '''
+        if config is None:
+            config = Config(method='FILE')
+        if database is None:
+            database = DataBase()
+
+        self.__configuration = config.get_configuration()
+        # The crawlers of a previous run have its configuration and hooks
+        self.__local = threading.local()
+        self.failed_partitions = []
+        self.__stop.clear()
+        partitions = self.get_partitions(initial_date, final_date)
+        self.__checkpoints = {}
+        if job_id is not None:
+            database.construct_schema()
+            self.__checkpoints = database.get_checkpoints(job_id)
+
+        print(f'Backfill of {len(partitions)} partitions: {initial_date} to '
+              f'{final_date}')
+        hooks = list(self.hooks)
+        for hook in hooks:
+            database.add_hook(hook)
+        try:
+            statistics = self.__run_partitions(partitions, database, job_id)
+        finally:
+            for hook in hooks:
+                database.remove_hook(hook)
+
+        print(f'Injected {statistics["revisions"]} revisions and '
+              f'{statistics["objects"]} objects '
+              f'({statistics["rows_per_second"]:.0f} rows/s)')
+        if self.failed_partitions:
+            print(f'{len(self.failed_partitions)} partitions failed')
+        return statistics
+
+    def __run_partitions(self, partitions, database, job_id=None):
+        '''
+        Crawl the partitions in the workers and write them in database
+        Returns:
+        -------
+            statistics: Dict (statistics of DataBase.insert_revisions)
+        '''
+        pages = queue.Queue(maxsize=self.queue_size)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for partition in partitions:
+                executor.submit(self.__crawl_partition, partition, pages)
+            if self.defer_indexes:
+                database.drop_indexes()
+            try:
+                if job_id is None:
+                    statistics = database.insert_revisions(
+                        self.__get_revisions(pages, len(partitions)),
+                        batch_size=self.batch_size,
+                        journal_mode=self.journal_mode,
+                        synchronous=self.synchronous,
+                        upsert=self.upsert)
+                else:
+                    statistics = self.__write_job(database, job_id, pages,
+                                                  len(partitions))
+            except BaseException:
+                # Release the workers waiting for the writer
+                self.__stop.set()
+                raise
+            finally:
+                if self.defer_indexes:
+                    database.create_indexes()
+        return statistics
+
+    def __get_crawler(self):
+        '''
+        Get the crawler of the worker thread, each worker logs in once
+        and keeps its session
+        '''
+        if getattr(self.__local, 'gxcrawler', None) is None:
+            self.__local.gxcrawler = GxCrawler(
+                self.__configuration['user'],
+                self.__configuration['password'],
+                self.__configuration['url'],
+                self.__configuration['kb_name'],
+                max_workers=self.max_workers,
+                rows_per_page=self.rows_per_page,
+                adaptive_page_size=self.adaptive_page_size,
+                cache=self.cache,
+                max_retries=self.max_retries,
+                adaptive_concurrency=self.adaptive_concurrency
+            )
+            for hook in self.hooks:
+                self.__local.gxcrawler.add_hook(hook)
+        return self.__local.gxcrawler
+
+    def __get_partition_key(self, date):
+        '''
+        Key of the partition in the checkpoints
+        '''
+        return date.strftime('%Y-%m-%d')
+
+    def __crawl_partition(self, partition, pages):
+        '''
+        Crawl a partition sending the pages to the writer, from the
+        checkpoint of the partition when there is one. The partition
+        fails at the first page with a revision whose objects could not
+        be obtained, the pages before it are kept.
+        '''
+        finished = False
+        try:
+            if self.__stop.is_set():
+                return
+            checkpoint = self.__checkpoints.get(
+                self.__get_partition_key(partition[0]))
+            start_row, before_build = 0, None
+            if checkpoint is not None:
+                if checkpoint['finished']:
+                    finished = True
+                    return
+                start_row = checkpoint['page'] * checkpoint['page_size']
+                before_build = checkpoint['last_build']
+
+            gxcrawler = self.__get_crawler()
+            failures = len(gxcrawler.failed_revisions)
+            data = gxcrawler.get_data(
+                partition[0], partition[1], stream=True,
+                start_row=start_row, before_build=before_build)
+            for page in data:
+                page = list(page)
+                if len(gxcrawler.failed_revisions) > failures:
+                    # The page is not sent, its checkpoint would skip the
+                    # failed revisions when the job is resumed
+                    raise Exception(
+                        f'{len(gxcrawler.failed_revisions) - failures} '
+                        f'revisions without objects in page '
+                        f'{gxcrawler.page}')
+                if not self.__put(pages, ('page', partition,
+                                          (gxcrawler.page,
+                                           gxcrawler.page_size), page)):
+                    return
+            finished = True
+        except Exception as error:
+            print(f'Failed partition {partition[0]} to {partition[1]}: '
+                  f'{error}')
+            self.failed_partitions.append(
+                {'partition': partition, 'error': error})
+        finally:
+            self.__put(pages, ('end', partition, finished, None))
+
+    def __put(self, pages, item):
+        '''
+        Put in queue, giving up when the writer stopped
+        Returns:
+        -------
+            sent: bool
+        '''
+        while not self.__stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __get_pages(self, pages, partitions):
+        '''
+        Items received from the workers until all partitions end
+        '''
+        finished = 0
+        while finished < partitions:
+            item = pages.get()
+            if item[0] == 'end':
+                finished += 1
+            yield item
+
+    def __get_revisions(self, pages, partitions):
+        '''
+        Revisions received from the workers until all partitions end
+        '''
+        for kind, _, _, page in self.__get_pages(pages, partitions):
+            if kind == 'page':
+                yield from page
+
+    def __write_job(self, database, job_id, pages, partitions):
+        '''
+        Write each page with the checkpoint of the job
+        Returns:
+        -------
+            statistics: Dict (revisions, objects, seconds, rows_per_second)
+        '''
+        database.set_pragmas(self.journal_mode, self.synchronous)
+        statistics = {'revisions': 0, 'objects': 0, 'seconds': 0.0}
+        for kind, partition, value, page in self.__get_pages(pages,
+                                                              partitions):
+            start = time.perf_counter()
+            partition_start = self.__get_partition_key(partition[0])
+            partition_end = self.__get_partition_key(partition[1])
+            if kind == 'page':
+                statistics['objects'] += database.save_page(
+                    job_id, partition_start, partition_end, value[0], page,
+                    page_size=value[1], upsert=self.upsert)
+                statistics['revisions'] += len(page)
+            elif value:
+                database.finish_partition(job_id, partition_start,
+                                          partition_end)
+            statistics['seconds'] += time.perf_counter() - start
+
+        rows = statistics['revisions'] + statistics['objects']
+        statistics['rows_per_second'] = (
+            rows / statistics['seconds'] if statistics['seconds'] else 0.0)
+        return statistics
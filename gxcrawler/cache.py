@@ -0,0 +1,260 @@
+'''
+Cache of responses of the genexus server in disk
+
+Records the responses of the grid and of the objects of revisions, to
+capture again the past days without requests to the server
+'''
+import os
+import json
+import gzip
+import hashlib
+import datetime
+import threading
+
+import requests
+
+
+class CacheMiss(Exception):
+    '''
+    Request not recorded in cache, in replay mode
+    '''
+
+
+class ResponseCache():
+    '''
+    Cache of responses in disk, by url and payload of request
+    '''
+    MODES = ('record', 'replay')
+
+    def __init__(self, directory, max_bytes=512*1024*1024, mode='record'):
+        '''
+        Cache of responses in disk. The least recently used responses are
+        removed when the cache is larger than max_bytes.
+        In record mode the grid of past days and the objects of revisions
+        are read from cache and the other requests go to the server, all
+        responses being recorded. In replay mode every request is read
+        from cache, without access to the server.
+        Params:
+        ------
+            directory: String
+            max_bytes: int
+            mode: String (record or replay)
+
+        Ex: cache = ResponseCache('cache')
+            gxcrawler = GxCrawler('user', 'password',
+                                  'http://192.168.1.1/GeneXusServer16',
+                                  kb_name='App', cache=cache)
+        '''
+        if mode not in self.MODES:
+            raise ValueError(f'Invalid mode: {mode}')
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.__size = sum(os.path.getsize(path) for path in self.__files())
+
+    def __files(self):
+        '''
+        Files of the cache
+        '''
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json.gz'):
+                    yield os.path.join(root, name)
+
+    def __get_key(self, method, url, data=None, kb_name=None):
+        '''
+        Key of the request, the parameter gx-no-cache of url is ignored.
+        The url of the grid has no knowledge base, which the server takes
+        from the session, so the key has the knowledge base of the session.
+        Returns:
+        -------
+            key: String
+        '''
+        url = url.split(',gx-no-cache=')[0]
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hashlib.sha256(
+            f'{method.upper()} {url} {kb_name or ""}'.encode('utf-8'))
+        digest.update(b'\n' + (data or b''))
+        return digest.hexdigest()
+
+    def __get_path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json.gz')
+
+    def __is_past_grid(self, url):
+        '''
+        Check if the url is of a page of the grid of a period before today
+        '''
+        query = url.split('gxajaxGridRefresh_Activitygrid,', 1)
+        if len(query) < 2:
+            return False
+        final_date = query[1].split(',')[3]
+        try:
+            final_date = datetime.date(int(final_date[:4]),
+                                       int(final_date[4:-2]),
+                                       int(final_date[-2:]))
+        except ValueError:
+            return False
+        return final_date < datetime.date.today()
+
+    def __is_activity(self, method, url):
+        '''
+        Check if the request is of a page of the grid or of the objects of
+        a revision
+        '''
+        return 'gxajaxGridRefresh' in url or (
+            method.upper() == 'POST' and 'activity.aspx' in url)
+
+    def __is_payload(self, content):
+        '''
+        Check if the response of the grid or of the objects has the data,
+        and not the redirect to the login page of a session expired
+        Params:
+        ------
+            content: bytes
+        Returns:
+        -------
+            payload: bool
+        '''
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            return False
+        if not isinstance(payload, dict) or 'gxValues' not in payload:
+            return False
+        return not any('redirect' in command
+                       for command in payload.get('gxCommands') or [])
+
+    def is_cacheable(self, method, url):
+        '''
+        Check if the response of the request can be read from cache: the
+        pages of grid of past days and the objects of revisions, which do
+        not change, or any request in replay mode
+        Returns:
+        -------
+            cacheable: bool
+        '''
+        if self.mode == 'replay':
+            return True
+        if method.upper() == 'POST' and 'activity.aspx' in url:
+            # Event ACTIVITYGRID.ONLINEACTIVATE
+            return True
+        return self.__is_past_grid(url)
+
+    def get(self, method, url, data=None, kb_name=None):
+        '''
+        Response of the request recorded in cache
+        Params:
+        ------
+            kb_name: String (knowledge base of the session of the request)
+        Returns:
+        -------
+            response: Response or None
+        '''
+        path = self.__get_path(self.__get_key(method, url, data, kb_name))
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f_cache:
+                entry = json.load(f_cache)
+            # Used recently, the last to be removed
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self.__is_activity(method, url) and \
+                not self.__is_payload(entry['text']):
+            # Recorded by a previous version without the check of put
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        response = requests.models.Response()
+        response.status_code = entry['status_code']
+        response.headers = requests.structures.CaseInsensitiveDict(
+            entry['headers'])
+        response.url = entry['url']
+        response.encoding = 'utf-8'
+        response._content = entry['text'].encode('utf-8')
+        return response
+
+    def put(self, method, url, data, response, kb_name=None):
+        '''
+        Record the response of request, the pages of the grid with today
+        are not recorded as they still change, nor the responses of the
+        grid and of the objects without their data, as the redirect of a
+        session expired, which would be read again after the login
+        Params:
+        ------
+            kb_name: String (knowledge base of the session of the request)
+        '''
+        if 'gxajaxGridRefresh' in url and not self.__is_past_grid(url):
+            return
+        if self.__is_activity(method, url) and \
+                not self.__is_payload(response.content):
+            return
+        entry = {
+            'url': response.url or url,
+            'status_code': response.status_code,
+            'headers': {key: value for key, value in response.headers.items()
+                        if key.lower() == 'content-type'},
+            'text': response.text
+        }
+        path = self.__get_path(self.__get_key(method, url, data, kb_name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with gzip.open(temporary, 'wt', encoding='utf-8') as f_cache:
+            json.dump(entry, f_cache)
+        size = os.path.getsize(temporary)
+        previous = os.path.getsize(path) if os.path.isfile(path) else 0
+        os.replace(temporary, path)
+
+        with self.__lock:
+            self.__size += size - previous
+            if self.__size > self.max_bytes:
+                self.__evict()
+
+    def __evict(self):
+        '''
+        Remove the least recently used responses until the cache has 90%
+        of max_bytes
+        '''
+        files = sorted(self.__files(), key=os.path.getmtime)
+        for path in files:
+            if self.__size <= self.max_bytes * 0.9:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            self.__size -= size
+
+
+class CachedSession(requests.Session):
+    '''
+    Session of requests that reads and records the responses in a
+    ResponseCache, under the knowledge base of the session
+    '''
+
+    def __init__(self, cache, kb_name=None):
+        super().__init__()
+        self.cache = cache
+        self.kb_name = kb_name
+
+    def request(self, method, url, *args, **kwargs):
+        data = kwargs.get('data')
+        if self.cache.is_cacheable(method, url):
+            response = self.cache.get(method, url, data, self.kb_name)
+            if response is not None:
+                return response
+        if self.cache.mode == 'replay':
+            raise CacheMiss(f'Request not recorded: {method} {url}')
+
+        response = super().request(method, url, *args, **kwargs)
+        if response.status_code == 200:
+            self.cache.put(method, url, data, response, self.kb_name)
+        return response
@@ -0,0 +1,408 @@
+'''
+Command line of gxcrawler
+
+Each command imports only the modules it uses: the commands of database
+(init-db, query, export and import) start without importing requests and
+lxml, which are imported by the commands that access the server (crawl,
+sync and watch)
+
+Ex: python gxcrawler/cli.py init-db
+    python gxcrawler/cli.py init-db --migrate normalized --rebuild-rollups
+    python gxcrawler/cli.py crawl 2020-11-01 2020-11-30 --workers 8
+    python gxcrawler/cli.py sync
+    python gxcrawler/cli.py query search "fix invoice"
+    python gxcrawler/cli.py export revisions.jsonl.gz --since-build 1234
+    python gxcrawler/cli.py export new.jsonl.gz --since-build App=1234,Hr=56
+'''
+import sys
+import json
+import argparse
+import datetime
+
+
+def parse_date(value):
+    '''
+    Date of the command line, in the format YYYY-MM-DD
+    Returns:
+    -------
+        date: datetime
+    '''
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f'invalid date: {value}, use YYYY-MM-DD') from None
+
+
+def parse_builds(value):
+    '''
+    Build of --since-build, one build or the builds by knowledge base
+    Ex: 1234 or App=1234,Backoffice=56
+    Returns:
+    -------
+        since_build: int or Dict<String, int>
+    '''
+    try:
+        if '=' not in value:
+            return int(value)
+        return {kb: int(build) for kb, build in
+                (item.rsplit('=', 1) for item in value.split(','))}
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f'invalid build: {value}, use BUILD or KB=BUILD,...') from None
+
+
+def format_builds(builds):
+    '''
+    Builds by knowledge base in the format of --since-build
+    '''
+    if list(builds) == ['']:
+        return str(builds[''])
+    return ','.join(f'{kb}={build}' for kb, build in builds.items())
+
+
+def get_database(args):
+    '''
+    Database of the option --database
+    '''
+    from database import DataBase
+
+    return DataBase(args.database)
+
+
+def get_config(args):
+    '''
+    Configuration of the server, of the environment variables or of the
+    file .env by the option --config, the environment variables and then
+    the file when not informed
+    '''
+    from config import Config
+
+    return Config(method=args.config)
+
+
+def get_process(args, **kwargs):
+    '''
+    Process of the options of the commands that access the server
+    '''
+    from process import Process
+
+    return Process(max_workers=args.workers, upsert=args.upsert,
+                   database_path=args.database, **kwargs)
+
+
+def write_metrics(metrics, metrics_format, path=None):
+    '''
+    Write the metrics in the file of --metrics-file or print them
+    '''
+    if path:
+        metrics.write_file(path, metrics_format)
+        print(f'Metrics written in {path}')
+    elif metrics_format == 'prometheus':
+        print(metrics.to_prometheus())
+    else:
+        print(metrics.to_json())
+
+
+def print_rows(rows):
+    '''
+    Print the rows of a query as JSON lines
+    '''
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False, default=str))
+
+
+def init_db(args):
+    '''
+    Create the schema of the database, or update the one of a previous
+    version, and the maintenance of the options
+    '''
+    database = get_database(args)
+    database.construct_schema(args.storage)
+    if args.migrate:
+        database.migrate_storage(args.migrate)
+    if args.indexes:
+        database.create_indexes()
+    if args.rebuild_rollups:
+        database.rebuild_rollups()
+    if args.rebuild_search:
+        database.rebuild_search()
+    print(f'database path: {database.get_database_path()}')
+    print(f'storage: {database.get_storage()}')
+
+
+def crawl(args):
+    '''
+    Capture the period with Process, or with Backfill by partitions
+    '''
+    if args.backfill:
+        from backfill import Backfill
+
+        backfill = Backfill(workers=args.backfill, partition=args.partition,
+                            max_workers=args.workers,
+                            rows_per_page=args.rows_per_page,
+                            adaptive_page_size=args.adaptive_page_size,
+                            upsert=args.upsert)
+        metrics = None
+        if args.metrics:
+            from metrics import Metrics
+
+            metrics = Metrics()
+            backfill.add_hook(metrics)
+        backfill.run(args.initial_date, args.final_date,
+                     config=get_config(args), database=get_database(args),
+                     job_id=args.job_id)
+        if metrics is not None:
+            metrics.finish()
+            write_metrics(metrics, args.metrics, args.metrics_file)
+        return
+    process = get_process(args, pipeline=args.pipeline,
+                          rows_per_page=args.rows_per_page,
+                          adaptive_page_size=args.adaptive_page_size,
+                          metrics=args.metrics,
+                          metrics_file=args.metrics_file)
+    process.capture_data(args.initial_date, args.final_date,
+                         config=get_config(args))
+
+
+def sync(args):
+    '''
+    Capture the revisions after the last one in database
+    '''
+    get_process(args).sync(config=get_config(args))
+
+
+def watch(args):
+    '''
+    Poll the server for new revisions until interrupted
+    '''
+    get_process(args).watch(interval=args.interval, config=get_config(args),
+                            max_polls=args.max_polls)
+
+
+def query(args):
+    '''
+    Print the rows of the query of database
+    '''
+    database = get_database(args)
+    if args.query == 'revision':
+        revision = database.get_revision(args.build, args.kb or '')
+        print_rows([revision] if revision is not None else [])
+    elif args.query == 'history':
+        print_rows(database.get_object_history(args.guid, args.kb))
+    elif args.query == 'user':
+        print_rows(database.get_revisions_by_user(
+            args.user, args.initial_date, args.final_date, args.kb))
+    elif args.query == 'most-changed':
+        print_rows(database.get_most_changed_objects(
+            args.initial_date, args.final_date, args.limit, args.kb))
+    elif args.query == 'search':
+        print_rows(database.search(args.text, args.limit, args.raw, args.kb))
+    elif args.query == 'activity':
+        print_rows(database.get_activity_by_user(
+            args.initial_date, args.final_date, args.user, args.kb))
+    elif args.query == 'churn':
+        print_rows(database.get_object_churn(
+            args.initial_date, args.final_date, args.type, args.kb))
+
+
+def export(args):
+    '''
+    Export the revisions to a file
+    '''
+    statistics = get_database(args).export_revisions(
+        args.path, file_format=args.format, since_build=args.since_build,
+        revision_kb=args.kb, chunk_size=args.chunk_size)
+    print(f'Exported {statistics["revisions"]} revisions and '
+          f'{statistics["objects"]} objects')
+    if statistics['last_builds']:
+        print(f'Next export: --since-build '
+              f'{format_builds(statistics["last_builds"])}')
+
+
+def import_revisions(args):
+    '''
+    Import the revisions of a file of export
+    '''
+    statistics = get_database(args).import_revisions(
+        args.path, file_format=args.format, batch_size=args.batch_size,
+        upsert=args.upsert)
+    print(f'Imported {statistics["revisions"]} revisions and '
+          f'{statistics["objects"]} objects '
+          f'({statistics["rows_per_second"]:.0f} rows/s)')
+
+
+def get_parser():
+    '''
+    Parser of the command line, with a subcommand by command
+    Returns:
+    -------
+        parser: ArgumentParser
+    '''
+    parser = argparse.ArgumentParser(
+        prog='gxcrawler',
+        description='Crawler of the activity of the genexus server 16')
+    parser.add_argument('--database', metavar='PATH',
+                        help='database file (database.db of the current '
+                             'directory by default)')
+    commands = parser.add_subparsers(dest='command', metavar='command',
+                                     required=True)
+
+    init_parser = commands.add_parser('init-db',
+                                      help='create or update the schema')
+    init_parser.add_argument('--storage', choices=('flat', 'normalized'),
+                             help='storage of the objects of revisions of a '
+                                  'new database (flat by default)')
+    init_parser.add_argument('--migrate', choices=('flat', 'normalized'),
+                             help='convert the objects of revisions of the '
+                                  'database to the storage')
+    init_parser.add_argument('--indexes', action='store_true',
+                             help='create the secondary indexes of the '
+                                  'queries')
+    init_parser.add_argument('--rebuild-rollups', action='store_true',
+                             help='compute again the rollup tables')
+    init_parser.add_argument('--rebuild-search', action='store_true',
+                             help='fill again the full text index of the '
+                                  'comments and names of objects')
+    init_parser.set_defaults(function=init_db)
+
+    # Options of the commands that access the server
+    server_parser = argparse.ArgumentParser(add_help=False)
+    server_parser.add_argument('--config', choices=('ENV', 'FILE'),
+                               help='credentials of the environment '
+                                    'variables or of the file .env (the '
+                                    'environment variables and then the '
+                                    'file by default)')
+    server_parser.add_argument('--workers', type=int, default=1,
+                               help='parallel requests of objects')
+    server_parser.add_argument('--upsert', action='store_true',
+                               help='replace the revisions already in '
+                                    'database')
+
+    crawl_parser = commands.add_parser('crawl', parents=[server_parser],
+                                       help='capture a period')
+    crawl_parser.add_argument('initial_date', type=parse_date,
+                              help='YYYY-MM-DD')
+    crawl_parser.add_argument('final_date', type=parse_date,
+                              help='YYYY-MM-DD')
+    crawl_parser.add_argument('--rows-per-page', type=int, default=10)
+    crawl_parser.add_argument('--adaptive-page-size', action='store_true')
+    crawl_parser.add_argument('--pipeline', action='store_true',
+                              help='grid, objects and database in separate '
+                                   'stages')
+    crawl_parser.add_argument('--metrics', choices=('json', 'prometheus'))
+    crawl_parser.add_argument('--metrics-file')
+    crawl_parser.add_argument('--backfill', type=int, metavar='WORKERS',
+                              help='partitions of the period crawled at the '
+                                   'same time by Backfill')
+    crawl_parser.add_argument('--partition', choices=('day', 'week'),
+                              default='day', help='partition of --backfill')
+    crawl_parser.add_argument('--job-id',
+                              help='checkpoint of --backfill, to resume')
+    crawl_parser.set_defaults(function=crawl)
+
+    sync_parser = commands.add_parser(
+        'sync', parents=[server_parser],
+        help='capture the revisions after the last one in database')
+    sync_parser.set_defaults(function=sync)
+
+    watch_parser = commands.add_parser(
+        'watch', parents=[server_parser],
+        help='poll the server for new revisions until interrupted')
+    watch_parser.add_argument('--interval', type=float, default=10,
+                              help='seconds between the polls')
+    watch_parser.add_argument('--max-polls', type=int)
+    watch_parser.set_defaults(function=watch)
+
+    query_parser = commands.add_parser(
+        'query', help='query the database, the rows as JSON lines')
+    query_parser.set_defaults(function=query)
+    queries = query_parser.add_subparsers(dest='query', metavar='query',
+                                          required=True)
+    kb_parser = argparse.ArgumentParser(add_help=False)
+    kb_parser.add_argument('--kb', help='knowledge base (revision_kb), all '
+                                        'by default')
+    period_parser = argparse.ArgumentParser(add_help=False)
+    period_parser.add_argument('initial_date', type=parse_date,
+                               help='YYYY-MM-DD')
+    period_parser.add_argument('final_date', type=parse_date,
+                               help='YYYY-MM-DD')
+
+    revision_parser = queries.add_parser(
+        'revision', parents=[kb_parser], help='revision with its objects')
+    revision_parser.add_argument('build', type=int)
+    history_parser = queries.add_parser(
+        'history', parents=[kb_parser],
+        help='revisions that changed the object')
+    history_parser.add_argument('guid')
+    user_parser = queries.add_parser('user', parents=[kb_parser],
+                                     help='revisions of the user')
+    user_parser.add_argument('user')
+    user_parser.add_argument('--initial-date', type=parse_date)
+    user_parser.add_argument('--final-date', type=parse_date)
+    most_changed_parser = queries.add_parser(
+        'most-changed', parents=[period_parser, kb_parser],
+        help='objects changed by more revisions')
+    most_changed_parser.add_argument('--limit', type=int, default=10)
+    search_parser = queries.add_parser(
+        'search', parents=[kb_parser],
+        help='full text search of comments and names of objects')
+    search_parser.add_argument('text')
+    search_parser.add_argument('--limit', type=int, default=20)
+    search_parser.add_argument('--raw', action='store_true',
+                               help='query syntax of FTS5')
+    activity_parser = queries.add_parser(
+        'activity', parents=[period_parser, kb_parser],
+        help='revisions and objects by user and day')
+    activity_parser.add_argument('--user')
+    churn_parser = queries.add_parser(
+        'churn', parents=[period_parser, kb_parser],
+        help='changes by type of object, operation and day')
+    churn_parser.add_argument('--type')
+
+    export_parser = commands.add_parser(
+        'export', parents=[kb_parser],
+        help='export the revisions to .jsonl.gz or .parquet')
+    export_parser.add_argument('path')
+    export_parser.add_argument('--format', choices=('jsonl', 'parquet'),
+                               help='by the extension of path by default')
+    export_parser.add_argument('--since-build', type=parse_builds,
+                               metavar='BUILD',
+                               help='only the revisions after this build, '
+                                    'or after the build of each knowledge '
+                                    'base: KB=BUILD,... as printed by the '
+                                    'previous export')
+    export_parser.add_argument('--chunk-size', type=int, default=1000)
+    export_parser.set_defaults(function=export)
+
+    import_parser = commands.add_parser(
+        'import', help='import the revisions of a file of export')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=('jsonl', 'parquet'),
+                               help='by the extension of path by default')
+    import_parser.add_argument('--batch-size', type=int, default=500)
+    import_parser.add_argument('--upsert', action='store_true',
+                               help='replace the revisions already in '
+                                    'database')
+    import_parser.set_defaults(function=import_revisions)
+    return parser
+
+
+def main(argv=None):
+    '''
+    Run the command of the command line
+    Params:
+    ------
+        argv: List<String> (sys.argv[1:] when not informed)
+    '''
+    args = get_parser().parse_args(argv)
+    try:
+        args.function(args)
+    except KeyboardInterrupt:
+        print('Interrupted.')
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
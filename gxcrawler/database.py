@@ -1,15 +1,171 @@
 '''database manager'''
 import os
+import time
 import sqlite3
 
+from records import Revision, RevisionObject
+
 
 class DataBase():
     '''
     Class database operations
     '''
+    JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+    SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+    # flat: revision_objects with the type, name and guid of the object in
+    # each row. normalized: revision_objects with the id of the object in
+    # the table objects, whose type is in the table object_types
+    STORAGES = ('flat', 'normalized')
+    # Day of the revision as YYYY-MM-DD, the server returns the date as
+    # MM/DD/YY hh:mm AM. The indexes of expression are used only by the
+    # queries with the same expression
+    REVISION_DAY = ("('20' || substr(revision_date, 7, 2) || '-' || "
+                    "substr(revision_date, 1, 2) || '-' || "
+                    "substr(revision_date, 4, 2))")
+    # Full text index of the comment and of the names of the objects of
+    # each revision, the rowid is the revision_build
+    SEARCH_SCHEMA = '''
+        CREATE VIRTUAL TABLE revision_search USING fts5(
+            revision_comment,
+            object_names,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '3'
+        )
+    '''
+    # Aggregates by day updated by each insertion, for the dashboards
+    ROLLUP_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS rollup_user_day(
+            day TEXT,
+            revision_kb TEXT,
+            revision_user TEXT,
+            revisions INTEGER DEFAULT 0,
+            objects INTEGER DEFAULT 0,
+            PRIMARY KEY(day, revision_kb, revision_user)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS rollup_object_type_day(
+            day TEXT,
+            revision_kb TEXT,
+            object_type TEXT,
+            object_operation TEXT,
+            changes INTEGER DEFAULT 0,
+            PRIMARY KEY(day, revision_kb, object_type, object_operation)
+        ) WITHOUT ROWID;
+    '''
+    # The builds are numbered by knowledge base, a revision is identified
+    # by revision_kb and revision_build. The revisions of databases of
+    # previous versions, of a single knowledge base, have revision_kb ''
+    REVISION_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS revision(
+            revision_build INTEGER,
+            revision_date TEXT,
+            revision_seconds INTEGER,
+            revision_user TEXT,
+            revision_comment TEXT,
+            revision_name TEXT,
+            revision_operation TEXT,
+            revision_kb TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY(revision_kb, revision_build)
+        )
+    '''
+    # Secondary indexes, created after the bulk ingestion. The objects of
+    # a revision are found by the unique index of revision_objects
+    INDEXES = {
+        'idx_revision_day': f'revision({REVISION_DAY})',
+        'idx_revision_user_day': f'revision(revision_user, {REVISION_DAY})',
+    }
+    STORAGE_INDEXES = {
+        'flat': {
+            'idx_revision_objects_gu_id': 'revision_objects(object_gu_id)',
+        },
+        # The guid of the objects is indexed by the unique of objects
+        'normalized': {
+            'idx_revision_objects_object': 'revision_objects(object_id)',
+        },
+    }
+
+    # Columns of the unique index of revision_objects, an object appears
+    # once by revision
+    UNIQUE_OBJECTS = {
+        'flat': ('revision_kb', 'revision_build', 'object_gu_id'),
+        'normalized': ('revision_kb', 'revision_build', 'object_id'),
+    }
+
+    FLAT_OBJECTS_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS revision_objects(
+            revision_build INTEGER,
+            object_type TEXT,
+            object_name TEXT,
+            object_gu_id TEXT,
+            object_entity_id INTEGER,
+            object_operation TEXT,
+            revision_kb TEXT NOT NULL DEFAULT '',
+            FOREIGN KEY(revision_kb, revision_build)
+                REFERENCES revision(revision_kb, revision_build)
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_revision_objects_unique
+        ON revision_objects(revision_kb, revision_build, object_gu_id);
+
+        CREATE VIEW IF NOT EXISTS revision_objects_flat AS
+        SELECT revision_kb, revision_build, object_type, object_name,
+            object_gu_id, object_entity_id, object_operation
+        FROM revision_objects;
+    '''
+
+    NORMALIZED_OBJECTS_SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS object_types(
+            object_type_id INTEGER PRIMARY KEY,
+            object_type TEXT UNIQUE
+        );
+
+        CREATE TABLE IF NOT EXISTS objects(
+            object_id INTEGER PRIMARY KEY,
+            object_type_id INTEGER,
+            object_name TEXT,
+            object_gu_id TEXT,
+            object_entity_id INTEGER,
+            UNIQUE(object_gu_id, object_entity_id, object_type_id,
+                   object_name),
+            FOREIGN KEY(object_type_id) REFERENCES object_types(object_type_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS revision_objects(
+            revision_build INTEGER,
+            object_id INTEGER,
+            object_operation TEXT,
+            revision_kb TEXT NOT NULL DEFAULT '',
+            FOREIGN KEY(revision_kb, revision_build)
+                REFERENCES revision(revision_kb, revision_build),
+            FOREIGN KEY(object_id) REFERENCES objects(object_id)
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_revision_objects_unique
+        ON revision_objects(revision_kb, revision_build, object_id);
+
+        CREATE VIEW IF NOT EXISTS revision_objects_flat AS
+        SELECT revision_objects.revision_kb, revision_objects.revision_build,
+            object_types.object_type,
+            objects.object_name, objects.object_gu_id,
+            objects.object_entity_id, revision_objects.object_operation
+        FROM revision_objects
+        JOIN objects ON objects.object_id = revision_objects.object_id
+        JOIN object_types
+            ON object_types.object_type_id = objects.object_type_id;
+    '''
+
     def __init__(self, database_path=None):
         self.in_memory = None
         self.conn = None
+        self.__storage = None
+        self.__search = None
+        self.__rollups = None
+        # Ids of the types and of the objects already in database, for the
+        # normalized storage
+        self.__type_ids = {}
+        self.__object_ids = {}
+        # Callables hook(event, data) called after each writing
+        self.hooks = []
 
         if database_path:
             self.__database_path = database_path
@@ -18,6 +174,30 @@ class DataBase():
 
         self.conn = self.__generate_db(self.__database_path, False)
 
+    def add_hook(self, hook):
+        '''
+        Register a callable hook(event, data), called after each
+        transaction of writing with the event 'write' and data with
+        revisions, objects and seconds
+        '''
+        if hook not in self.hooks:
+            self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        '''
+        Remove a hook registered by add_hook
+        '''
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+
+    def __emit_write(self, revisions, objects, seconds):
+        '''
+        Call the hooks with the writing of revisions
+        '''
+        for hook in self.hooks:
+            hook('write', {'revisions': revisions, 'objects': objects,
+                           'seconds': seconds})
+
     def get_database_path(self):
         '''
         Method get path of file db sqlite
@@ -39,91 +219,1567 @@ class DataBase():
             conn = sqlite3.connect(path)
             return conn
 
-    def construct_schema(self):
+    def construct_schema(self, storage=None):
         '''
         Construct schema in database
+        Params:
+        ------
+            storage: String (flat or normalized, storage of the objects of
+                     revisions of a new database, the storage of an existing
+                     database is changed by migrate_storage)
         '''
-        schema = '''
-            CREATE TABLE IF NOT EXISTS revision(
-                revision_build INTEGER PRIMARY KEY,
-                revision_date TEXT,
-                revision_seconds INTEGER,
-                revision_user TEXT,
-                revision_comment TEXT,
-                revision_name TEXT,
-                revision_operation TEXT
-            );
+        if storage is not None and storage not in self.STORAGES:
+            raise ValueError(f'Invalid storage: {storage}')
+        schema = self.REVISION_SCHEMA + ''';
 
-            CREATE TABLE IF NOT EXISTS revision_objects(
-                revision_build INTEGER,
-                object_type TEXT,
-                object_name TEXT,
-                object_gu_id TEXT,
-                object_entity_id INTEGER,
-                object_operation TEXT,
-                FOREIGN KEY(revision_build) REFERENCES revision(revision_build)
+            CREATE TABLE IF NOT EXISTS crawl_checkpoint(
+                job_id TEXT,
+                partition_start TEXT,
+                partition_end TEXT,
+                page INTEGER,
+                page_size INTEGER DEFAULT 10,
+                last_build INTEGER,
+                finished INTEGER DEFAULT 0,
+                updated_at TEXT,
+                PRIMARY KEY(job_id, partition_start)
             );
         '''
 
+        current = self.get_storage()
+        if current is not None and storage is not None and current != storage:
+            raise Exception(f'Database with {current} storage, use '
+                            f'migrate_storage to change it.')
+        storage = current or storage or 'flat'
+        if storage == 'normalized':
+            schema += self.NORMALIZED_OBJECTS_SCHEMA
+        else:
+            schema += self.FLAT_OBJECTS_SCHEMA
+
         cursor = self.conn.cursor()
-        cursor.executescript(schema)
+        cursor.execute('''
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'rollup_user_day' ''')
+        new_rollups = cursor.fetchone() is None
+        removed = 0
+        indexes = False
+        if current is not None:
+            cursor.execute('PRAGMA table_info(revision)')
+            if 'revision_kb' not in {row[1] for row in cursor.fetchall()}:
+                indexes = self.has_indexes()
+                removed = self.__add_kb(cursor, current)
+                new_rollups = True
+            # Databases of previous versions, without the unique index of
+            # revision_objects and with the index of revision_build
+            removed += self.__remove_duplicates(cursor, current)
+            cursor.execute('DROP INDEX IF EXISTS idx_revision_objects_build')
+        cursor.executescript(schema + self.ROLLUP_SCHEMA)
+        self.__add_columns(cursor, 'crawl_checkpoint',
+                           {'page_size': 'INTEGER DEFAULT 10'})
         self.conn.commit()
         cursor.close()
+        self.__storage = storage
+        self.__rollups = True
+        # The indexes of revision were dropped with the previous table
+        if indexes:
+            self.create_indexes()
+        if (new_rollups or removed) and self.conn.execute(
+                'SELECT 1 FROM revision LIMIT 1').fetchone():
+            self.rebuild_rollups()
+        self.__construct_search()
+        if removed and self.__search:
+            self.rebuild_search()
+
+    def __add_kb(self, cursor, storage):
+        '''
+        Add the knowledge base to the revisions of a database of a previous
+        version, with revision_kb '' and the rowid of the revisions kept,
+        it is the rowid of the full text index. revision_objects is created
+        again with the foreign key of revision_kb and revision_build, and
+        its unique index. The rollups are dropped to be computed again by
+        knowledge base
+        Params:
+        ------
+            cursor: Cursor
+            storage: String (flat or normalized)
+        Returns:
+        -------
+            removed: int (repeated objects of a revision not copied)
+        '''
+        if not self.conn.in_transaction:
+            cursor.execute('BEGIN')
+        # Without the legacy rename, the foreign keys of revision_objects
+        # would be changed to the previous table
+        cursor.execute('PRAGMA legacy_alter_table = ON')
+        cursor.execute('ALTER TABLE revision RENAME TO revision_previous')
+        cursor.execute('PRAGMA legacy_alter_table = OFF')
+        cursor.execute(self.REVISION_SCHEMA)
+        cursor.execute('''
+            INSERT INTO revision(
+                rowid, revision_build, revision_date, revision_seconds,
+                revision_user, revision_comment, revision_name,
+                revision_operation)
+            SELECT revision_build, revision_build, revision_date,
+                revision_seconds, revision_user, revision_comment,
+                revision_name, revision_operation
+            FROM revision_previous''')
+
+        # The foreign key of a column is not changed by ALTER TABLE
+        cursor.execute('DROP VIEW IF EXISTS revision_objects_flat')
+        cursor.execute('DROP INDEX IF EXISTS idx_revision_objects_unique')
+        cursor.execute('ALTER TABLE revision_objects '
+                       'RENAME TO revision_objects_previous')
+        schema = (self.NORMALIZED_OBJECTS_SCHEMA if storage == 'normalized'
+                  else self.FLAT_OBJECTS_SCHEMA)
+        for statement in schema.split(';'):
+            if statement.strip():
+                cursor.execute(statement)
+        cursor.execute('PRAGMA table_info(revision_objects_previous)')
+        columns = ', '.join(row[1] for row in cursor.fetchall())
+        # The first of the repeated objects of a revision is kept
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO revision_objects({columns})
+            SELECT {columns} FROM revision_objects_previous
+            ORDER BY rowid''')
+        moved = cursor.rowcount
+        cursor.execute('SELECT COUNT(*) FROM revision_objects_previous')
+        removed = cursor.fetchone()[0] - moved
+        # The previous objects referenced the previous revisions
+        cursor.execute('DROP TABLE revision_objects_previous')
+        cursor.execute('DROP TABLE revision_previous')
+        if removed:
+            print(f'Removed {removed} repeated objects of revisions')
+
+        cursor.execute('DROP TABLE IF EXISTS rollup_user_day')
+        cursor.execute('DROP TABLE IF EXISTS rollup_object_type_day')
+        return removed
+
+    def __remove_duplicates(self, cursor, storage):
+        '''
+        Delete the repeated objects of a revision, keeping the first one,
+        before the creation of the unique index of revision_objects
+        Returns:
+        -------
+            removed: int (rows deleted)
+        '''
+        cursor.execute('''
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'index' AND name = 'idx_revision_objects_unique' ''')
+        if cursor.fetchone() is not None:
+            return 0
+        columns = ', '.join(self.UNIQUE_OBJECTS[storage])
+        cursor.execute(f'''
+            DELETE FROM revision_objects
+            WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM revision_objects
+                GROUP BY {columns})''')
+        removed = max(cursor.rowcount, 0)
+        if removed:
+            print(f'Removed {removed} repeated objects of revisions')
+        return removed
+
+    def __construct_search(self):
+        '''
+        Create the full text index, filled with the revisions already in
+        database. The index is not created when SQLite is compiled without
+        FTS5
+        '''
+        if self.has_search():
+            return
+        try:
+            self.conn.execute(self.SEARCH_SCHEMA)
+        except sqlite3.OperationalError as error:
+            print(f'Full text search not available: {error}')
+            self.__search = False
+            return
+        self.conn.commit()
+        self.__search = True
+        if self.conn.execute('SELECT 1 FROM revision LIMIT 1').fetchone():
+            self.rebuild_search()
 
-    def insert_revision(self, rev):
+    def has_search(self):
+        '''
+        Check if the database has the full text index
+        '''
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'revision_search' ''')
+        self.__search = cursor.fetchone() is not None
+        cursor.close()
+        return self.__search
+
+    def rebuild_search(self):
+        '''
+        Fill again the full text index with the revisions of database, for
+        databases of previous versions or written without the index
+        '''
+        if not self.has_search():
+            raise Exception('Database without full text index, use '
+                            'construct_schema.')
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('DELETE FROM revision_search')
+            cursor.execute('''
+                INSERT INTO revision_search(
+                    rowid, revision_comment, object_names)
+                SELECT revision.rowid, revision.revision_comment,
+                    (SELECT group_concat(object_name, ' ')
+                     FROM revision_objects_flat
+                     WHERE revision_objects_flat.revision_kb =
+                        revision.revision_kb
+                        AND revision_objects_flat.revision_build =
+                        revision.revision_build)
+                FROM revision''')
+            cursor.execute('''
+                INSERT INTO revision_search(revision_search)
+                VALUES('optimize')''')
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def has_rollups(self):
+        '''
+        Check if the database has the rollup tables
+        '''
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'rollup_user_day' ''')
+        self.__rollups = cursor.fetchone() is not None
+        cursor.close()
+        return self.__rollups
+
+    def rebuild_rollups(self):
+        '''
+        Compute again the rollup tables from the revisions of database
+        '''
+        if not self.has_rollups():
+            raise Exception('Database without rollup tables, use '
+                            'construct_schema.')
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('DELETE FROM rollup_user_day')
+            cursor.execute('DELETE FROM rollup_object_type_day')
+            cursor.execute(f'''
+                INSERT INTO rollup_user_day(
+                    day, revision_kb, revision_user, revisions, objects)
+                SELECT {self.REVISION_DAY}, revision.revision_kb,
+                    revision_user, COUNT(*), COALESCE(SUM(objects.count), 0)
+                FROM revision
+                LEFT JOIN (
+                    SELECT revision_kb, revision_build, COUNT(*) AS count
+                    FROM revision_objects
+                    GROUP BY revision_kb, revision_build) AS objects
+                    ON objects.revision_kb = revision.revision_kb
+                    AND objects.revision_build = revision.revision_build
+                GROUP BY 1, 2, 3''')
+            cursor.execute(f'''
+                INSERT INTO rollup_object_type_day(
+                    day, revision_kb, object_type, object_operation, changes)
+                SELECT {self.REVISION_DAY}, revision.revision_kb,
+                    revision_objects_flat.object_type,
+                    revision_objects_flat.object_operation, COUNT(*)
+                FROM revision_objects_flat
+                JOIN revision
+                    ON revision.revision_kb = revision_objects_flat.revision_kb
+                    AND revision.revision_build =
+                        revision_objects_flat.revision_build
+                GROUP BY 1, 2, 3, 4''')
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def get_activity_by_user(self, initial_date, final_date,
+                             revision_user=None, revision_kb=None):
+        '''
+        Revisions and objects changed by user and day, from the rollups
+        Params:
+        ------
+            initial_date: date (first day, included)
+            final_date: date (last day, included)
+            revision_user: String (all users when not informed)
+            revision_kb: String (all knowledge bases when not informed)
+        Returns:
+        ------
+            activity: List<Dict> (day, revision_kb, revision_user,
+                      revisions and objects)
+        '''
+        query = '''
+            SELECT day, revision_kb, revision_user, revisions, objects
+            FROM rollup_user_day
+            WHERE day BETWEEN ? AND ?'''
+        parameters = [self.__get_day(initial_date),
+                      self.__get_day(final_date)]
+        if revision_user is not None:
+            query += ' AND revision_user = ?'
+            parameters.append(revision_user)
+        if revision_kb is not None:
+            query += ' AND revision_kb = ?'
+            parameters.append(revision_kb)
+        query += ' ORDER BY day, revision_kb, revision_user'
+
+        cursor = self.conn.cursor()
+        cursor.execute(query, parameters)
+        activity = self.__fetch_dicts(cursor)
+        cursor.close()
+        return activity
+
+    def get_object_churn(self, initial_date, final_date, object_type=None,
+                         revision_kb=None):
+        '''
+        Changes of objects by type, operation and day, from the rollups
+        Params:
+        ------
+            initial_date: date (first day, included)
+            final_date: date (last day, included)
+            object_type: String (all types when not informed)
+            revision_kb: String (all knowledge bases when not informed)
+        Returns:
+        ------
+            churn: List<Dict> (day, revision_kb, object_type,
+                   object_operation and changes)
+        '''
+        query = '''
+            SELECT day, revision_kb, object_type, object_operation, changes
+            FROM rollup_object_type_day
+            WHERE day BETWEEN ? AND ?'''
+        parameters = [self.__get_day(initial_date),
+                      self.__get_day(final_date)]
+        if object_type is not None:
+            query += ' AND object_type = ?'
+            parameters.append(object_type)
+        if revision_kb is not None:
+            query += ' AND revision_kb = ?'
+            parameters.append(revision_kb)
+        query += ' ORDER BY day, revision_kb, object_type, object_operation'
+
+        cursor = self.conn.cursor()
+        cursor.execute(query, parameters)
+        churn = self.__fetch_dicts(cursor)
+        cursor.close()
+        return churn
+
+    def search(self, text, limit=20, raw=False, revision_kb=None):
+        '''
+        Search the revisions by words of the comment and of the names of
+        the objects, the most relevant first
+        Params:
+        ------
+            text: String (words that must be in the revision, a word ending
+                  in * matches the words that start with it)
+            limit: int
+            raw: bool (text in the query syntax of FTS5, ex:
+                 'revision_comment: invoice OR object_names: Invoice*')
+            revision_kb: String (all knowledge bases when not informed)
+        Returns:
+        ------
+            revisions: List<Dict> (with revision_objects and rank, lower is
+                       more relevant)
+
+        Ex: database.search('fix invoice')
+        '''
+        if not raw:
+            text = self.__get_search_query(text)
+            if not text:
+                return []
+        query = '''
+            SELECT revision.revision_kb, revision.revision_build,
+                bm25(revision_search, 2.0, 1.0) AS rank
+            FROM revision_search
+            JOIN revision ON revision.rowid = revision_search.rowid
+            WHERE revision_search MATCH ?'''
+        parameters = [text]
+        if revision_kb is not None:
+            query += ' AND revision.revision_kb = ?'
+            parameters.append(revision_kb)
+        # The matches in the comment weigh more than in the names
+        query += ' ORDER BY rank LIMIT ?'
+        parameters.append(limit)
+        cursor = self.conn.cursor()
+        cursor.execute(query, parameters)
+        ranks = {(kb, build): rank for kb, build, rank in cursor.fetchall()}
+        cursor.close()
+
+        builds = {}
+        for kb, build in ranks:
+            builds.setdefault(kb, []).append(build)
+        revisions = []
+        for kb, kb_builds in builds.items():
+            revisions += self.get_revisions(kb_builds, kb)
+        for revision in revisions:
+            revision['rank'] = ranks[(revision['revision_kb'],
+                                      revision['revision_build'])]
+        revisions.sort(key=lambda revision: revision['rank'])
+        return revisions
+
+    def __get_search_query(self, text):
+        '''
+        Query of FTS5 with each word of the text between quotes, so that
+        the characters of the query syntax are searched as text
+        '''
+        terms = []
+        for word in text.split():
+            prefix = word.endswith('*')
+            word = word.rstrip('*').replace('"', '""')
+            if word:
+                terms.append(f'"{word}"*' if prefix else f'"{word}"')
+        return ' '.join(terms)
+
+    def get_storage(self):
+        '''
+        Storage of the objects of revisions in database
+        Returns:
+        ------
+            storage: String (flat, normalized or None without schema)
+        '''
+        cursor = self.conn.cursor()
+        cursor.execute('PRAGMA table_info(revision_objects)')
+        columns = {row[1] for row in cursor.fetchall()}
+        cursor.close()
+        if not columns:
+            return None
+        return 'normalized' if 'object_id' in columns else 'flat'
+
+    def migrate_storage(self, storage='normalized', vacuum=True):
+        '''
+        Convert the objects of revisions of database to the storage, in a
+        transaction
+        Params:
+        ------
+            storage: String (flat or normalized)
+            vacuum: bool (rebuild the file of database, releasing the space
+                    of the previous tables)
+        '''
+        if storage not in self.STORAGES:
+            raise ValueError(f'Invalid storage: {storage}')
+        current = self.get_storage()
+        if current is None:
+            raise Exception('Database without schema, use construct_schema.')
+        if current == storage:
+            return
+
+        indexes = self.has_indexes()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            removed = self.__remove_duplicates(cursor, current)
+            if storage == 'normalized':
+                removed += self.__migrate_to_normalized(cursor)
+            else:
+                removed += self.__migrate_to_flat(cursor)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        self.__storage = storage
+        self.__type_ids = {}
+        self.__object_ids = {}
+        # The indexes of revision_objects were dropped with the table
+        if indexes:
+            self.create_indexes()
+        if removed and self.has_rollups():
+            self.rebuild_rollups()
+        if removed and self.has_search():
+            self.rebuild_search()
+        if vacuum and not self.in_memory:
+            self.conn.execute('VACUUM')
+
+    def __migrate_to_normalized(self, cursor):
+        '''
+        Move the objects of the flat revision_objects to the tables
+        object_types and objects
+        Returns:
+        -------
+            removed: int (repeated objects of a revision not moved)
+        '''
+        cursor.execute('DROP VIEW IF EXISTS revision_objects_flat')
+        cursor.execute('DROP INDEX IF EXISTS idx_revision_objects_unique')
+        cursor.execute('ALTER TABLE revision_objects '
+                       'RENAME TO revision_objects_previous')
+        for statement in self.NORMALIZED_OBJECTS_SCHEMA.split(';'):
+            if statement.strip():
+                cursor.execute(statement)
+        cursor.execute('''
+            INSERT OR IGNORE INTO object_types(object_type)
+            SELECT DISTINCT object_type FROM revision_objects_previous''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO objects(
+                object_type_id, object_name, object_gu_id, object_entity_id)
+            SELECT DISTINCT object_types.object_type_id,
+                previous.object_name, previous.object_gu_id,
+                previous.object_entity_id
+            FROM revision_objects_previous AS previous
+            JOIN object_types
+                ON object_types.object_type IS previous.object_type''')
+        cursor.execute('''
+            INSERT INTO revision_objects(
+                revision_build, object_id, object_operation, revision_kb)
+            SELECT previous.revision_build, objects.object_id,
+                previous.object_operation, previous.revision_kb
+            FROM revision_objects_previous AS previous
+            JOIN object_types
+                ON object_types.object_type IS previous.object_type
+            JOIN objects
+                ON objects.object_gu_id IS previous.object_gu_id
+                AND objects.object_entity_id IS previous.object_entity_id
+                AND objects.object_type_id = object_types.object_type_id
+                AND objects.object_name IS previous.object_name
+            ORDER BY previous.rowid''')
+        cursor.execute('DROP TABLE revision_objects_previous')
+        return 0
+
+    def __migrate_to_flat(self, cursor):
+        '''
+        Move the objects of the normalized revision_objects to the flat
+        revision_objects
+        Returns:
+        -------
+            removed: int (repeated objects of a revision not moved, the
+                     same guid with other name or type)
+        '''
+        cursor.execute('''
+            CREATE TABLE revision_objects_previous AS
+            SELECT revision_objects.revision_build, object_types.object_type,
+                objects.object_name, objects.object_gu_id,
+                objects.object_entity_id, revision_objects.object_operation,
+                revision_objects.revision_kb
+            FROM revision_objects
+            JOIN objects ON objects.object_id = revision_objects.object_id
+            JOIN object_types
+                ON object_types.object_type_id = objects.object_type_id
+            ORDER BY revision_objects.rowid''')
+        cursor.execute('DROP VIEW revision_objects_flat')
+        cursor.execute('DROP TABLE revision_objects')
+        cursor.execute('DROP TABLE objects')
+        cursor.execute('DROP TABLE object_types')
+        for statement in self.FLAT_OBJECTS_SCHEMA.split(';'):
+            if statement.strip():
+                cursor.execute(statement)
+        cursor.execute('''
+            INSERT OR IGNORE INTO revision_objects(
+                revision_build, object_type, object_name, object_gu_id,
+                object_entity_id, object_operation, revision_kb)
+            SELECT revision_build, object_type, object_name, object_gu_id,
+                object_entity_id, object_operation, revision_kb
+            FROM revision_objects_previous''')
+        moved = cursor.rowcount
+        cursor.execute('SELECT COUNT(*) FROM revision_objects_previous')
+        removed = cursor.fetchone()[0] - moved
+        cursor.execute('DROP TABLE revision_objects_previous')
+        return removed
+
+    def __add_columns(self, cursor, table, columns):
+        '''
+        Add the columns missing in a table of a database of a previous
+        version
+        Params:
+        ------
+            cursor: Cursor
+            table: String
+            columns: Dict<String, String> (definition by column)
+        '''
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, definition in columns.items():
+            if column not in existing:
+                cursor.execute(
+                    f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    def get_last_revision(self, revision_kb=''):
+        '''
+        Get the watermark of the database, the revision with highest build
+        Params:
+        ------
+            revision_kb: String (knowledge base of the revisions)
+        Returns:
+        ------
+            revision: Dict (revision_build and revision_date) or None when
+                      the database is empty
+        '''
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT revision_build, revision_date
+            FROM revision
+            WHERE revision_kb = ?
+            ORDER BY revision_build DESC
+            LIMIT 1''', (revision_kb,))
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            return None
+        return {'revision_build': row[0], 'revision_date': row[1]}
+
+    def __get_indexes(self):
+        '''
+        Secondary indexes of the storage of database
+        Returns:
+        ------
+            indexes: Dict<String, String> (table and columns by name)
+        '''
+        storage = self.__storage or self.get_storage() or 'flat'
+        return {**self.INDEXES, **self.STORAGE_INDEXES[storage]}
+
+    def create_indexes(self):
+        '''
+        Create the secondary indexes used by the queries. Created after a
+        bulk ingestion, each index is built once instead of being updated
+        by each row
+        '''
+        cursor = self.conn.cursor()
+        for name, definition in self.__get_indexes().items():
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+        cursor.execute('ANALYZE')
+        self.conn.commit()
+        cursor.close()
+
+    def drop_indexes(self):
+        '''
+        Drop the secondary indexes, before a bulk ingestion
+        '''
+        cursor = self.conn.cursor()
+        for name in self.__get_indexes():
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        self.conn.commit()
+        cursor.close()
+
+    def has_indexes(self):
+        '''
+        Check if the secondary indexes exist
+        '''
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+        return set(self.__get_indexes()) <= existing
+
+    def __get_day(self, date):
+        '''
+        Day in the format of REVISION_DAY
+        Params:
+        ------
+            date: date or datetime
+        '''
+        return f'{date.year:04d}-{date.month:02d}-{date.day:02d}'
+
+    def __fetch_dicts(self, cursor):
+        '''
+        Rows of the cursor as dicts by name of column
+        '''
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_revision(self, revision_build, revision_kb=''):
+        '''
+        Get a revision with its objects
+        Params:
+        ------
+            revision_build: int
+            revision_kb: String (knowledge base of the revision)
+        Returns:
+        ------
+            revision: Dict (with revision_objects) or None
+        '''
+        revisions = self.get_revisions([revision_build], revision_kb)
+        return revisions[0] if revisions else None
+
+    def get_revisions(self, revision_builds, revision_kb=''):
+        '''
+        Get the revisions with their objects, in the order of the builds
+        Params:
+        ------
+            revision_builds: List<int>
+            revision_kb: String (knowledge base of the revisions)
+        Returns:
+        ------
+            revisions: List<Dict> (with revision_objects)
+        '''
+        revision_builds = [int(build) for build in revision_builds]
+        if not revision_builds:
+            return []
+        cursor = self.conn.cursor()
+        revisions = {}
+        # Limit of variables of a statement of old versions of SQLite
+        for start in range(0, len(revision_builds), 500):
+            builds = revision_builds[start:start + 500]
+            marks = ', '.join('?' * len(builds))
+            cursor.execute(f'''
+                SELECT revision_build, revision_date, revision_seconds,
+                    revision_user, revision_comment, revision_name,
+                    revision_operation, revision_kb
+                FROM revision
+                WHERE revision_kb = ? AND revision_build IN ({marks})''',
+                [revision_kb] + builds)
+            for revision in self.__fetch_dicts(cursor):
+                revision['revision_objects'] = []
+                revisions[revision['revision_build']] = revision
+            cursor.execute(f'''
+                SELECT revision_build, object_type, object_name,
+                    object_gu_id, object_entity_id, object_operation
+                FROM revision_objects_flat
+                WHERE revision_kb = ? AND revision_build IN ({marks})''',
+                [revision_kb] + builds)
+            for revision_object in self.__fetch_dicts(cursor):
+                revisions[revision_object.pop('revision_build')][
+                    'revision_objects'].append(revision_object)
+        cursor.close()
+        return [revisions[build] for build in revision_builds
+                if build in revisions]
+
+    def get_object_history(self, object_gu_id, revision_kb=None):
+        '''
+        Get the revisions that changed the object, the newest first
+        Params:
+        ------
+            object_gu_id: String
+            revision_kb: String (all knowledge bases when not informed)
+        Returns:
+        ------
+            revisions: List<Dict> (revision with object_name and
+                       object_operation)
+        '''
+        query = '''
+            SELECT revision.revision_kb, revision.revision_build,
+                revision.revision_date, revision.revision_user,
+                revision.revision_comment,
+                revision_objects_flat.object_type,
+                revision_objects_flat.object_name,
+                revision_objects_flat.object_operation
+            FROM revision_objects_flat
+            JOIN revision
+                ON revision.revision_kb = revision_objects_flat.revision_kb
+                AND revision.revision_build =
+                    revision_objects_flat.revision_build
+            WHERE revision_objects_flat.object_gu_id = ?'''
+        parameters = [object_gu_id]
+        if revision_kb is not None:
+            query += ' AND revision_objects_flat.revision_kb = ?'
+            parameters.append(revision_kb)
+        query += ' ORDER BY revision.revision_kb, revision.revision_build DESC'
+        cursor = self.conn.cursor()
+        cursor.execute(query, parameters)
+        revisions = self.__fetch_dicts(cursor)
+        cursor.close()
+        return revisions
+
+    def get_revisions_by_user(self, revision_user, initial_date=None,
+                              final_date=None, revision_kb=None):
+        '''
+        Get the revisions of the user in the period, the newest first
+        Params:
+        ------
+            revision_user: String
+            initial_date: date (first day, included)
+            final_date: date (last day, included)
+            revision_kb: String (all knowledge bases when not informed)
+        Returns:
+        ------
+            revisions: List<Dict> (without the objects)
+        '''
+        query = '''
+            SELECT revision_build, revision_date, revision_seconds,
+                revision_user, revision_comment, revision_name,
+                revision_operation, revision_kb
+            FROM revision
+            WHERE revision_user = ?'''
+        parameters = [revision_user]
+        if revision_kb is not None:
+            query += ' AND revision_kb = ?'
+            parameters.append(revision_kb)
+        if initial_date is not None:
+            query += f' AND {self.REVISION_DAY} >= ?'
+            parameters.append(self.__get_day(initial_date))
+        if final_date is not None:
+            query += f' AND {self.REVISION_DAY} <= ?'
+            parameters.append(self.__get_day(final_date))
+        query += ' ORDER BY revision_kb, revision_build DESC'
+
+        cursor = self.conn.cursor()
+        cursor.execute(query, parameters)
+        revisions = self.__fetch_dicts(cursor)
+        cursor.close()
+        return revisions
+
+    def get_most_changed_objects(self, initial_date, final_date, limit=10,
+                                 revision_kb=None):
+        '''
+        Get the objects changed by more revisions in the period
+        Params:
+        ------
+            initial_date: date (first day, included)
+            final_date: date (last day, included)
+            limit: int
+            revision_kb: String (all knowledge bases when not informed)
+        Returns:
+        ------
+            objects: List<Dict> (object with revision_kb and changes, the
+                     number of revisions)
+        '''
+        query = f'''
+            SELECT revision.revision_kb,
+                revision_objects_flat.object_gu_id,
+                revision_objects_flat.object_entity_id,
+                MAX(revision_objects_flat.object_type) AS object_type,
+                MAX(revision_objects_flat.object_name) AS object_name,
+                COUNT(DISTINCT revision.revision_build) AS changes
+            FROM revision
+            JOIN revision_objects_flat
+                ON revision_objects_flat.revision_kb = revision.revision_kb
+                AND revision_objects_flat.revision_build =
+                    revision.revision_build
+            WHERE {self.REVISION_DAY} BETWEEN ? AND ?'''
+        parameters = [self.__get_day(initial_date),
+                      self.__get_day(final_date)]
+        if revision_kb is not None:
+            query += ' AND revision.revision_kb = ?'
+            parameters.append(revision_kb)
+        query += '''
+            GROUP BY revision.revision_kb, revision_objects_flat.object_gu_id,
+                revision_objects_flat.object_entity_id
+            ORDER BY changes DESC
+            LIMIT ?'''
+        parameters.append(limit)
+        cursor = self.conn.cursor()
+        cursor.execute(query, parameters)
+        objects = self.__fetch_dicts(cursor)
+        cursor.close()
+        return objects
+
+    def set_pragmas(self, journal_mode=None, synchronous=None):
+        '''
+        Configure the journal and the synchronous mode of the connection,
+        used to speed up the ingestion
+        Params:
+        ------
+            journal_mode: String (DELETE, TRUNCATE, PERSIST, MEMORY, WAL
+                          or OFF)
+            synchronous: String (OFF, NORMAL, FULL or EXTRA)
+        '''
+        if journal_mode is not None:
+            if journal_mode.upper() not in self.JOURNAL_MODES:
+                raise ValueError(f'Invalid journal mode: {journal_mode}')
+            self.conn.execute(f'PRAGMA journal_mode={journal_mode.upper()}')
+        if synchronous is not None:
+            if synchronous.upper() not in self.SYNCHRONOUS:
+                raise ValueError(f'Invalid synchronous: {synchronous}')
+            self.conn.execute(f'PRAGMA synchronous={synchronous.upper()}')
+
+    def insert_revision(self, rev, upsert=False):
         '''
         Insert revision and revision_objects in database
         Params:
         ------
             rev: List<Dict>
+            upsert: bool (replace the revision when it is already in
+                    database, instead of raising IntegrityError)
         Returns:
         ------
             None
         '''
         try:
+            start = time.perf_counter()
             cursor = self.conn.cursor()
+            objects = self.__write_revisions(cursor, [rev], upsert)
+            self.conn.commit()
+            cursor.close()
+            self.__emit_write(1, objects, time.perf_counter() - start)
+        except sqlite3.IntegrityError as integrity_error:
+            self.__rollback()
+            print(rev)
+            raise sqlite3.IntegrityError() from integrity_error
+
+    def insert_revisions(self, revisions, batch_size=500, journal_mode=None,
+                         synchronous=None, defer_indexes=False, upsert=False):
+        '''
+        Insert revisions and revision_objects in batches, with one
+        transaction per batch
+        Params:
+        ------
+            revisions: Iterable<Dict>
+            batch_size: int (revisions per transaction)
+            journal_mode: String (journal mode during the ingestion,
+                          ex: WAL)
+            synchronous: String (synchronous during the ingestion,
+                         ex: NORMAL)
+            defer_indexes: bool (drop the secondary indexes during the
+                           ingestion and create them at the end, for bulk
+                           ingestions)
+            upsert: bool (replace the revisions already in database, so
+                    that overlapping or repeated crawls can be written
+                    again, instead of raising IntegrityError)
+        Returns:
+        ------
+            statistics: Dict (revisions, objects, seconds spent writing
+                        and rows_per_second)
+        '''
+        self.set_pragmas(journal_mode, synchronous)
+        statistics = {'revisions': 0, 'objects': 0, 'seconds': 0.0}
+
+        if defer_indexes:
+            self.drop_indexes()
+        cursor = self.conn.cursor()
+        batch = []
+        try:
+            for rev in revisions:
+                batch.append(rev)
+                if len(batch) >= batch_size:
+                    self.__write_batch(cursor, batch, statistics, upsert)
+                    batch = []
+            if batch:
+                self.__write_batch(cursor, batch, statistics, upsert)
+        finally:
+            cursor.close()
+            if defer_indexes:
+                self.create_indexes()
+
+        rows = statistics['revisions'] + statistics['objects']
+        statistics['rows_per_second'] = (
+            rows / statistics['seconds'] if statistics['seconds'] else 0.0)
+        return statistics
+
+    def __get_kbs(self):
+        '''
+        Knowledge bases of the revisions in database
+        Returns:
+        ------
+            kbs: List<String>
+        '''
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT DISTINCT revision_kb FROM revision ORDER BY revision_kb''')
+        kbs = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return kbs
+
+    def get_since_builds(self, since_build=None, revision_kb=None):
+        '''
+        Watermark of each knowledge base of an incremental read, the builds
+        are of different knowledge bases so one build is only valid with
+        revision_kb or in a database with a single knowledge base
+        Params:
+        ------
+            since_build: int or Dict<String, int> (build by revision_kb,
+                         the knowledge bases missing are read whole)
+            revision_kb: String (all knowledge bases when not informed)
+        Returns:
+        ------
+            since_builds: Dict<String, int> (None for the whole knowledge
+                          base)
+        '''
+        kbs = [revision_kb] if revision_kb is not None else self.__get_kbs()
+        if isinstance(since_build, dict):
+            return {kb: since_build.get(kb) for kb in kbs}
+        if since_build is not None and len(kbs) > 1:
+            raise ValueError(f'Database with {len(kbs)} knowledge bases, '
+                             f'inform revision_kb or a build by '
+                             f'revision_kb')
+        return {kb: since_build for kb in kbs}
+
+    def iter_revisions(self, since_build=None, revision_kb=None,
+                       chunk_size=1000):
+        '''
+        Read the revisions with their objects in chunks, in the order of
+        revision_kb and revision_build. The revisions and the objects are
+        read by two cursors in the order of their keys, without loading
+        the database in memory
+        Params:
+        ------
+            since_build: int or Dict<String, int> (only the revisions after
+                         the build of their knowledge base, see
+                         get_since_builds)
+            revision_kb: String (all knowledge bases when not informed)
+            chunk_size: int (revisions per chunk)
+        Returns:
+        ------
+            chunks: Generator<List<Revision>>
+        '''
+        if since_build is not None and (isinstance(since_build, dict) or
+                                        revision_kb is None):
+            for kb, build in self.get_since_builds(since_build,
+                                                   revision_kb).items():
+                yield from self.iter_revisions(build, kb, chunk_size)
+            return
+
+        filters = []
+        params = []
+        if revision_kb is not None:
+            filters.append('revision_kb = ?')
+            params.append(revision_kb)
+        if since_build is not None:
+            filters.append('revision_build > ?')
+            params.append(int(since_build))
+        where = f'WHERE {" AND ".join(filters)}' if filters else ''
+
+        revisions = self.conn.cursor()
+        objects = self.conn.cursor()
+        try:
+            revisions.execute(f'''
+                SELECT revision_date, revision_seconds, revision_user,
+                    revision_comment, revision_name, revision_operation,
+                    revision_build, revision_kb
+                FROM revision
+                {where}
+                ORDER BY revision_kb, revision_build''', params)
+            objects.execute(f'''
+                SELECT revision_kb, revision_build, object_type,
+                    object_name, object_gu_id, object_entity_id,
+                    object_operation
+                FROM revision_objects_flat
+                {where}
+                ORDER BY revision_kb, revision_build''', params)
+            object_rows = self.__fetch_rows(objects, chunk_size)
+            object_row = next(object_rows, None)
+            while True:
+                rows = revisions.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunk = []
+                for row in rows:
+                    key = (row[7], row[6])
+                    rev_objs = []
+                    while object_row is not None and \
+                            (object_row[0], object_row[1]) <= key:
+                        if object_row[0] == key[0] and \
+                                object_row[1] == key[1]:
+                            rev_objs.append(RevisionObject(*object_row[2:]))
+                        object_row = next(object_rows, None)
+                    chunk.append(Revision(*row[:7], rev_objs, row[7]))
+                yield chunk
+        finally:
+            revisions.close()
+            objects.close()
+
+    def __fetch_rows(self, cursor, size):
+        '''
+        Rows of the cursor, fetched size at a time
+        '''
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                return
+            yield from rows
+
+    def export_revisions(self, path, file_format=None, since_build=None,
+                         revision_kb=None, chunk_size=1000):
+        '''
+        Export the revisions with their objects to a gzip compressed JSON
+        lines file (.jsonl.gz) or to parquet (.parquet, requires pyarrow),
+        in chunks, in constant memory. The file is written with a
+        temporary name and renamed at the end
+        Params:
+        ------
+            path: String
+            file_format: String (jsonl or parquet, by the extension of
+                         path when not informed)
+            since_build: int or Dict<String, int> (incremental export, only
+                         the revisions after the build of their knowledge
+                         base, as last_builds of the previous export, see
+                         get_since_builds)
+            revision_kb: String (all knowledge bases when not informed)
+            chunk_size: int (revisions read and written at a time)
+        Returns:
+        ------
+            statistics: Dict (revisions, objects, last_builds, the greatest
+                        build exported by revision_kb or its since_build
+                        when there are no new revisions, seconds and
+                        rows_per_second)
+        '''
+        # Imported only by the export, for the start of the other commands
+        import export
+
+        file_format = export.get_format(path, file_format)
+        if file_format == 'parquet':
+            export.check_pyarrow()
+        since_builds = self.get_since_builds(since_build, revision_kb)
+        last_builds = {kb: build for kb, build in since_builds.items()
+                       if build is not None}
+        statistics = {'last_builds': last_builds}
+        start = time.perf_counter()
+
+        def chunks():
+            for chunk in self.iter_revisions(since_builds, revision_kb,
+                                             chunk_size):
+                # In the order of revision_kb and revision_build
+                for rev in chunk:
+                    last_builds[rev.revision_kb] = rev.revision_build
+                yield chunk
+
+        partial_path = f'{path}.partial'
+        try:
+            revisions, objects = export.write_revisions(
+                partial_path, chunks(), file_format)
+            os.replace(partial_path, path)
+        finally:
+            if os.path.isfile(partial_path):
+                os.remove(partial_path)
+
+        statistics['revisions'] = revisions
+        statistics['objects'] = objects
+        statistics['seconds'] = time.perf_counter() - start
+        statistics['rows_per_second'] = (
+            (revisions + objects) / statistics['seconds']
+            if statistics['seconds'] else 0.0)
+        return statistics
+
+    def import_revisions(self, path, file_format=None, batch_size=500,
+                         journal_mode=None, synchronous=None,
+                         defer_indexes=False, upsert=False):
+        '''
+        Import the revisions of a file of export_revisions, read in chunks
+        of batch_size and written by insert_revisions, in a new database or
+        in an existing one
+        Params:
+        ------
+            path: String
+            file_format: String (jsonl or parquet, by the extension of
+                         path when not informed)
+            batch_size, journal_mode, synchronous, defer_indexes, upsert:
+                see insert_revisions
+        Returns:
+        ------
+            statistics: Dict (statistics of insert_revisions)
+        '''
+        import export
+
+        chunks = export.read_revisions(path, batch_size, file_format)
+        self.construct_schema()
+        return self.insert_revisions(
+            (rev for chunk in chunks for rev in chunk),
+            batch_size=batch_size, journal_mode=journal_mode,
+            synchronous=synchronous, defer_indexes=defer_indexes,
+            upsert=upsert)
+
+    def get_checkpoints(self, job_id):
+        '''
+        Get the progress of a job
+        Params:
+        ------
+            job_id: String
+        Returns:
+        ------
+            checkpoints: Dict<String, Dict> (checkpoint by partition_start)
+        '''
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT partition_start, partition_end, page, page_size,
+                last_build, finished
+            FROM crawl_checkpoint
+            WHERE job_id = ?''', (job_id,))
+        checkpoints = {
+            row[0]: {'partition_start': row[0], 'partition_end': row[1],
+                     'page': row[2], 'page_size': row[3],
+                     'last_build': row[4], 'finished': bool(row[5])}
+            for row in cursor.fetchall()}
+        cursor.close()
+        return checkpoints
+
+    def save_page(self, job_id, partition_start, partition_end, page,
+                  revisions, page_size=10, upsert=False):
+        '''
+        Insert the revisions of a page and the checkpoint of the job in the
+        same transaction
+        Params:
+        ------
+            job_id: String
+            partition_start: String
+            partition_end: String
+            page: int (page of the grid)
+            revisions: List<Dict>
+            page_size: int (rows per page of the grid)
+            upsert: bool (replace the revisions already in database)
+        Returns:
+        ------
+            objects: int (number of revision_objects written)
+        '''
+        start = time.perf_counter()
+        cursor = self.conn.cursor()
+        try:
+            objects = self.__write_revisions(cursor, revisions, upsert)
+            last_build = (int(revisions[-1]['revision_build'])
+                          if revisions else None)
+            cursor.execute('''
+                INSERT INTO crawl_checkpoint(
+                    job_id, partition_start, partition_end, page, page_size,
+                    last_build, finished, updated_at)
+                VALUES(?, ?, ?, ?, ?, ?, 0, datetime('now'))
+                ON CONFLICT(job_id, partition_start) DO UPDATE SET
+                    page = excluded.page,
+                    page_size = excluded.page_size,
+                    last_build = COALESCE(excluded.last_build, last_build),
+                    updated_at = excluded.updated_at''', (
+                    job_id, partition_start, partition_end, page, page_size,
+                    last_build))
+            self.conn.commit()
+        except sqlite3.IntegrityError as integrity_error:
+            self.__rollback()
+            raise sqlite3.IntegrityError(
+                f'Revision already in database, page {page} of '
+                f'{partition_start}') from integrity_error
+        finally:
+            cursor.close()
+        self.__emit_write(len(revisions), objects,
+                          time.perf_counter() - start)
+        return objects
+
+    def finish_partition(self, job_id, partition_start, partition_end):
+        '''
+        Mark the partition of the job as finished
+        Params:
+        ------
+            job_id: String
+            partition_start: String
+            partition_end: String
+        '''
+        self.conn.execute('''
+            INSERT INTO crawl_checkpoint(
+                job_id, partition_start, partition_end, page, finished,
+                updated_at)
+            VALUES(?, ?, ?, 0, 1, datetime('now'))
+            ON CONFLICT(job_id, partition_start) DO UPDATE SET
+                finished = 1,
+                updated_at = excluded.updated_at''', (
+                job_id, partition_start, partition_end))
+        self.conn.commit()
+
+    def __write_batch(self, cursor, batch, statistics, upsert=False):
+        '''
+        Write a batch of revisions in a transaction, the time spent
+        writing is added to the statistics
+        '''
+        start = time.perf_counter()
+        try:
+            objects = self.__write_revisions(cursor, batch, upsert)
+            self.conn.commit()
+        except sqlite3.IntegrityError as integrity_error:
+            self.__rollback()
+            builds = [rev['revision_build'] for rev in batch]
+            raise sqlite3.IntegrityError(
+                f'Revision already in database, batch {builds[0]} to '
+                f'{builds[-1]}') from integrity_error
+        seconds = time.perf_counter() - start
+        statistics['revisions'] += len(batch)
+        statistics['objects'] += objects
+        statistics['seconds'] += seconds
+        self.__emit_write(len(batch), objects, seconds)
+
+    def __write_revisions(self, cursor, revisions, upsert=False):
+        '''
+        Write the revisions with the cursor, without commit
+        Params:
+        ------
+            cursor: Cursor
+            revisions: List<Revision> (or dicts with the same fields,
+                       revision_kb is the knowledge base, '' when not
+                       informed)
+            upsert: bool (replace the revisions already in database)
+        Returns:
+        ------
+            objects: int (number of revision_objects written)
+        '''
+        if self.__rollups is None:
+            self.has_rollups()
+        if self.__search is None:
+            self.has_search()
+        if upsert:
+            revisions = self.__replace_revisions(cursor, revisions)
+        rows = self.__get_rows(revisions)
+        revision_rows, object_rows = rows[0], rows[1]
+
+        query = '''
+            INSERT INTO revision(
+                revision_build, revision_date, revision_seconds,
+                revision_user, revision_comment,
+                revision_name, revision_operation, revision_kb)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?)'''
+        if upsert:
+            query += '''
+            ON CONFLICT(revision_kb, revision_build) DO UPDATE SET
+                revision_date = excluded.revision_date,
+                revision_seconds = excluded.revision_seconds,
+                revision_user = excluded.revision_user,
+                revision_comment = excluded.revision_comment,
+                revision_name = excluded.revision_name,
+                revision_operation = excluded.revision_operation'''
+        cursor.executemany(query, revision_rows)
+
+        if self.__storage is None:
+            self.__storage = self.get_storage()
+        if self.__storage == 'normalized':
             cursor.executemany('''
-                INSERT INTO revision(
-                    revision_build, revision_date, revision_seconds,
-                    revision_user, revision_comment,
-                    revision_name, revision_operation)
-                VALUES(?, ?, ?, ?, ?, ?, ?)''', [(
-                    int(rev["revision_build"]), rev["revision_date"],
+                INSERT INTO revision_objects(
+                    revision_build, object_id, object_operation, revision_kb)
+                VALUES(?, ?, ?, ?)''', [
+                    (revision_build,
+                     self.__get_object_id(cursor, object_type, object_name,
+                                          object_gu_id, object_entity_id),
+                     object_operation, revision_kb)
+                    for revision_build, object_type, object_name,
+                    object_gu_id, object_entity_id, object_operation,
+                    revision_kb in object_rows])
+        else:
+            cursor.executemany('''
+                    INSERT INTO revision_objects(
+                        revision_build, object_type, object_name,
+                        object_gu_id, object_entity_id,
+                        object_operation, revision_kb)
+                    VALUES(?, ?, ?, ?, ?, ?, ?)''', object_rows)
+
+        if self.__rollups:
+            self.__update_rollups(cursor, *rows)
+
+        if self.__search:
+            self.__update_search(cursor, *rows)
+        return len(object_rows)
+
+    def __get_rows(self, revisions):
+        '''
+        Rows of revision and of revision_objects of the revisions
+        Params:
+        ------
+            revisions: List<Revision> (or dicts with the same fields)
+        Returns:
+        ------
+            revision_rows, object_rows, ranges: Tuple<List<Tuple>,
+                List<Tuple>, List<Tuple<int, int>>> (rows in the order of
+                the columns of the insertions, and the start and the end
+                of the objects of each revision in object_rows)
+        '''
+        revision_rows = []
+        object_rows = []
+        ranges = []
+        for rev in revisions:
+            if isinstance(rev, dict):
+                revision_build = int(rev["revision_build"])
+                revision_kb = rev.get("revision_kb", '')
+                revision_rows.append((
+                    revision_build, rev["revision_date"],
                     int(rev["revision_seconds"]),
                     rev["revision_user"], rev["revision_comment"],
                     rev["revision_name"],
-                    rev["revision_operation"])
-                ]
-            )
+                    rev["revision_operation"], revision_kb)
+                )
+                rev_objs = rev["revision_objects"]
+            else:
+                # The fields of the records are already converted
+                revision_build = rev.revision_build
+                revision_kb = rev.revision_kb
+                revision_rows.append((
+                    revision_build, rev.revision_date, rev.revision_seconds,
+                    rev.revision_user, rev.revision_comment,
+                    rev.revision_name, rev.revision_operation, revision_kb))
+                rev_objs = rev.revision_objects
 
             # Inserting objects of revision
-            revision_objects = []
-            for rev_obj in rev["revision_objects"]:
-                revision_objects.append(
-                    (
-                        int(rev["revision_build"]), rev_obj["object_type"],
-                        rev_obj["object_name"],
-                        rev_obj["object_gu_id"],
-                        int(rev_obj["object_entity_id"]),
-                        rev_obj["object_operation"]
+            start = len(object_rows)
+            for rev_obj in rev_objs:
+                if isinstance(rev_obj, dict):
+                    object_rows.append(
+                        (
+                            revision_build, rev_obj["object_type"],
+                            rev_obj["object_name"],
+                            rev_obj["object_gu_id"],
+                            int(rev_obj["object_entity_id"]),
+                            rev_obj["object_operation"], revision_kb
+                        )
                     )
-                )
+                else:
+                    object_rows.append((
+                        revision_build, rev_obj.object_type,
+                        rev_obj.object_name, rev_obj.object_gu_id,
+                        rev_obj.object_entity_id, rev_obj.object_operation,
+                        revision_kb))
+            ranges.append((start, len(object_rows)))
+        return revision_rows, object_rows, ranges
+
+    def __update_search(self, cursor, revision_rows, object_rows, ranges):
+        '''
+        Add the revisions to the full text index, whose rowid is the rowid
+        of the revision
+        '''
+        builds = {}
+        for revision_row in revision_rows:
+            builds.setdefault(revision_row[7], []).append(revision_row[0])
+        rowids = {}
+        for revision_kb, kb_builds in builds.items():
+            for start in range(0, len(kb_builds), 500):
+                chunk = kb_builds[start:start + 500]
+                marks = ', '.join('?' * len(chunk))
+                cursor.execute(f'''
+                    SELECT revision_build, rowid FROM revision
+                    WHERE revision_kb = ? AND revision_build IN ({marks})''',
+                    [revision_kb] + chunk)
+                rowids.update(((revision_kb, revision_build), rowid)
+                              for revision_build, rowid in cursor.fetchall())
+        cursor.executemany('''
+            INSERT INTO revision_search(rowid, revision_comment, object_names)
+            VALUES(?, ?, ?)''', [
+                (rowids[(revision_row[7], revision_row[0])], revision_row[4],
+                 ' '.join(str(object_row[2])
+                          for object_row in object_rows[start:end]))
+                for revision_row, (start, end) in zip(revision_rows,
+                                                      ranges)])
+
+    def __replace_revisions(self, cursor, revisions):
+        '''
+        Remove the objects, the rollups and the full text index of the
+        revisions already in database, to be written again. The check and
+        the writing are in the same transaction, so that other connections
+        writing the same revisions wait for it
+        Returns:
+        -------
+            revisions: List<Revision> (the last of each build, with each
+                       object once)
+        '''
+        unique = {}
+        for rev in revisions:
+            rev_objs = {}
+            for rev_obj in rev['revision_objects']:
+                rev_objs.setdefault(rev_obj['object_gu_id'], rev_obj)
+            if len(rev_objs) < len(rev['revision_objects']):
+                rev = {**rev, 'revision_objects': list(rev_objs.values())}
+            unique[(rev.get('revision_kb', ''),
+                    int(rev['revision_build']))] = rev
+
+        if not self.conn.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        builds = {}
+        for revision_kb, revision_build in unique:
+            builds.setdefault(revision_kb, []).append(revision_build)
+        for revision_kb, kb_builds in builds.items():
+            previous = self.get_revisions(kb_builds, revision_kb)
+            if not previous:
+                continue
+            if self.__rollups:
+                self.__update_rollups(cursor, *self.__get_rows(previous), sign=-1)
+            previous = [rev['revision_build'] for rev in previous]
+            for start in range(0, len(previous), 500):
+                chunk = previous[start:start + 500]
+                marks = ', '.join('?' * len(chunk))
+                cursor.execute(f'''
+                    DELETE FROM revision_objects
+                    WHERE revision_kb = ? AND revision_build IN ({marks})''',
+                    [revision_kb] + chunk)
+                if self.__search:
+                    cursor.execute(f'''
+                        DELETE FROM revision_search
+                        WHERE rowid IN (
+                            SELECT rowid FROM revision
+                            WHERE revision_kb = ?
+                                AND revision_build IN ({marks}))''',
+                        [revision_kb] + chunk)
+        return list(unique.values())
 
+    def __update_rollups(self, cursor, revision_rows, object_rows, ranges,
+                         sign=1):
+        '''
+        Add the rows of the revisions to the rollup tables, or subtract
+        them with sign -1
+        '''
+        users = {}
+        object_types = {}
+        for revision_row, (start, end) in zip(revision_rows, ranges):
+            # Same day of REVISION_DAY, from MM/DD/YY hh:mm AM
+            date = revision_row[1]
+            day = f'20{date[6:8]}-{date[0:2]}-{date[3:5]}'
+            counts = users.setdefault((day, revision_row[7], revision_row[3]),
+                                      [0, 0])
+            counts[0] += sign
+            counts[1] += sign * (end - start)
+            for object_row in object_rows[start:end]:
+                key = (day, revision_row[7], object_row[1], object_row[5])
+                object_types[key] = object_types.get(key, 0) + sign
+
+        cursor.executemany('''
+            INSERT INTO rollup_user_day(
+                day, revision_kb, revision_user, revisions, objects)
+            VALUES(?, ?, ?, ?, ?)
+            ON CONFLICT(day, revision_kb, revision_user) DO UPDATE SET
+                revisions = revisions + excluded.revisions,
+                objects = objects + excluded.objects''', [
+                key + tuple(counts) for key, counts in users.items()])
+        cursor.executemany('''
+            INSERT INTO rollup_object_type_day(
+                day, revision_kb, object_type, object_operation, changes)
+            VALUES(?, ?, ?, ?, ?)
+            ON CONFLICT(day, revision_kb, object_type, object_operation)
+            DO UPDATE SET
+                changes = changes + excluded.changes''', [
+                key + (changes,) for key, changes in object_types.items()])
+        if sign < 0:
             cursor.executemany('''
-                    INSERT INTO revision_objects(
-                        revision_build, object_type, object_name,
-                        object_gu_id, object_entity_id,
-                        object_operation)
-                    VALUES(?, ?, ?, ?, ?, ?)''', revision_objects)
+                DELETE FROM rollup_user_day
+                WHERE day = ? AND revision_kb = ? AND revision_user = ?
+                    AND revisions <= 0''', users)
+            cursor.executemany('''
+                DELETE FROM rollup_object_type_day
+                WHERE day = ? AND revision_kb = ? AND object_type = ?
+                    AND object_operation = ? AND changes <= 0''',
+                object_types)
 
-            self.conn.commit()
-            cursor.close()
-        except sqlite3.IntegrityError as integrity_error:
-            print(rev)
-            raise sqlite3.IntegrityError() from integrity_error
+    def __get_object_id(self, cursor, object_type, object_name,
+                        object_gu_id, object_entity_id):
+        '''
+        Id of the object in the table objects, inserted when it is new
+        Returns:
+        ------
+            object_id: int
+        '''
+        key = (object_type, object_name, object_gu_id, object_entity_id)
+        object_id = self.__object_ids.get(key)
+        if object_id is not None:
+            return object_id
+
+        object_type_id = self.__type_ids.get(object_type)
+        if object_type_id is None:
+            cursor.execute('''
+                INSERT OR IGNORE INTO object_types(object_type)
+                VALUES(?)''', (object_type,))
+            cursor.execute('''
+                SELECT object_type_id FROM object_types
+                WHERE object_type IS ?''', (object_type,))
+            object_type_id = cursor.fetchone()[0]
+            self.__type_ids[object_type] = object_type_id
+
+        cursor.execute('''
+            SELECT object_id FROM objects
+            WHERE object_gu_id IS ? AND object_entity_id IS ?
+                AND object_type_id = ? AND object_name IS ?''', (
+                object_gu_id, object_entity_id, object_type_id, object_name))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute('''
+                INSERT INTO objects(
+                    object_type_id, object_name, object_gu_id,
+                    object_entity_id)
+                VALUES(?, ?, ?, ?)''', (
+                    object_type_id, object_name, object_gu_id,
+                    object_entity_id))
+            object_id = cursor.lastrowid
+        else:
+            object_id = row[0]
+        self.__object_ids[key] = object_id
+        return object_id
+
+    def __rollback(self):
+        '''
+        Rollback the transaction, the ids of the objects inserted in it
+        are no longer valid
+        '''
+        self.conn.rollback()
+        self.__type_ids = {}
+        self.__object_ids = {}
 
 
 if __name__ == '__main__':
-    database = DataBase()
-    print(f'database path: {database.get_database_path()}')
-    database.construct_schema()
+    # The schema of the database, as the command init-db of cli.py
+    import sys
+    import cli
+
+    sys.exit(cli.main(['init-db', *sys.argv[1:]]))
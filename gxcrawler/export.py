@@ -0,0 +1,240 @@
+'''
+Files of export of the revisions
+
+The revisions are written and read in chunks, each revision with its
+objects nested, as gzip compressed JSON lines or as parquet, a columnar
+format, with pyarrow when it is installed (imported only for parquet). A
+file holds the revisions read by DataBase.iter_revisions, in the order of
+revision_kb and revision_build
+'''
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Imported by the first parquet file, the import of pyarrow is slow for
+# the commands that do not use it
+pyarrow = None
+
+from records import Revision, RevisionObject
+
+
+FORMATS = ('jsonl', 'parquet')
+EXTENSIONS = {'.jsonl.gz': 'jsonl', '.parquet': 'parquet'}
+
+# Columns of the parquet file, the key of the revision first
+REVISION_COLUMNS = ('revision_kb', 'revision_build', 'revision_date',
+                    'revision_seconds', 'revision_user', 'revision_comment',
+                    'revision_name', 'revision_operation')
+INTEGER_COLUMNS = ('revision_build', 'revision_seconds', 'object_entity_id')
+
+
+def get_format(path, file_format=None):
+    '''
+    Format of the file, by the extension when not informed
+    Params:
+    ------
+        path: String
+        file_format: String (jsonl or parquet)
+    Returns:
+    -------
+        file_format: String
+    '''
+    if file_format is not None:
+        if file_format not in FORMATS:
+            raise ValueError(f'Invalid format: {file_format}')
+        return file_format
+    for extension, extension_format in EXTENSIONS.items():
+        if path.endswith(extension):
+            return extension_format
+    raise ValueError(f'Unknown format of {path}, use the extension '
+                     f'{" or ".join(EXTENSIONS)} or inform the format')
+
+
+def write_revisions(path, chunks, file_format=None):
+    '''
+    Write the chunks of revisions in the file
+    Params:
+    ------
+        path: String
+        chunks: Iterable<List<Revision>>
+        file_format: String (jsonl or parquet, by the extension when not
+                     informed)
+    Returns:
+    -------
+        revisions, objects: Tuple<int, int> (rows written)
+    '''
+    if get_format(path, file_format) == 'parquet':
+        return write_parquet(path, chunks)
+    return write_jsonl(path, chunks)
+
+
+def read_revisions(path, chunk_size=1000, file_format=None):
+    '''
+    Read the revisions of the file in chunks
+    Params:
+    ------
+        path: String
+        chunk_size: int (revisions per chunk)
+        file_format: String (jsonl or parquet, by the extension when not
+                     informed)
+    Returns:
+    -------
+        chunks: Generator<List<Revision>>
+    '''
+    if get_format(path, file_format) == 'parquet':
+        return read_parquet(path, chunk_size)
+    return read_jsonl(path, chunk_size)
+
+
+def dumps(values):
+    '''
+    Encode a json line, in bytes
+    '''
+    if orjson is not None:
+        return orjson.dumps(values) + b'\n'
+    return json.dumps(values, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def write_jsonl(path, chunks, compresslevel=6):
+    '''
+    Write the revisions as gzip compressed JSON lines, one revision by
+    line with revision_objects
+    Returns:
+    -------
+        revisions, objects: Tuple<int, int>
+    '''
+    revisions = 0
+    objects = 0
+    with gzip.open(path, 'wb', compresslevel=compresslevel) as f_export:
+        for chunk in chunks:
+            f_export.write(b''.join(dumps(rev.to_dict()) for rev in chunk))
+            revisions += len(chunk)
+            objects += sum(len(rev.revision_objects) for rev in chunk)
+    return revisions, objects
+
+
+def read_jsonl(path, chunk_size=1000):
+    '''
+    Read the revisions of gzip compressed JSON lines
+    Returns:
+    -------
+        chunks: Generator<List<Revision>>
+    '''
+    loads = orjson.loads if orjson is not None else json.loads
+    chunk = []
+    with gzip.open(path, 'rb') as f_export:
+        for line in f_export:
+            if not line.strip():
+                continue
+            chunk.append(Revision.from_dict(loads(line)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def check_pyarrow():
+    '''
+    Import pyarrow, raising an error when it is not installed
+    '''
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow.parquet
+        except ImportError as error:
+            raise Exception('The parquet format requires pyarrow, install '
+                            'it with pip install pyarrow') from error
+
+
+def get_parquet_schema():
+    '''
+    Schema of the parquet file, the objects are a list of structs by
+    revision
+    Returns:
+    -------
+        schema: pyarrow.Schema
+    '''
+    check_pyarrow()
+    return pyarrow.schema(
+        [(column, pyarrow.int64() if column in INTEGER_COLUMNS
+          else pyarrow.string()) for column in REVISION_COLUMNS] +
+        [('revision_objects', pyarrow.list_(pyarrow.struct(
+            [(field, pyarrow.int64() if field in INTEGER_COLUMNS
+              else pyarrow.string()) for field in RevisionObject.FIELDS])))])
+
+
+def write_parquet(path, chunks, compression='zstd'):
+    '''
+    Write the revisions in parquet, a row group by chunk
+    Returns:
+    -------
+        revisions, objects: Tuple<int, int>
+    '''
+    schema = get_parquet_schema()
+    object_type = schema.field('revision_objects').type.value_type
+    revisions = 0
+    objects = 0
+    with pyarrow.parquet.ParquetWriter(path, schema,
+                                       compression=compression) as writer:
+        for chunk in chunks:
+            # The objects of the chunk in flat columns, the revision of
+            # each one is given by the offsets of the list
+            offsets = [0]
+            columns = {field: [] for field in RevisionObject.FIELDS}
+            for rev in chunk:
+                for rev_obj in rev.revision_objects:
+                    for field, values in columns.items():
+                        values.append(getattr(rev_obj, field))
+                offsets.append(offsets[-1] + len(rev.revision_objects))
+            revision_objects = pyarrow.ListArray.from_arrays(
+                pyarrow.array(offsets, pyarrow.int32()),
+                pyarrow.StructArray.from_arrays(
+                    [pyarrow.array(values, object_type.field(field).type)
+                     for field, values in columns.items()],
+                    fields=list(object_type)))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array([getattr(rev, column) for rev in chunk],
+                               schema.field(column).type)
+                 for column in REVISION_COLUMNS] + [revision_objects],
+                schema=schema))
+            revisions += len(chunk)
+            objects += offsets[-1]
+    return revisions, objects
+
+
+def read_parquet(path, chunk_size=1000):
+    '''
+    Read the revisions of parquet, without loading the file in memory
+    Returns:
+    -------
+        chunks: Generator<List<Revision>>
+    '''
+    check_pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        revision_objects = batch.column('revision_objects')
+        # The offsets of a slice of the column start after the objects of
+        # the previous revisions
+        offsets = revision_objects.offsets.to_pylist()
+        offsets = [offset - offsets[0] for offset in offsets]
+        values = revision_objects.flatten()
+        rev_objs = [
+            RevisionObject(*row) for row in zip(
+                *[values.field(field).to_pylist()
+                  for field in RevisionObject.FIELDS])]
+        columns = {column: batch.column(column).to_pylist()
+                   for column in REVISION_COLUMNS}
+        yield [
+            Revision(revision_date, revision_seconds, revision_user,
+                     revision_comment, revision_name, revision_operation,
+                     revision_build, rev_objs[start:end], revision_kb)
+            for (revision_kb, revision_build, revision_date,
+                 revision_seconds, revision_user, revision_comment,
+                 revision_name, revision_operation), start, end in zip(
+                zip(*[columns[column] for column in REVISION_COLUMNS]),
+                offsets, offsets[1:])]
@@ -0,0 +1,390 @@
+'''
+Local stand-in of the genexus server 16
+
+Implements the pages and events used by the crawler (login, activity grid
+and objects of revisions) with generated data, to run and measure the
+crawler without a genexus server
+'''
+import json
+import time
+import random
+import datetime
+import argparse
+import threading
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeGxServer():
+    '''
+    Local server with the responses of the genexus server 16
+    '''
+    OBJECT_TYPES = ('Procedure', 'Transaction', 'WebPanel', 'DataProvider',
+                    'SDT', 'Domain')
+
+    def __init__(self, revisions_per_day=25, objects_per_revision=3,
+                 latency=0.0, max_rows_per_page=None, last_day=None,
+                 error_rate=0.0, max_in_flight=None, failed_builds=(),
+                 host='127.0.0.1', port=0):
+        '''
+        Local server with generated revisions, the newest first as in the
+        activity grid
+        Params:
+        ------
+            revisions_per_day: int
+            objects_per_revision: int
+            latency: float (seconds added to each response)
+            max_rows_per_page: int (limit of rows of the grid, as a server
+                               that caps the size of page)
+            last_day: date (day of the last revision, today by default)
+            error_rate: float (fraction of the requests of grid and objects
+                        answered with status 503)
+            max_in_flight: int (requests of grid and objects answered at
+                           the same time, the others are answered with
+                           status 503, as a server overloaded)
+            failed_builds: Iterable<int> (builds whose objects are always
+                           answered with status 400, an error that is not
+                           repeated, changed by the attribute failed_builds)
+            host: String
+            port: int (0 for a free port)
+
+        Ex: with FakeGxServer(revisions_per_day=100, latency=0.05) as server:
+                gxcrawler = GxCrawler('user', 'password', server.url_base,
+                                      'App')
+        '''
+        self.revisions_per_day = revisions_per_day
+        self.objects_per_revision = objects_per_revision
+        self.latency = latency
+        self.max_rows_per_page = max_rows_per_page
+        self.last_day = last_day or datetime.date.today()
+        self.error_rate = error_rate
+        self.max_in_flight = max_in_flight
+        self.failed_builds = set(failed_builds)
+        self.kb_name = 'App'
+        # Requests received by endpoint
+        self.requests = {'main': 0, 'login': 0, 'dashboard': 0,
+                         'activity': 0, 'grid': 0, 'objects': 0,
+                         'errors': 0}
+        self.__in_flight = 0
+        self.__random = random.Random(0)
+        self.__session = 0
+        self.__lock = threading.Lock()
+        self.__httpd = ThreadingHTTPServer((host, port), self.__get_handler())
+        self.__httpd.daemon_threads = True
+        self.__thread = None
+
+    @property
+    def url_base(self):
+        '''
+        Url base of the server, as the url of a genexus server
+        '''
+        host, port = self.__httpd.server_address[:2]
+        return f'http://{host}:{port}/GeneXusServer16'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+
+    def start(self):
+        '''
+        Start the server in a thread
+        '''
+        self.__thread = threading.Thread(target=self.__httpd.serve_forever,
+                                         daemon=True)
+        self.__thread.start()
+        return self.url_base
+
+    def stop(self):
+        '''
+        Stop the server
+        '''
+        if self.__thread is not None:
+            self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+    def serve_forever(self):
+        '''
+        Run the server in the current thread
+        '''
+        self.__httpd.serve_forever()
+
+    def expire_sessions(self):
+        '''
+        End the sessions logged in, the next requests with the tokens of
+        those sessions are redirected to the login page
+        '''
+        with self.__lock:
+            self.__session += 1
+
+    def get_token(self, name):
+        '''
+        Token of the current session
+        '''
+        return f'{name}-{self.__session}'
+
+    def count(self, endpoint):
+        with self.__lock:
+            self.requests[endpoint] += 1
+
+    def enter(self):
+        '''
+        Start of a request
+        '''
+        with self.__lock:
+            self.__in_flight += 1
+
+    def leave(self):
+        '''
+        End of a request
+        '''
+        with self.__lock:
+            self.__in_flight -= 1
+
+    def is_overloaded(self):
+        '''
+        Check if the request of grid or objects must fail, by the
+        error_rate or by the requests in flight
+        Returns:
+        -------
+            overloaded: bool
+        '''
+        with self.__lock:
+            if (self.max_in_flight and
+                    self.__in_flight > self.max_in_flight) or \
+                    self.__random.random() < self.error_rate:
+                self.requests['errors'] += 1
+                return True
+            return False
+
+    def get_revisions(self, initial_date, final_date):
+        '''
+        Revisions of the period, the newest first
+        Params:
+        ------
+            initial_date: date
+            final_date: date
+        Returns:
+        -------
+            revisions: List<Dict>
+        '''
+        revisions = []
+        day = min(final_date, self.last_day)
+        while day >= initial_date:
+            first_build = day.toordinal() * self.revisions_per_day
+            for index in range(self.revisions_per_day - 1, -1, -1):
+                minutes = index * 1440 // self.revisions_per_day
+                revisions.append({
+                    'build': first_build + index,
+                    'date': datetime.datetime.combine(
+                        day, datetime.time(minutes // 60, minutes % 60)
+                    ).strftime('%m/%d/%y %I:%M %p'),
+                    'user': f'user{index % 7}',
+                })
+            day -= datetime.timedelta(days=1)
+        return revisions
+
+    def get_grid(self, rows, page, initial_date, final_date):
+        '''
+        Response of the refresh of the activity grid
+        '''
+        if self.max_rows_per_page:
+            rows = min(rows, self.max_rows_per_page)
+        revisions = self.get_revisions(initial_date, final_date)
+        revisions = revisions[(page - 1) * rows: page * rows]
+        values = {}
+        for row, revision in enumerate(revisions, 1):
+            sufix = str(row).zfill(4)
+            values.update({
+                f'vREVISIONDATE_{sufix}': revision['date'],
+                f'vSECONDS_{sufix}': str(revision['build'] % 60),
+                f'vUSER_{sufix}': revision['user'],
+                f'vCOMMENT_{sufix}': f'Change {revision["build"]} of '
+                                     f'{revision["user"]}',
+                f'vREVISIONNAME_{sufix}': f'Revision {revision["build"]}',
+                f'vOPERATION_{sufix}': 'Commit',
+                f'vBUILD_{sufix}': str(revision['build']),
+            })
+        grids = [{'id': 45, 'Count': len(revisions)}] if revisions else []
+        return {'gxGrids': grids, 'gxValues': [values]}
+
+    def get_objects(self, build):
+        '''
+        Response of the event ACTIVITYGRID.ONLINEACTIVATE
+        '''
+        values = {}
+        for index in range(1, self.objects_per_revision + 1):
+            sufix = str(index).zfill(4)
+            entity = (build * 31 + index * 17) % 5000
+            values.update({
+                f'W0077vTYPE_{sufix}':
+                    self.OBJECT_TYPES[entity % len(self.OBJECT_TYPES)],
+                f'W0077vNAMEAUX_{sufix}': f'Object{entity}',
+                f'W0077vENTITYGUID_{sufix}':
+                    f'{entity:08x}-0000-4000-8000-{entity:012x}',
+                f'W0077vENTITYID_{sufix}': str(entity),
+                f'W0077vOBJOPERATION_{sufix}':
+                    'Insert' if build % 11 == 0 else 'Update',
+            })
+        return {'gxValues': [{}, values]}
+
+    def __get_handler(self):
+        '''
+        Class of handler of the requests of this server
+        '''
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, with Nagle the
+            # body would wait for the ack of the client
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def __send(self, body, content_type='application/json',
+                       status=200):
+                if not isinstance(body, str):
+                    body = json.dumps(body)
+                content = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def __read_body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length) if length else b''
+
+            def __send_expired(self):
+                self.__send({'gxCommands': [{'redirect': {
+                    'url': '/GeneXusServer16/main.aspx'}}]})
+
+            def do_GET(self):
+                server.enter()
+                try:
+                    self.__get()
+                finally:
+                    server.leave()
+
+            def do_POST(self):
+                server.enter()
+                try:
+                    self.__post()
+                finally:
+                    server.leave()
+
+            def __get(self):
+                body = self.__read_body()
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlsplit(self.path)
+                query = url.query
+
+                if url.path.endswith('/main.aspx') and \
+                        query.startswith('gxfullajaxEvt'):
+                    server.count('login')
+                    parms = json.loads(body or b'{}').get('parms', [])
+                    if self.headers.get('X-GXAUTH-TOKEN') != \
+                            server.get_token('login') or len(parms) < 4:
+                        return self.__send({'gxMessages': 'Invalid login'},
+                                           status=403)
+                    return self.__send({'gxCommands': [{'redirect': {
+                        'url': '/GeneXusServer16/dashboard.aspx'}}]})
+
+                if url.path.endswith('/main.aspx'):
+                    server.count('main')
+                    token = json.dumps(
+                        {'GX_AUTH_W0010MAINLOGIN': server.get_token('login')})
+                    return self.__send(
+                        "<html><body><form><div></div><div>"
+                        f"<input type='hidden' value='{token}'/>"
+                        "</div></form></body></html>", 'text/html')
+
+                if url.path.endswith('/dashboard.aspx'):
+                    server.count('dashboard')
+                    return self.__send('<html><body></body></html>',
+                                       'text/html')
+
+                if url.path.endswith('/activity.aspx') and \
+                        query.startswith('gxajaxGridRefresh_Activitygrid'):
+                    server.count('grid')
+                    return self.__send_grid(query)
+
+                if url.path.endswith('/activity.aspx'):
+                    server.count('activity')
+                    token = server.get_token('activity')
+                    return self.__send(
+                        '<html><body><script>gx.ajax.setJsonResponse('
+                        f'{{"GX_AUTH_ACTIVITY":"{token}"}});</script>'
+                        '</body></html>', 'text/html')
+
+                self.__send('Not found', 'text/plain', status=404)
+
+            def __send_grid(self, query):
+                if server.is_overloaded():
+                    return self.__send('Service unavailable', 'text/plain',
+                                       status=503)
+                parms = query.split(',')
+                try:
+                    rows, page = int(parms[1]), int(parms[2])
+                    initial_date = self.__parse_date(parms[3])
+                    final_date = self.__parse_date(parms[4])
+                except (IndexError, ValueError):
+                    return self.__send('Invalid parameters', 'text/plain',
+                                       status=500)
+                self.__send(server.get_grid(rows, page, initial_date,
+                                            final_date))
+
+            def __post(self):
+                body = self.__read_body()
+                if server.latency:
+                    time.sleep(server.latency)
+                if not urlsplit(self.path).path.endswith('/activity.aspx'):
+                    return self.__send('Not found', 'text/plain', status=404)
+
+                server.count('objects')
+                if self.headers.get('X-GXAUTH-TOKEN') != \
+                        server.get_token('activity'):
+                    return self.__send_expired()
+                if server.is_overloaded():
+                    return self.__send('Service unavailable', 'text/plain',
+                                       status=503)
+                parms = json.loads(body).get('parms', [])
+                if int(parms[3]) in server.failed_builds:
+                    return self.__send('Bad request', 'text/plain',
+                                       status=400)
+                self.__send(server.get_objects(int(parms[3])))
+
+            def __parse_date(self, date):
+                # Format of the grid filter, ex: 2020111 and 20201101
+                return datetime.date(int(date[:4]), int(date[4:-2]),
+                                     int(date[-2:]))
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Local stand-in of the genexus server 16')
+    parser.add_argument('--port', type=int, default=8016)
+    parser.add_argument('--revisions-per-day', type=int, default=25)
+    parser.add_argument('--objects-per-revision', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--max-rows-per-page', type=int, default=None)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-in-flight', type=int, default=None)
+    args = parser.parse_args()
+
+    fake_server = FakeGxServer(
+        revisions_per_day=args.revisions_per_day,
+        objects_per_revision=args.objects_per_revision,
+        latency=args.latency, max_rows_per_page=args.max_rows_per_page,
+        error_rate=args.error_rate, max_in_flight=args.max_in_flight,
+        port=args.port)
+    print(f'Genexus server in {fake_server.url_base}')
+    fake_server.serve_forever()
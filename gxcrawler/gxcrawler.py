@@ -1,8 +1,9 @@
-import json
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-from lxml import etree
+from session import GxSession
+from throttle import AdaptiveLimiter
+from response_parser import ResponseParser, REVISION_FIELDS, OBJECT_FIELDS
 
 
 class GxCrawler():
@@ -10,7 +11,10 @@ class GxCrawler():
     Crawler data in genexus server 16
     '''
 
-    def __init__(self, user_login, user_password, url_base, kb_name):
+    def __init__(self, user_login, user_password, url_base, kb_name,
+                 max_workers=1, session=None, rows_per_page=10,
+                 adaptive_page_size=False, cache=None, max_retries=3,
+                 adaptive_concurrency=False):
         '''
         Class responsible for obtaining data from the genexus server
         Params:
@@ -19,6 +23,22 @@ class GxCrawler():
         user_password:  String (password login server)
         url_base:       String (initial url of address of gxserver)
         kb_name:        String (name of kb of data)
+        max_workers:    int (parallel requests of objects per grid page,
+                        1 keeps the serial behaviour)
+        session:        GxSession (authenticated session shared between
+                        crawlers and calls, created when not informed)
+        rows_per_page:  int (rows requested per page of the grid)
+        adaptive_page_size: bool (starts with MAX_ROWS_PER_PAGE rows and
+                        reduces them when the server caps or rejects the
+                        size, the size found is kept for the next calls)
+        cache:          ResponseCache (responses recorded in disk, used
+                        when the session is created by the crawler)
+        max_retries:    int (attempts repeated after a connection error or
+                        a server overloaded, used when the session is
+                        created by the crawler)
+        adaptive_concurrency: bool (the requests in flight, up to
+                        max_workers, grow while the server answers fast
+                        and are halved when it slows down or fails)
         Returns:
         -------
         revision_data:  List<Dict> (List of revision)
@@ -27,41 +47,47 @@ class GxCrawler():
                                 http://192.168.1.1/GeneXusServer16',
                                 kb_name='App')
         '''
-        self.session = requests.Session()
+        self.max_workers = max(1, int(max_workers))
+        if session is None:
+            limiter = None
+            if adaptive_concurrency:
+                limiter = AdaptiveLimiter(initial=min(4, self.max_workers),
+                                          maximum=self.max_workers)
+            session = GxSession(user_login, user_password, url_base, kb_name,
+                                max_connections=max(10, self.max_workers),
+                                cache=cache, max_retries=max_retries,
+                                limiter=limiter)
+        self.gx_session = session
+        self.session = session.session
         self.user = user_login
         self.password = user_password
         self.url_base = url_base
         self.kb_name = kb_name
-        self.host = self.__get_host(url_base)
-        self.X_GXAUTH_TOKEN = None
-        self.GX_AUTH_ACTIVITY = None
-        self.prefix_gx = [
-                        'vREVISIONDATE_', 'vSECONDS_', 'vUSER_', 'vCOMMENT_', 
-                        'vREVISIONNAME_', 'vOPERATION_', 'vBUILD_']
-        self.prefix_gx_objects = [
-                        'W0077vTYPE_', 'W0077vNAMEAUX_', 
-                        'W0077vENTITYGUID_', 'W0077vENTITYID_', 
-                        'W0077vOBJOPERATION_']
+        self.host = session.host
+        # Revisions whose list of objects could not be obtained
+        self.failed_revisions = []
+        # Callables hook(event, data) called after each page of the grid
+        self.hooks = []
+        self.prefix_gx = [prefix for prefix, _ in REVISION_FIELDS]
+        self.prefix_gx_objects = [prefix for prefix, _ in OBJECT_FIELDS]
         self.LIMIT_PAGES = 1000
         self.LIMITE_PER_REVISION = 1000
-
-        self.descriptions = {
-            'vREVISIONDATE_': 'revision_date',
-            'vSECONDS_': 'revision_seconds',
-            'vUSER_': 'revision_user',
-            'vCOMMENT_': 'revision_comment',
-            'vREVISIONNAME_': 'revision_name',
-            'vOPERATION_': 'revision_operation',
-            'vBUILD_': 'revision_build'
-        }
-
-        self.descriptions_objects = {
-            'W0077vTYPE_': 'object_type',
-            'W0077vNAMEAUX_': 'object_name',
-            'W0077vENTITYGUID_': 'object_gu_id',
-            'W0077vENTITYID_': 'object_entity_id',
-            'W0077vOBJOPERATION_': 'object_operation'
-        }
+        self.parser = ResponseParser(self.LIMITE_PER_REVISION)
+        self.MAX_ROWS_PER_PAGE = 320
+        self.adaptive_page_size = adaptive_page_size
+        self.rows_per_page = max(1, int(rows_per_page))
+        if adaptive_page_size:
+            self.rows_per_page = max(self.rows_per_page,
+                                     self.MAX_ROWS_PER_PAGE)
+        # The server returned a full page with rows_per_page rows, until
+        # then a short first page may be the limit of rows of the server
+        self.__page_size_confirmed = False
+        # Position in grid of the last page obtained
+        self.page = None
+        self.page_size = None
+
+        self.descriptions = dict(REVISION_FIELDS)
+        self.descriptions_objects = dict(OBJECT_FIELDS)
 
     def __format_date_req_param(self, date_time):
         '''
@@ -71,158 +97,155 @@ class GxCrawler():
         return (date_time[3:5]+'/'+date_time[0:2]+'/'+'20'+date_time[6:8]
                 + ' ' + date_time[9:14]+':00')
 
-    def __get_x_auth_token(self, response):
+    @property
+    def X_GXAUTH_TOKEN(self):
         '''
-        Method get token
-        Params:
-        ------
-            response: Request
-        Returns:
-        -------
-            x-auth-token: String
+        Token of login of the session
         '''
-        tree = etree.HTML(response.text)
-        tree = tree.xpath('./body/form/div[2]//input')[0]
-        response_json = json.loads(tree.attrib.get('value'))
-        return response_json.get('GX_AUTH_W0010MAINLOGIN')
+        return self.gx_session.X_GXAUTH_TOKEN
 
-    def __get_gx_auth_activity(self, response):
+    @property
+    def GX_AUTH_ACTIVITY(self):
         '''
-        Method get token page activity
-        Params:
-        ------
-            response: Request
-        Returns:
-        -------
-            x-auth-token: String
+        Token of the page activity of the session
         '''
-        tree = etree.HTML(response.text)
-        tree = tree.xpath('./body/script')[0]
-        index = tree.text.index('GX_AUTH_ACTIVITY')
-        index_final = tree.text.index('"', index+19)
-        return tree.text[index+19: index_final]
+        return self.gx_session.GX_AUTH_ACTIVITY
 
-    def __get_host(self, url_base):
+    def add_hook(self, hook):
         '''
-        Method of get host in url base
-        Params:
-        ------
-        url_base: String
+        Register a callable hook(event, data), called after each request
+        of the session (event 'request', see GxSession.add_hook) and after
+        each page of the grid (event 'page', with page, page_size and rows)
 
-        Returns:
-        -------
-        host: String (host of url base)
+        Ex: metrics = Metrics()
+            gxcrawler.add_hook(metrics)
+        '''
+        if hook not in self.hooks:
+            self.hooks.append(hook)
+        self.gx_session.add_hook(hook)
+
+    def remove_hook(self, hook):
+        '''
+        Remove a hook registered by add_hook
         '''
-        if url_base:
-            index = url_base.index('//')+2
-            return url_base[index: url_base.index('/', index)]
-        return None
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+        self.gx_session.remove_hook(hook)
 
-    def get_data(self, initial_date=None, final_date=None):
+    def get_data(self, initial_date=None, final_date=None, stream=False,
+                 since_build=None, start_row=0, before_build=None):
         '''
         Método para obtenção dos dados
         Parametros:
         ----------
-            None
+            initial_date: datetime
+            final_date: datetime
+            stream: bool (returns a lazy iterator of pages, each page is
+                    requested only when the previous one was consumed)
+            since_build: int (incremental mode, returns only the revisions
+                         after this build, without requesting the objects
+                         of the known ones)
+            start_row: int (rows of the grid already obtained, to resume
+                       a capture from the page of that row)
+            before_build: int (returns only the revisions before this
+                          build, to resume a capture)
         Retorno:
         -------
             List ou Array.
         '''
-        url = f'{self.url_base}/main.aspx'
-        headers = {
-            'Host': self.host,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
-        response = self.session.get(url, headers=headers)
-
-        self.X_GXAUTH_TOKEN = self.__get_x_auth_token(response)
-
-        # login page
-        url = f'{self.url_base}/main.aspx?gxfullajaxEvt,gx-no-cache=1603735860022'
-        headers = {
-            'Host': self.host,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
-            'Accept': '*/*',
-            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate',
-            'GxAjaxRequest': '1',
-            'Content-Type': 'application/json',
-            'X-GXAUTH-TOKEN': self.X_GXAUTH_TOKEN,
-            'Content-Length': '230',
-            'Connection': 'keep-alive',
-            'Referer': f'{self.url_base}/main.aspx',
-        }
-        payload = '{"MPage":false,"cmpCtx":"W0010","parms":[{"s":"Local","v":[["Local","Local"]]},"Local","'+self.user+'","'+self.password+'","",false,false],"hsh":[],"objClass":"mainlogin","pkgName":"Artech.GeneXusServer","events":["ENTER"],"grids":{}}'
-
-        response = self.session.get(url, headers=headers, data=payload)
-        # Expected {"gxCommands":[{"redirect":{"url":"/GeneXusServer16/dashboard.aspx"}}]}
-
-        # Page after login (dashboard)
-        url = f'{self.url_base}/dashboard.aspx'
-        headers = {
-            'Host': self.host,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
-            'Accept': '*/*',
-            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate',
-            'X-SPA-MP': 'masterpagebeforelogin',
-            'X-SPA-REQUEST': '1',
-            'Connection': 'keep-alive',
-            'Referer': f'{self.url_base}/main.aspx',
-        }
-        response = self.session.get(url, headers=headers)
-        url = f'{self.url_base}/activity.aspx?{self.kb_name}'
-        headers = {
-            'Host': self.host,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
-            'Accept': '*/*',
-            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate',
-            'X-SPA-MP': 'masterpage',
-            'X-SPA-REQUEST': '1',
-            'Connection': 'keep-alive',
-            'Referer': f'{self.url_base}/dashboard.aspx',
-        }
-        response = self.session.get(url, headers=headers)
+        # The login is made only once per session
+        self.gx_session.ensure_login()
+
+        initial_data_parm, final_data_parm = self.__get_date_filters(
+            initial_date, final_date)
+        data = self.__get_data_by_data(initial_date=initial_data_parm,
+                                       final_date=final_data_parm,
+                                       stream=stream,
+                                       since_build=since_build,
+                                       start_row=start_row,
+                                       before_build=before_build)
+        if stream:
+            return data
+        return list(data)
+
+    def get_rows(self, initial_date=None, final_date=None,
+                 since_build=None):
+        '''
+        Method to obtain the rows of the grid without the objects, that
+        are obtained by get_revision_objects
+        Params:
+        ------
+            initial_date: datetime
+            final_date: datetime
+            since_build: int (only the revisions after this build)
+        Returns:
+        -------
+            rows: Generator<Tuple<int, Dict>> (row of grid and revision)
+        '''
+        self.gx_session.ensure_login()
 
-        # Defining the authentication key to obtain the list of objects 
-        # in the event activity
-        self.GX_AUTH_ACTIVITY = self.__get_gx_auth_activity(response)
+        initial_data_parm, final_data_parm = self.__get_date_filters(
+            initial_date, final_date)
+        for commits in self.__get_data_by_data(
+                initial_date=initial_data_parm, final_date=final_data_parm,
+                since_build=since_build, objects=False):
+            yield from commits
 
+    def __get_date_filters(self, initial_date=None, final_date=None):
+        '''
+        Method for return the period in format of the grid filter, today
+        when the period is not informed
+        Returns:
+        -------
+            initial_date, final_date: Tuple<String, String>
+        '''
         if initial_date is None or final_date is None:
             current_timestamp = datetime.datetime.today()
-            initial_data_parm = f'{current_timestamp.year}{current_timestamp.month}{str(current_timestamp.day).zfill(2)}'
-            final_data_parm = initial_data_parm
-        else:
-            initial_data_parm = f'{initial_date.year}{initial_date.month}{str(initial_date.day).zfill(2)}'
-            final_data_parm = f'{final_date.year}{final_date.month}{str(final_date.day).zfill(2)}'
+            initial_data_parm = self.__format_date_filter(current_timestamp)
+            return initial_data_parm, initial_data_parm
+        return (self.__format_date_filter(initial_date),
+                self.__format_date_filter(final_date))
 
-        return list(self.__get_data_by_data(initial_date=initial_data_parm,
-                                            final_date=final_data_parm))
+    def __format_date_filter(self, date):
+        '''
+        Method for return the date in format of the grid filter
+        Params:
+        ------
+            date: datetime
+        Returns:
+        -------
+            date: String
+        '''
+        return f'{date.year}{date.month}{str(date.day).zfill(2)}'
 
-    def __get_data_by_data(self, initial_date=None, final_date=None):
+    def __get_data_by_data(self, initial_date=None, final_date=None,
+                           stream=False, since_build=None, start_row=0,
+                           before_build=None, objects=True):
         '''
         Method to get data with date filter
         Params:
         ------
         initial_date: String (Date format YYYYMMMDD)
         final_date: String (Date format YYYYMMMDD)
+        stream: bool (yield the revisions of page lazily)
+        since_build: int (only revisions after this build, the paging
+                     stops at the first known build)
+        start_row: int (rows of the grid already obtained)
+        before_build: int (only revisions before this build)
+        objects: bool (False yields the rows of grid without the objects)
 
         Returns:
         -------
-        revisions: List<Dict>
+        revisions: List<Revision>
 
         Ex: revisions = gxcrawler.get_data_by_data('20201024', '20201024')
         '''
-        count = 1
-        pagina = 1
-        while pagina <= self.LIMIT_PAGES:
-            url = f'{self.url_base}/activity.aspx?gxajaxGridRefresh_Activitygrid,10,{pagina},{initial_date},{final_date},,1633,false,gx-no-cache=1603737012264'
+        page_size = self.rows_per_page
+        offset = start_row - start_row % page_size
+        probing = False
+        while offset // page_size < self.LIMIT_PAGES:
+            pagina = offset // page_size + 1
+            url = f'{self.url_base}/activity.aspx?gxajaxGridRefresh_Activitygrid,{page_size},{pagina},{initial_date},{final_date},,1633,false,gx-no-cache=1603737012264'
             headers = {
                 'Host': self.host,
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
@@ -233,71 +256,208 @@ class GxCrawler():
                 'Connection': 'keep-alive',
                 'Referer': f'{self.url_base}/activity.aspx?{self.kb_name}',
             }
-            response = self.session.get(url, headers=headers)
-            count = self.__get_count_commits(response)
+            response = self.gx_session.request('GET', url, headers=headers)
+            # The response is decoded once for the count and the rows
+            response_json = self.__decode(response)
+            if self.adaptive_page_size and page_size > 1 \
+                    and self.__is_rejected(response, response_json):
+                # Smaller page whose first row is the same
+                page_size = next(size for size in range(page_size // 2, 0, -1)
+                                 if offset % size == 0)
+                self.rows_per_page = page_size
+                self.__page_size_confirmed = False
+                continue
+
+            if response.status_code != 200 or response_json is None:
+                raise Exception(f'Invalid response of the grid, page '
+                                f'{pagina}: status {response.status_code}')
+            count = self.parser.get_count(response_json)
             if count == 0:
-                pagina = self.LIMIT_PAGES + 1
+                break
+            if probing:
+                # The short first page was the limit of rows of the server
+                self.rows_per_page = page_size
+                self.__page_size_confirmed = True
+                probing = False
+            if count == page_size and page_size == self.rows_per_page:
+                self.__page_size_confirmed = True
+
+            commits = self.__get_commit_rows(response_json, count)
+            for hook in self.hooks:
+                hook('page', {'page': pagina, 'page_size': page_size,
+                              'rows': count})
+            known_build = False
+            if since_build is not None:
+                # The grid lists the newest revisions first, so the
+                # pages after a known build have only known builds
+                new_commits = [
+                    (commit, commit_dados)
+                    for commit, commit_dados in commits
+                    if int(commit_dados['revision_build']) > since_build]
+                known_build = len(new_commits) < len(commits)
+                commits = new_commits
+            if before_build is not None:
+                # The rows of the grid are shifted to the next pages
+                # when new revisions are made
+                commits = [
+                    (commit, commit_dados)
+                    for commit, commit_dados in commits
+                    if int(commit_dados['revision_build']) < before_build]
+
+            self.page, self.page_size = pagina, page_size
+            if objects:
+                page = self.__get_commit_json(commits)
+                yield page if stream else list(page)
             else:
-                yield list(self.__get_commit_json(response, count))
-                pagina += 1
+                yield commits
+
+            if known_build:
+                break
+            if count < page_size:
+                if self.__page_size_confirmed or offset > 0:
+                    # A short page is the last one, with no need to
+                    # request the next empty page
+                    break
+                # A short first page is the whole period or the limit of
+                # rows of the server, to be confirmed by the next page
+                page_size = count
+                probing = True
+            offset += page_size
+
+    def __decode(self, response):
+        '''
+        Method to decode the json of the response
+        Params:
+        ------
+        response: Request
+
+        Returns:
+        -------
+        response_json: Dict (None when the response is not a json)
+        '''
+        try:
+            return self.parser.loads(response.content)
+        except ValueError:
+            return None
 
-    def __get_count_commits(self, response):
+    def __is_rejected(self, response, response_json):
         '''
-        Method to return the number of operations returned in the request
+        Method to check if the server refused the page of the grid
         Params:
         ------
         response: Request
+        response_json: Dict (decoded response)
 
         Returns:
         -------
-        count_returns: int
+        rejected: bool
         '''
-        response_json = json.loads(response.text)
-        response_json = response_json.get('gxGrids')
-        if response_json:
-            return response_json[0]['Count']
-        else:
-            return 0
+        return response.status_code != 200 or response_json is None
 
-    def __get_commit_json(self, response, quantidade_operacoes=10):
+    def __get_commit_rows(self, response_json, quantidade_operacoes=10):
         '''
-        Metodo para retornar os dados do commit em json junto com a lista de objetos
+        Metodo para retornar os dados dos commits da pagina, sem os objetos
         Parâmetros:
         ----------
-            response: Request
+            response_json: Dict (resposta do grid)
             quantidade_operacoes: int (Quantidade de commits que retornou da requisição)
         Retorno:
         -------
-            List<Dict>
+            List<Tuple<int, Dict>> (linha do grid e commit)
         '''
-        response_json = json.loads(response.text)
-        response_json = response_json['gxValues']
         try:
-            for res in response_json:
-                for commit in range(1, quantidade_operacoes+1):
-                    commit_dados = {}
-                    tags_gx = [f'{tag}{str(commit).zfill(4)}' for tag in self.prefix_gx]
-                    tags_res = [self.descriptions.get(key) for key in self.prefix_gx]
-                    for i in range(0, len(self.prefix_gx)):
-                        commit_dados[tags_res[i]] = res[tags_gx[i]]
-
-                    commit_dados['revision_objects'] = list(
-                        self.__get_commit_objects(
-                            param0=commit_dados[tags_res[4]],
-                            param1=self.__format_date_req_param(
-                                commit_dados[tags_res[0]]
-                            ),
-                            param2=commit_dados[tags_res[5]],
-                            param3=commit_dados[tags_res[6]],
-                            param4=commit_dados[tags_res[2]],
-                            param5=commit_dados[tags_res[3]],
-                            grid_row=commit)
-                    )
-
-                    yield commit_dados
-
-        except KeyError:
-            raise 'Tag de dados incorreta.'
+            return self.parser.get_rows(response_json, quantidade_operacoes)
+        except KeyError as key_error:
+            raise Exception('Tag de dados incorreta.') from key_error
+
+    def __get_commit_json(self, commits):
+        '''
+        Metodo para retornar os dados do commit em json junto com a lista de objetos.
+        A revision whose objects failed is recorded in failed_revisions,
+        serial or in parallel, and left out of the page.
+        Parâmetros:
+        ----------
+            commits: List<Tuple<int, Dict>> (linha do grid e commit)
+        Retorno:
+        -------
+            List<Dict>
+        '''
+        if self.max_workers > 1:
+            yield from self.__get_commits_concurrent(commits)
+        else:
+            for commit, commit_dados in commits:
+                try:
+                    commit_dados['revision_objects'] = \
+                        self.get_revision_objects(commit_dados, commit)
+                except Exception as error:
+                    self.__add_failure(commit_dados, commit, error)
+                    continue
+                yield commit_dados
+
+    def __add_failure(self, commit_dados, grid_row, error):
+        '''
+        Method to record a revision whose objects could not be obtained,
+        without losing the other rows of the page
+        Params:
+        ------
+        commit_dados:   Revision (revision without the objects)
+        grid_row:       int (row of grid)
+        error:          Exception
+        '''
+        self.failed_revisions.append(
+            {'revision': commit_dados, 'grid_row': grid_row, 'error': error})
+
+    def get_revision_objects(self, commit_dados, grid_row):
+        '''
+        Method to return the objects of a revision of the grid
+        Params:
+        ------
+        commit_dados:   Revision (revision without the objects)
+        grid_row:       int (row of grid)
+
+        Returns:
+        -------
+        revision_objects:   List<RevisionObject>
+        '''
+        return list(
+            self.__get_commit_objects(
+                param0=commit_dados['revision_name'],
+                param1=self.__format_date_req_param(
+                    commit_dados['revision_date']
+                ),
+                param2=commit_dados['revision_operation'],
+                param3=str(commit_dados['revision_build']),
+                param4=commit_dados['revision_user'],
+                param5=commit_dados['revision_comment'],
+                grid_row=grid_row)
+        )
+
+    def __get_commits_concurrent(self, commits):
+        '''
+        Method to get the objects of all revisions of a page in parallel.
+        The revisions are returned in the order of the grid.
+        Params:
+        ------
+        commits:    List<Tuple> (row of grid, revision without objects)
+
+        Returns:
+        -------
+        revisions:  List<Revision>
+        '''
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self.get_revision_objects,
+                                commit_dados, commit)
+                for commit, commit_dados in commits]
+
+            for (commit, commit_dados), future in zip(commits, futures):
+                try:
+                    commit_dados['revision_objects'] = future.result()
+                except Exception as error:
+                    self.__add_failure(commit_dados, commit, error)
+                    continue
+
+                yield commit_dados
 
     def __get_commit_objects(self, param0=None, param1=None, param2=None, param3=None, param4=None, param5=None, grid_row=None):
         '''
@@ -315,7 +475,7 @@ class GxCrawler():
 
         Returns:
         -------
-        revision_obj:   List<Dict>
+        revision_obj:   List<RevisionObject>
         '''
 
         url = f'{self.url_base}/activity.aspx?gxfullajaxEvt,{self.kb_name},gx-no-cache=1603740836511'
@@ -327,7 +487,6 @@ class GxCrawler():
             'Accept-Encoding': 'gzip, deflate',
             'GxAjaxRequest': '1',
             'Content-Type': 'application/json',
-            'X-GXAUTH-TOKEN': self.GX_AUTH_ACTIVITY,
             'Content-Length': '358',
             'Connection': 'keep-alive',
             'Referer': f'{self.url_base}/activity.aspx?{self.kb_name}',
@@ -341,24 +500,12 @@ class GxCrawler():
             '"grids":{"Activitygrid":{"id":45,"lastRow":2,"pRow":""}},'
             '"row":"'+str(grid_row).zfill(4)+'","pRow":""}')
 
-        response = self.session.post(url, headers=headers, data=payload)
-
-        if response.status_code == 200:
-            response_json = json.loads(response.text)
-            response_json = response_json['gxValues'][1]
-
-            revision_obj = 1
-            while revision_obj < self.LIMITE_PER_REVISION:
-                tag = f'{self.prefix_gx_objects[0]}{str(revision_obj).zfill(4)}' #f'W0077vTYPE_{str(objeto).zfill(4)}'
-                if tag in response_json.keys():
-                    commit_dados = {}
-                    for tag in self.prefix_gx_objects:
-                        tag_full = f'{tag}{str(revision_obj).zfill(4)}'
-                        commit_dados[self.descriptions_objects.get(tag)] = response_json[tag_full]
-                    revision_obj += 1
+        response = self.gx_session.request('POST', url, headers=headers,
+                                           data=payload, activity_token=True)
 
-                    yield commit_dados
-                else:
-                    revision_obj = self.LIMITE_PER_REVISION + 1
+        if response.status_code != 200:
+            # Without the objects the revision would be written incomplete
+            raise Exception(f'Server answered with status '
+                            f'{response.status_code}')
 
-        return None
+        yield from self.parser.get_objects(self.parser.loads(response.content))
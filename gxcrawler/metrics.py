@@ -0,0 +1,223 @@
+'''
+Metrics of the crawls
+
+Collects the events of the hooks of GxSession, GxCrawler and DataBase:
+latency and bytes of the requests by endpoint, retries, revisions and
+objects written and time spent writing in SQLite
+'''
+import json
+import time
+import threading
+
+
+class Histogram():
+    '''
+    Histogram with cumulative buckets, as the histograms of Prometheus
+    '''
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+
+    def quantile(self, quantile):
+        '''
+        Upper bound of the bucket of the quantile
+        '''
+        if not self.count:
+            return 0.0
+        for bucket, count in zip(self.buckets, self.counts):
+            if count >= quantile * self.count:
+                return bucket
+        return float('inf')
+
+
+class Metrics():
+    '''
+    Collector of metrics of the crawls, used as hook
+
+    Ex: metrics = Metrics()
+        gxcrawler.add_hook(metrics)
+        database.add_hook(metrics)
+        ...
+        print(metrics.to_prometheus())
+    '''
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                       5.0, 10.0, 30.0)
+    WRITE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.start = time.time()
+        self.end = None
+        # By endpoint: login, grid and objects
+        self.latency = {}
+        self.bytes = {}
+        self.requests = {}
+        self.errors = {}
+        self.retries = {}
+        self.pages = 0
+        self.rows = 0
+        self.revisions = 0
+        self.objects = 0
+        self.write = Histogram(self.WRITE_BUCKETS)
+
+    def __call__(self, event, data):
+        '''
+        Hook of the events
+        Params:
+        ------
+            event: String (request, page or write)
+            data: Dict
+        '''
+        with self.__lock:
+            if event == 'request':
+                self.__on_request(data)
+            elif event == 'page':
+                self.pages += 1
+                self.rows += data['rows']
+            elif event == 'write':
+                self.revisions += data['revisions']
+                self.objects += data['objects']
+                self.write.observe(data['seconds'])
+
+    def __on_request(self, data):
+        endpoint = data['endpoint']
+        if endpoint not in self.latency:
+            self.latency[endpoint] = Histogram(self.LATENCY_BUCKETS)
+            self.bytes[endpoint] = 0
+            self.requests[endpoint] = 0
+            self.errors[endpoint] = 0
+            self.retries[endpoint] = 0
+        self.latency[endpoint].observe(data['seconds'])
+        self.bytes[endpoint] += data['bytes']
+        self.requests[endpoint] += 1
+        if data['status'] != 200:
+            self.errors[endpoint] += 1
+        if data['retry']:
+            self.retries[endpoint] += 1
+
+    def finish(self):
+        '''
+        End of the measured period, used by the rates
+        '''
+        self.end = time.time()
+
+    def summary(self):
+        '''
+        Summary of the metrics
+        Returns:
+        -------
+            summary: Dict
+        '''
+        with self.__lock:
+            seconds = (self.end or time.time()) - self.start
+            endpoints = {}
+            for endpoint, histogram in self.latency.items():
+                endpoints[endpoint] = {
+                    'requests': self.requests[endpoint],
+                    'errors': self.errors[endpoint],
+                    'retries': self.retries[endpoint],
+                    'bytes': self.bytes[endpoint],
+                    'seconds': histogram.sum,
+                    'mean_seconds': histogram.sum / histogram.count,
+                    'p50_seconds': histogram.quantile(0.5),
+                    'p95_seconds': histogram.quantile(0.95),
+                    'p99_seconds': histogram.quantile(0.99),
+                }
+            return {
+                'seconds': seconds,
+                'endpoints': endpoints,
+                'pages': self.pages,
+                'rows': self.rows,
+                'revisions': self.revisions,
+                'objects': self.objects,
+                'revisions_per_second':
+                    self.revisions / seconds if seconds else 0.0,
+                'objects_per_second':
+                    self.objects / seconds if seconds else 0.0,
+                'write_seconds': self.write.sum,
+                'write_batches': self.write.count,
+            }
+
+    def to_json(self):
+        '''
+        Summary of the metrics in json
+        '''
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self):
+        '''
+        Metrics in the text format of Prometheus
+        '''
+        lines = []
+        with self.__lock:
+            lines += self.__histogram_lines(
+                'gxcrawler_request_seconds',
+                'Latency of the requests to the server',
+                {endpoint: histogram
+                 for endpoint, histogram in self.latency.items()})
+            for name, values, help_text in (
+                    ('gxcrawler_requests_total', self.requests,
+                     'Requests to the server'),
+                    ('gxcrawler_request_errors_total', self.errors,
+                     'Responses with status other than 200'),
+                    ('gxcrawler_request_retries_total', self.retries,
+                     'Requests repeated'),
+                    ('gxcrawler_response_bytes_total', self.bytes,
+                     'Bytes of the responses')):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for endpoint, value in values.items():
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+            for name, value, help_text in (
+                    ('gxcrawler_grid_pages_total', self.pages,
+                     'Pages of the grid'),
+                    ('gxcrawler_grid_rows_total', self.rows,
+                     'Rows of the grid'),
+                    ('gxcrawler_revisions_written_total', self.revisions,
+                     'Revisions written in database'),
+                    ('gxcrawler_objects_written_total', self.objects,
+                     'Objects of revisions written in database')):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                lines.append(f'{name} {value}')
+            lines += self.__histogram_lines(
+                'gxcrawler_write_seconds',
+                'Time of the transactions of writing in database',
+                {None: self.write})
+        return '\n'.join(lines) + '\n'
+
+    def __histogram_lines(self, name, help_text, histograms):
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for endpoint, histogram in histograms.items():
+            label = f'endpoint="{endpoint}",' if endpoint else ''
+            for bucket, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f'{name}_bucket{{{label}le="{bucket}"}} {count}')
+            lines.append(
+                f'{name}_bucket{{{label}le="+Inf"}} {histogram.count}')
+            label = f'{{endpoint="{endpoint}"}}' if endpoint else ''
+            lines.append(f'{name}_sum{label} {histogram.sum}')
+            lines.append(f'{name}_count{label} {histogram.count}')
+        return lines
+
+    def write_file(self, path, metrics_format='json'):
+        '''
+        Write the metrics in a file
+        Params:
+        ------
+            path: String
+            metrics_format: String (json or prometheus)
+        '''
+        content = (self.to_prometheus() if metrics_format == 'prometheus'
+                   else self.to_json())
+        with open(path, 'w') as f_metrics:
+            f_metrics.write(content)
@@ -0,0 +1,337 @@
+'''
+Capture of several knowledge bases
+
+Crawls the knowledge bases of one or more genexus servers at the same
+time and writes all of them in one database, with the knowledge base of
+each revision in revision_kb. The knowledge bases of a server share its
+pool of connections and its workers, that take the partitions of each
+knowledge base in turn
+'''
+import json
+import queue
+import threading
+import collections
+
+import requests
+
+from gxcrawler import GxCrawler
+from session import GxSession
+from database import DataBase
+from backfill import Backfill
+
+
+class Orchestrator():
+    '''
+    Class of capture of several knowledge bases in one database
+    '''
+    TARGET_KEYS = ('url', 'kb_name', 'user', 'password')
+
+    def __init__(self, targets, workers_per_server=4, partition='day',
+                 batch_size=500, journal_mode=None, synchronous=None,
+                 queue_size=100, rows_per_page=10, adaptive_page_size=False,
+                 max_retries=3, cache=None, upsert=False):
+        '''
+        Class of capture of several knowledge bases
+        Params:
+        ------
+            targets: List<Dict> (url, kb_name, user and password of each
+                     knowledge base, as Config.get_configuration, and
+                     name, the revision_kb of its revisions, kb_name by
+                     default)
+            workers_per_server: int (partitions crawled at the same time
+                                in each server, shared by its knowledge
+                                bases, and connections of its pool)
+            partition: String (day or week)
+            batch_size: int (revisions per transaction in database)
+            journal_mode: String (journal mode of database while injecting,
+                          ex: WAL, the mode of the database is kept when
+                          not informed)
+            synchronous: String (synchronous of database while injecting,
+                         ex: NORMAL, kept when not informed)
+            queue_size: int (pages waiting for the writer, the workers
+                        wait when it is full)
+            rows_per_page: int (rows per page of the grid)
+            adaptive_page_size: bool (adapt the rows per page to the limit
+                                of the server)
+            max_retries: int (attempts repeated when the server fails)
+            cache: ResponseCache (responses of the servers recorded in disk)
+            upsert: bool (replace the revisions already in database)
+
+        Ex: orchestrator = Orchestrator([
+                {'url': 'http://192.168.1.1/GeneXusServer16',
+                 'kb_name': 'App', 'user': 'user', 'password': 'password'},
+                {'url': 'http://192.168.1.1/GeneXusServer16',
+                 'kb_name': 'Backoffice', 'user': 'user',
+                 'password': 'password'},
+            ], workers_per_server=8)
+            orchestrator.run(datetime.datetime(2020, 11, 1),
+                             datetime.datetime(2020, 11, 30))
+        '''
+        if partition not in Backfill.PARTITIONS:
+            raise ValueError(f'Invalid partition: {partition}')
+
+        self.targets = self.__get_targets(targets)
+        self.workers_per_server = max(1, int(workers_per_server))
+        self.partition = partition
+        self.batch_size = batch_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.queue_size = queue_size
+        self.rows_per_page = rows_per_page
+        self.adaptive_page_size = adaptive_page_size
+        self.max_retries = max_retries
+        self.cache = cache
+        self.upsert = upsert
+        # Partitions that could not be crawled, with the knowledge base
+        self.failed_partitions = []
+        # Revisions written by knowledge base in the last run
+        self.revisions = {}
+        # Sessions by name of target and pools of connections by server,
+        # kept between the runs to reuse the logins
+        self.__sessions = {}
+        self.__adapters = {}
+        self.__pending = {}
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__stop = threading.Event()
+
+    @staticmethod
+    def load_targets(path):
+        '''
+        Read the targets of a JSON file with a list of objects with url,
+        kb_name, user, password and optionally name
+        Params:
+        ------
+            path: String
+        Returns:
+        -------
+            targets: List<Dict>
+        '''
+        with open(path, 'r') as f_targets:
+            return json.load(f_targets)
+
+    def __get_targets(self, targets):
+        '''
+        Validate the targets, with the name of each one
+        Returns:
+        -------
+            targets: List<Dict>
+        '''
+        checked = []
+        names = set()
+        for target in targets:
+            missing = [key for key in self.TARGET_KEYS if not target.get(key)]
+            if missing:
+                raise ValueError(f'Target without {", ".join(missing)}: '
+                                 f'{target.get("name") or target.get("kb_name")}')
+            target = dict(target)
+            target['url'] = target['url'].rstrip('/')
+            target['name'] = target.get('name') or target['kb_name']
+            if target['name'] in names:
+                raise ValueError(f'Repeated target name: {target["name"]}, '
+                                 f'inform a name for each knowledge base')
+            names.add(target['name'])
+            checked.append(target)
+        if not checked:
+            raise ValueError('No targets')
+        return checked
+
+    def get_servers(self):
+        '''
+        Targets grouped by server
+        Returns:
+        -------
+            servers: Dict<String, List<Dict>> (targets by url)
+        '''
+        servers = {}
+        for target in self.targets:
+            servers.setdefault(target['url'], []).append(target)
+        return servers
+
+    def run(self, initial_date, final_date, database=None):
+        '''
+        Capture the period of all the targets and write in database
+        Params:
+        ------
+            initial_date: datetime
+            final_date: datetime
+            database: DataBase
+        Returns:
+        -------
+            statistics: Dict (statistics of DataBase.insert_revisions)
+        '''
+        if database is None:
+            database = DataBase()
+
+        partitions = Backfill(partition=self.partition).get_partitions(
+            initial_date, final_date)
+        servers = self.get_servers()
+        self.failed_partitions = []
+        self.revisions = {target['name']: 0 for target in self.targets}
+        self.__stop.clear()
+        # Partitions of each target of the server, the targets take turns
+        self.__pending = {
+            url: collections.deque(
+                (target, collections.deque(partitions))
+                for target in targets)
+            for url, targets in servers.items()}
+        pages = queue.Queue(maxsize=self.queue_size)
+
+        print(f'Capture of {len(self.targets)} knowledge bases in '
+              f'{len(servers)} servers: {initial_date} to {final_date}')
+        threads = [
+            threading.Thread(target=self.__work, args=(url, pages),
+                             daemon=True)
+            for url in servers for _ in range(self.workers_per_server)]
+        for thread in threads:
+            thread.start()
+        try:
+            statistics = database.insert_revisions(
+                self.__get_revisions(pages,
+                                     len(partitions) * len(self.targets)),
+                batch_size=self.batch_size,
+                journal_mode=self.journal_mode,
+                synchronous=self.synchronous,
+                upsert=self.upsert)
+        finally:
+            # Release the workers waiting for the writer
+            self.__stop.set()
+            for thread in threads:
+                thread.join()
+
+        print(f'Injected {statistics["revisions"]} revisions and '
+              f'{statistics["objects"]} objects '
+              f'({statistics["rows_per_second"]:.0f} rows/s)')
+        for name, revisions in self.revisions.items():
+            print(f'{name}: {revisions} revisions')
+        if self.failed_partitions:
+            print(f'{len(self.failed_partitions)} partitions failed')
+        return statistics
+
+    def __get_adapter(self, url):
+        '''
+        Pool of connections of the server, shared by the sessions of its
+        knowledge bases
+        '''
+        with self.__lock:
+            if url not in self.__adapters:
+                self.__adapters[url] = requests.adapters.HTTPAdapter(
+                    pool_connections=self.workers_per_server,
+                    pool_maxsize=self.workers_per_server)
+            return self.__adapters[url]
+
+    def __get_session(self, target):
+        '''
+        Session of the knowledge base, the login and the tokens are of
+        each knowledge base, the connections are of the server
+        '''
+        adapter = self.__get_adapter(target['url'])
+        with self.__lock:
+            if target['name'] not in self.__sessions:
+                self.__sessions[target['name']] = GxSession(
+                    target['user'], target['password'], target['url'],
+                    target['kb_name'], cache=self.cache,
+                    max_retries=self.max_retries, adapter=adapter)
+            return self.__sessions[target['name']]
+
+    def __get_crawler(self, target):
+        '''
+        Crawler of the knowledge base in the worker thread, the crawlers
+        of a knowledge base share its session
+        '''
+        crawlers = getattr(self.__local, 'crawlers', None)
+        if crawlers is None:
+            crawlers = self.__local.crawlers = {}
+        if target['name'] not in crawlers:
+            crawlers[target['name']] = GxCrawler(
+                target['user'], target['password'], target['url'],
+                target['kb_name'], session=self.__get_session(target),
+                rows_per_page=self.rows_per_page,
+                adaptive_page_size=self.adaptive_page_size)
+        return crawlers[target['name']]
+
+    def __next_partition(self, url):
+        '''
+        Next partition of the server, of each target in turn
+        Returns:
+        -------
+            target, partition: Tuple<Dict, Tuple<datetime, datetime>> or
+                               None when the server has no partitions left
+        '''
+        with self.__lock:
+            pending = self.__pending[url]
+            if not pending:
+                return None
+            target, partitions = pending.popleft()
+            partition = partitions.popleft()
+            if partitions:
+                pending.append((target, partitions))
+            return target, partition
+
+    def __work(self, url, pages):
+        '''
+        Worker of the server, crawls its partitions until they end
+        '''
+        while not self.__stop.is_set():
+            task = self.__next_partition(url)
+            if task is None:
+                return
+            self.__crawl_partition(task[0], task[1], pages)
+
+    def __crawl_partition(self, target, partition, pages):
+        '''
+        Crawl a partition of the target sending the pages to the writer
+        '''
+        try:
+            gxcrawler = self.__get_crawler(target)
+            failures = len(gxcrawler.failed_revisions)
+            for page in gxcrawler.get_data(partition[0], partition[1],
+                                           stream=True):
+                page = list(page)
+                for rev in page:
+                    rev['revision_kb'] = target['name']
+                if not self.__put(pages, ('page', target, page)):
+                    return
+            if len(gxcrawler.failed_revisions) > failures:
+                # The other revisions of the partition are written, the
+                # partition is captured again for the missing ones
+                raise Exception(
+                    f'{len(gxcrawler.failed_revisions) - failures} '
+                    f'revisions without objects')
+        except Exception as error:
+            print(f'Failed partition {partition[0]} to {partition[1]} of '
+                  f'{target["name"]}: {error}')
+            with self.__lock:
+                self.failed_partitions.append(
+                    {'name': target['name'], 'partition': partition,
+                     'error': error})
+        finally:
+            self.__put(pages, ('end', target, None))
+
+    def __put(self, pages, item):
+        '''
+        Put in queue, giving up when the writer stopped
+        Returns:
+        -------
+            sent: bool
+        '''
+        while not self.__stop.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __get_revisions(self, pages, partitions):
+        '''
+        Revisions received from the workers until all partitions end
+        '''
+        finished = 0
+        while finished < partitions:
+            kind, target, page = pages.get()
+            if kind == 'end':
+                finished += 1
+                continue
+            self.revisions[target['name']] += len(page)
+            yield from page
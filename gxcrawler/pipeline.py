@@ -0,0 +1,190 @@
+'''
+Pipeline of capture
+
+Grid pages, objects of revisions and database writes run in separate
+stages connected by bounded queues, overlapping network and disk
+'''
+import queue
+import threading
+
+from gxcrawler import GxCrawler
+from database import DataBase
+from config import Config
+
+
+class Pipeline():
+    '''
+    Class of capture in stages: a producer of the rows of the grid, a pool
+    of fetchers of the objects and a single writer in database
+    '''
+
+    def __init__(self, detail_workers=4, queue_size=100, batch_size=500,
+                 journal_mode=None, synchronous=None, upsert=False):
+        '''
+        Class of capture in stages
+        Params:
+        ------
+            detail_workers: int (threads requesting the objects)
+            queue_size: int (items waiting between the stages, a stage
+                        waits when the next one is behind)
+            batch_size: int (revisions per transaction in database)
+            journal_mode: String (journal mode of database while injecting,
+                          ex: WAL, the mode of the database is kept when
+                          not informed)
+            synchronous: String (synchronous of database while injecting,
+                         ex: NORMAL, kept when not informed)
+            upsert: bool (replace the revisions already in database)
+
+        Ex: pipeline = Pipeline(detail_workers=8)
+            pipeline.run(datetime.datetime(2020, 11, 1),
+                         datetime.datetime(2020, 11, 30))
+        '''
+        self.detail_workers = max(1, int(detail_workers))
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.upsert = upsert
+        # Revisions whose list of objects could not be obtained
+        self.failed_revisions = []
+        self.__errors = []
+        self.__stop = threading.Event()
+        self.__end = object()
+
+    def run(self, initial_date=None, final_date=None, config=None,
+            database=None, gxcrawler=None, since_build=None):
+        '''
+        Capture the period and write in database. The revisions are
+        written in the order their objects are obtained.
+        Params:
+        ------
+            initial_date: datetime
+            final_date: datetime
+            config: Config
+            database: DataBase
+            gxcrawler: GxCrawler (crawler with the session to use,
+                       created from the config when not informed)
+            since_build: int (only the revisions after this build)
+        Returns:
+        -------
+            statistics: Dict (statistics of DataBase.insert_revisions)
+        '''
+        if gxcrawler is None:
+            if config is None:
+                config = Config(method='FILE')
+            configuration = config.get_configuration()
+            gxcrawler = GxCrawler(
+                configuration['user'],
+                configuration['password'],
+                configuration['url'],
+                configuration['kb_name'],
+                max_workers=self.detail_workers
+            )
+        if database is None:
+            database = DataBase()
+
+        self.failed_revisions = []
+        self.__errors = []
+        self.__stop.clear()
+        rows = queue.Queue(maxsize=self.queue_size)
+        revisions = queue.Queue(maxsize=self.queue_size)
+
+        threads = [threading.Thread(
+            target=self.__produce_rows,
+            args=(gxcrawler, initial_date, final_date, since_build, rows),
+            daemon=True)]
+        threads += [
+            threading.Thread(target=self.__fetch_objects,
+                             args=(gxcrawler, rows, revisions), daemon=True)
+            for _ in range(self.detail_workers)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            statistics = database.insert_revisions(
+                self.__get_revisions(revisions),
+                batch_size=self.batch_size,
+                journal_mode=self.journal_mode,
+                synchronous=self.synchronous,
+                upsert=self.upsert)
+        finally:
+            # Release the stages waiting for the writer
+            self.__stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self.__errors:
+            raise Exception('Failure obtaining the rows of the grid.') \
+                from self.__errors[0]
+        return statistics
+
+    def __put(self, items, item):
+        '''
+        Put in queue, giving up when the pipeline stopped
+        Returns:
+        -------
+            sent: bool
+        '''
+        while not self.__stop.is_set():
+            try:
+                items.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __produce_rows(self, gxcrawler, initial_date, final_date,
+                       since_build, rows):
+        '''
+        Stage of the grid, sends the rows to the fetchers of objects
+        '''
+        try:
+            for row in gxcrawler.get_rows(initial_date, final_date,
+                                          since_build=since_build):
+                if not self.__put(rows, row):
+                    return
+        except Exception as error:
+            self.__errors.append(error)
+        finally:
+            for _ in range(self.detail_workers):
+                self.__put(rows, self.__end)
+
+    def __fetch_objects(self, gxcrawler, rows, revisions):
+        '''
+        Stage of the objects, sends the complete revisions to the writer
+        '''
+        try:
+            while not self.__stop.is_set():
+                try:
+                    row = rows.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if row is self.__end:
+                    return
+
+                grid_row, revision = row
+                try:
+                    revision['revision_objects'] = \
+                        gxcrawler.get_revision_objects(revision, grid_row)
+                except Exception as error:
+                    # Reported by Process, as the failures of GxCrawler
+                    self.failed_revisions.append(
+                        {'revision': revision, 'grid_row': grid_row,
+                         'error': error})
+                    continue
+                if not self.__put(revisions, revision):
+                    return
+        finally:
+            self.__put(revisions, self.__end)
+
+    def __get_revisions(self, revisions):
+        '''
+        Revisions received from the fetchers until all of them end
+        '''
+        finished = 0
+        while finished < self.detail_workers:
+            revision = revisions.get()
+            if revision is self.__end:
+                finished += 1
+            else:
+                yield revision
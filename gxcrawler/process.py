@@ -1,42 +1,370 @@
+import time
+import datetime
+
 from gxcrawler import GxCrawler
 from database import DataBase
 from config import Config
+from pipeline import Pipeline
+from metrics import Metrics
 
 
 class Process():
-    def __init__(self):
+    METRICS_FORMATS = ('json', 'prometheus')
+
+    def __init__(self, max_workers=1, stream=False, batch_size=500,
+                 journal_mode=None, synchronous=None, rows_per_page=10,
+                 adaptive_page_size=False, pipeline=False, cache=None,
+                 metrics=None, metrics_file=None, max_retries=3,
+                 adaptive_concurrency=False, upsert=False,
+                 database_path=None):
         '''
         Class capture data and incluse in db
+        Params:
+        ------
+            max_workers: int (parallel requests of objects per grid page)
+            stream: bool (write each revision as soon as it is obtained,
+                    instead of after the whole period was crawled)
+            batch_size: int (revisions per transaction in database)
+            journal_mode: String (journal mode of database while injecting,
+                          ex: WAL, the mode of the database is kept when
+                          not informed)
+            synchronous: String (synchronous of database while injecting,
+                         ex: NORMAL, kept when not informed)
+            rows_per_page: int (rows per page of the grid)
+            adaptive_page_size: bool (adapt the rows per page to the limit
+                                of the server)
+            pipeline: bool (grid, objects and database in separate stages,
+                      with max_workers threads requesting objects)
+            cache: ResponseCache (responses of the server recorded in disk)
+            metrics: String (json or prometheus, dump the metrics of the
+                     requests and of the writing at the end of capture)
+            metrics_file: String (file of the metrics, printed when not
+                          informed)
+            max_retries: int (attempts repeated when the server fails)
+            adaptive_concurrency: bool (adjust the requests in flight, up to
+                                  max_workers, to the latency and errors of
+                                  the server)
+            upsert: bool (replace the revisions already in database, the
+                    periods captured can overlap the ones in database)
+            database_path: String (database.db of the current directory
+                           when not informed)
         '''
+        if metrics is not None and metrics not in self.METRICS_FORMATS:
+            raise ValueError(f'Invalid metrics format: {metrics}')
         self.__initial_date = None
         self.__final_date = None
+        self.max_workers = max_workers
+        self.stream = stream
+        self.batch_size = batch_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.rows_per_page = rows_per_page
+        self.adaptive_page_size = adaptive_page_size
+        self.pipeline = pipeline
+        self.cache = cache
+        self.metrics_format = metrics
+        self.metrics_file = metrics_file
+        self.max_retries = max_retries
+        self.adaptive_concurrency = adaptive_concurrency
+        self.upsert = upsert
+        self.database_path = database_path
+        # Statistics of the last writing in database
+        self.statistics = None
+        # Revisions of the last capture whose objects could not be obtained
+        self.failed_revisions = []
+        # Metrics of the last capture
+        self.metrics = None
+        # Crawler kept between the calls, to reuse the login
+        self.__gxcrawler = None
+        self.__configuration = None
 
     def capture_data(self, initial_date=None, final_date=None, config=None):
-        if config is None:
-            config = Config(method='FILE')
-
-        configuration = config.get_configuration()
-        gxcrawler = GxCrawler(
-            configuration['user'],
-            configuration['password'],
-            configuration['url'],
-            configuration['kb_name']
-        )
+        '''
+        Capture the period and write in database
+        Returns:
+        -------
+            failed_revisions: List<Dict> (revisions not written because
+                              their objects could not be obtained, with
+                              revision, grid_row and error, to capture
+                              again)
+        '''
+        gxcrawler = self.__get_crawler(config)
 
         try:
             self.__initial_date = initial_date
             self.__final_date = final_date
-            data = gxcrawler.get_data(initial_date, final_date)
-            self.__inject_db(data)
+            return self.__capture(gxcrawler, DataBase(self.database_path))
         except KeyboardInterrupt as ke_interrupt:
             raise Exception('Operação interrompida.') from ke_interrupt
 
-    def __inject_db(self, data):
+    def sync(self, config=None):
         '''
-        Injecting data into the database
+        Capture only the revisions after the last revision in database,
+        from the day of that revision until today. The objects are only
+        requested for the new revisions. The last build in database is
+        the start of the next sync, so the new revisions are written
+        after all of them were obtained, the oldest first, and the ones
+        after a revision whose objects failed are left to the next sync.
+        Returns:
+        -------
+            failed_revisions: List<Dict> (see capture_data)
+        '''
+        database = DataBase(self.database_path)
+        last_revision = database.get_last_revision()
+        if last_revision is None:
+            raise Exception('Empty database, use capture_data first.')
+
+        gxcrawler = self.__get_crawler(config)
+
+        try:
+            self.__initial_date = self.__parse_revision_date(
+                last_revision['revision_date'])
+            self.__final_date = datetime.datetime.today()
+            return self.__capture(gxcrawler, database,
+                                  since_build=last_revision['revision_build'])
+        except KeyboardInterrupt as ke_interrupt:
+            raise Exception('Operação interrompida.') from ke_interrupt
+
+    def watch(self, interval=10, config=None, max_polls=None):
+        '''
+        Keep the database current while running, polling the grid with the
+        same session each interval seconds. Each poll requests the first
+        page of the grid, the next pages only while all its revisions are
+        new, and the objects only of the revisions after the last one in
+        database. The period starts at the day of the last poll, so that
+        the revisions before midnight are obtained after the day changes.
+        Params:
+        ------
+            interval: float (seconds between the starts of the polls)
+            config: Config
+            max_polls: int (polls before returning, endless when not
+                       informed, stopped by Ctrl+C)
+        Returns:
+        -------
+            revisions: int (revisions written)
+        '''
+        database = DataBase(self.database_path)
+        database.construct_schema()
+        gxcrawler = self.__get_crawler(config)
+        last_revision = database.get_last_revision()
+        if last_revision is None:
+            initial_date = datetime.datetime.today()
+        else:
+            # The revisions since the last one stored, as sync
+            initial_date = self.__parse_revision_date(
+                last_revision['revision_date'])
+
+        print(f'Watching the activity of {gxcrawler.kb_name} every '
+              f'{interval}s, since {initial_date:%Y-%m-%d}')
+        polls = 0
+        revisions = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                started = time.monotonic()
+                final_date = datetime.datetime.today()
+                try:
+                    revisions += self.__poll(gxcrawler, database,
+                                             initial_date, final_date)
+                    initial_date = final_date
+                except Exception as error:
+                    # The period of the failed poll is repeated in the next
+                    print(f'Failed poll of {gxcrawler.kb_name}: {error}')
+                polls += 1
+                if max_polls is None or polls < max_polls:
+                    time.sleep(max(0.0,
+                                   interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print('Watch interrupted.')
+        print(f'Watch ended after {polls} polls, {revisions} revisions '
+              f'written')
+        return revisions
+
+    def __poll(self, gxcrawler, database, initial_date, final_date):
+        '''
+        Write the revisions of the period after the last one in database
+        Returns:
+        -------
+            revisions: int (revisions written)
+        '''
+        last_revision = database.get_last_revision()
+        since_build = None
+        if last_revision is not None:
+            since_build = last_revision['revision_build']
+        revisions, failed = self.__get_new_revisions(
+            gxcrawler, initial_date, final_date, since_build)
+        if failed:
+            print(f'{len(failed)} revisions without objects, requested '
+                  f'again in the next poll')
+        if not revisions:
+            return 0
+
+        statistics = database.insert_revisions(
+            revisions, batch_size=self.batch_size,
+            journal_mode=self.journal_mode, synchronous=self.synchronous,
+            upsert=self.upsert)
+        self.statistics = statistics
+        print(f'{datetime.datetime.now():%Y-%m-%d %H:%M:%S} '
+              f'{statistics["revisions"]} new revisions, up to build '
+              f'{revisions[-1]["revision_build"]}')
+        return statistics['revisions']
+
+    def __get_new_revisions(self, gxcrawler, initial_date, final_date,
+                            since_build=None):
+        '''
+        Revisions of the period after since_build, the oldest first. The
+        revisions after a failed one are discarded, since_build of the
+        next capture would skip it.
+        Returns:
+        -------
+            revisions, failed: Tuple<List<Revision>, List<Dict>>
+        '''
+        failures = len(gxcrawler.failed_revisions)
+        revisions = [rev for page in gxcrawler.get_data(
+            initial_date, final_date, stream=True, since_build=since_build)
+            for rev in page]
+
+        failed = gxcrawler.failed_revisions[failures:]
+        if failed:
+            oldest_failed = min(int(failure['revision']['revision_build'])
+                                for failure in failed)
+            revisions = [rev for rev in revisions
+                         if int(rev['revision_build']) < oldest_failed]
+        # The grid lists the newest first, the oldest are written first so
+        # that an interrupted writing leaves no gap before the last build
+        revisions.sort(key=lambda rev: int(rev['revision_build']))
+        return revisions, failed
+
+    def __capture(self, gxcrawler, database, since_build=None):
+        '''
+        Capture the period of process and write in database
+        Returns:
+        -------
+            failed_revisions: List<Dict>
+        '''
+        if self.metrics_format is None:
+            return self.__run_capture(gxcrawler, database, since_build)
+
+        metrics = Metrics()
+        gxcrawler.add_hook(metrics)
+        database.add_hook(metrics)
+        try:
+            return self.__run_capture(gxcrawler, database, since_build)
+        finally:
+            gxcrawler.remove_hook(metrics)
+            database.remove_hook(metrics)
+            metrics.finish()
+            self.metrics = metrics
+            self.__export_metrics(metrics)
+
+    def __run_capture(self, gxcrawler, database, since_build=None):
+        '''
+        Capture the period with the pipeline or page by page, the
+        revisions after since_build as sync
+        Returns:
+        -------
+            failed_revisions: List<Dict>
         '''
-        database = DataBase()
         print(f'Injecting data into the database: {self.__initial_date} to {self.__final_date}')
-        for page in data:
-            for rev in page:
-                database.insert_revision(rev)
+        failures = len(gxcrawler.failed_revisions)
+        if since_build is not None:
+            revisions, failed = self.__get_new_revisions(
+                gxcrawler, self.__initial_date, self.__final_date,
+                since_build)
+            statistics = database.insert_revisions(
+                revisions, batch_size=self.batch_size,
+                journal_mode=self.journal_mode,
+                synchronous=self.synchronous, upsert=self.upsert)
+        elif self.pipeline:
+            pipeline = Pipeline(detail_workers=self.max_workers,
+                                batch_size=self.batch_size,
+                                journal_mode=self.journal_mode,
+                                synchronous=self.synchronous,
+                                upsert=self.upsert)
+            statistics = pipeline.run(
+                self.__initial_date, self.__final_date, database=database,
+                gxcrawler=gxcrawler)
+            failed = pipeline.failed_revisions
+        else:
+            data = gxcrawler.get_data(
+                self.__initial_date, self.__final_date, stream=self.stream)
+            statistics = self.__inject_db(data, database)
+            failed = gxcrawler.failed_revisions[failures:]
+        self.__print_statistics(statistics)
+
+        self.failed_revisions = failed
+        if failed:
+            builds = ', '.join(str(failure['revision']['revision_build'])
+                               for failure in failed)
+            print(f'{len(failed)} revisions without objects were not '
+                  f'written: {builds}')
+        return failed
+
+    def __get_crawler(self, config=None):
+        '''
+        Get the crawler of the configuration, the same crawler (and its
+        authenticated session) is reused while the configuration is the
+        same
+        '''
+        if config is None:
+            config = Config(method='FILE')
+
+        configuration = config.get_configuration()
+        if self.__gxcrawler is None or self.__configuration != configuration:
+            self.__gxcrawler = GxCrawler(
+                configuration['user'],
+                configuration['password'],
+                configuration['url'],
+                configuration['kb_name'],
+                max_workers=self.max_workers,
+                rows_per_page=self.rows_per_page,
+                adaptive_page_size=self.adaptive_page_size,
+                cache=self.cache,
+                max_retries=self.max_retries,
+                adaptive_concurrency=self.adaptive_concurrency
+            )
+            self.__configuration = configuration
+        return self.__gxcrawler
+
+    def __parse_revision_date(self, revision_date):
+        '''
+        Convert the date of revision of the server to datetime
+        Ex: 10/26/20 11:51 AM
+        '''
+        return datetime.datetime.strptime(revision_date[:8], '%m/%d/%y')
+
+    def __inject_db(self, data, database=None):
+        '''
+        Injecting data into the database
+        Returns:
+        -------
+            statistics: Dict (statistics of DataBase.insert_revisions)
+        '''
+        if database is None:
+            database = DataBase(self.database_path)
+        return database.insert_revisions(
+            (rev for page in data for rev in page),
+            batch_size=self.batch_size,
+            journal_mode=self.journal_mode,
+            synchronous=self.synchronous,
+            upsert=self.upsert)
+
+    def __print_statistics(self, statistics):
+        '''
+        Print the statistics of the writing in database
+        '''
+        self.statistics = statistics
+        print(f'Injected {statistics["revisions"]} revisions and '
+              f'{statistics["objects"]} objects '
+              f'({statistics["rows_per_second"]:.0f} rows/s)')
+
+    def __export_metrics(self, metrics):
+        '''
+        Write the metrics in metrics_file or print them
+        '''
+        if self.metrics_file:
+            metrics.write_file(self.metrics_file, self.metrics_format)
+            print(f'Metrics written in {self.metrics_file}')
+        elif self.metrics_format == 'prometheus':
+            print(metrics.to_prometheus())
+        else:
+            print(metrics.to_json())
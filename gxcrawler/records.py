@@ -0,0 +1,179 @@
+'''
+Records of the revisions and of the objects of revisions
+
+Classes with __slots__, without a dict by instance and with the numbers
+converted once when the response is parsed. They are read as dicts by the
+callers, rev['revision_build'] and dict(rev) are the same as before
+'''
+from collections.abc import MutableMapping
+
+
+class Record(MutableMapping):
+    '''
+    Base of the records, the fields are read and written as the keys of a
+    dict
+    '''
+    __slots__ = ()
+    # Names of the fields, in the order of the arguments
+    FIELDS = ()
+    # Fields converted to int
+    INTEGERS = ()
+    # Fields that are keys only when informed, read as their default
+    # otherwise
+    OPTIONAL = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        if key in self.INTEGERS:
+            value = int(value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError(f'{type(self).__name__} fields can not be removed')
+
+    def __iter__(self):
+        return iter(self.get_fields())
+
+    def __len__(self):
+        return len(self.get_fields())
+
+    def __contains__(self, key):
+        return key in self.get_fields()
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and \
+                self.to_tuple() == other.to_tuple()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def get_fields(self):
+        '''
+        Fields that are keys of the record, without the optional ones not
+        informed
+        '''
+        if not self.OPTIONAL:
+            return self.FIELDS
+        return tuple(field for field in self.FIELDS
+                     if field not in self.OPTIONAL or getattr(self, field))
+
+    def to_tuple(self):
+        '''
+        Values of the fields, in the order of FIELDS
+        '''
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def to_dict(self):
+        '''
+        Fields as a dict
+        '''
+        return {field: getattr(self, field) for field in self.get_fields()}
+
+    @classmethod
+    def from_dict(cls, values):
+        '''
+        Record of a dict with the fields, the missing ones with their
+        default
+        Params:
+        ------
+            values: Dict
+        Returns:
+        -------
+            record: Record
+        '''
+        if isinstance(values, cls):
+            return values
+        return cls(**{field: values[field] for field in cls.FIELDS
+                      if field in values})
+
+
+class RevisionObject(Record):
+    '''
+    Object of a revision
+    '''
+    __slots__ = ('object_type', 'object_name', 'object_gu_id',
+                 'object_entity_id', 'object_operation')
+    FIELDS = __slots__
+    INTEGERS = ('object_entity_id',)
+
+    def __init__(self, object_type, object_name, object_gu_id,
+                 object_entity_id, object_operation):
+        self.object_type = object_type
+        self.object_name = object_name
+        self.object_gu_id = object_gu_id
+        self.object_entity_id = int(object_entity_id)
+        self.object_operation = object_operation
+
+
+class Revision(Record):
+    '''
+    Revision of the activity grid, with its objects
+    '''
+    __slots__ = ('revision_date', 'revision_seconds', 'revision_user',
+                 'revision_comment', 'revision_name', 'revision_operation',
+                 'revision_build', 'revision_objects', 'revision_kb')
+    FIELDS = __slots__
+    INTEGERS = ('revision_seconds', 'revision_build')
+    OPTIONAL = ('revision_kb',)
+
+    def __init__(self, revision_date, revision_seconds, revision_user,
+                 revision_comment, revision_name, revision_operation,
+                 revision_build, revision_objects=None, revision_kb=''):
+        '''
+        Params:
+        ------
+            revision_objects: List<RevisionObject> (empty until the
+                              objects are obtained)
+            revision_kb: String (knowledge base of the revision, a key
+                         of the revision only when informed)
+        '''
+        self.revision_date = revision_date
+        self.revision_seconds = int(revision_seconds)
+        self.revision_user = revision_user
+        self.revision_comment = revision_comment
+        self.revision_name = revision_name
+        self.revision_operation = revision_operation
+        self.revision_build = int(revision_build)
+        self.revision_objects = (revision_objects
+                                 if revision_objects is not None else [])
+        self.revision_kb = revision_kb
+
+    @classmethod
+    def from_dict(cls, values):
+        '''
+        Revision of a dict, with the objects converted to RevisionObject
+        Params:
+        ------
+            values: Dict
+        Returns:
+        -------
+            revision: Revision
+        '''
+        if isinstance(values, cls):
+            return values
+        revision = super().from_dict(values)
+        revision.revision_objects = [
+            RevisionObject.from_dict(rev_obj)
+            for rev_obj in revision.revision_objects]
+        return revision
+
+    def to_dict(self):
+        '''
+        Fields as a dict, with the objects as dicts
+        '''
+        values = super().to_dict()
+        values['revision_objects'] = [
+            rev_obj.to_dict() if isinstance(rev_obj, Record) else rev_obj
+            for rev_obj in self.revision_objects]
+        return values
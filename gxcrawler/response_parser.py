@@ -0,0 +1,157 @@
+'''
+Parser of the responses of the genexus server 16
+
+Each response is decoded once, with orjson when it is installed, and the
+keys of the rows of the grid and of the objects are taken from tables
+computed once. The rows are returned as the records Revision and
+RevisionObject
+'''
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from records import Revision, RevisionObject
+
+
+# Prefix of the values of a row of the grid and field of the revision, in
+# the order of the arguments of Revision
+REVISION_FIELDS = (
+    ('vREVISIONDATE_', 'revision_date'),
+    ('vSECONDS_', 'revision_seconds'),
+    ('vUSER_', 'revision_user'),
+    ('vCOMMENT_', 'revision_comment'),
+    ('vREVISIONNAME_', 'revision_name'),
+    ('vOPERATION_', 'revision_operation'),
+    ('vBUILD_', 'revision_build'),
+)
+
+# Prefix of the values of an object of revision and field of the object,
+# in the order of the arguments of RevisionObject
+OBJECT_FIELDS = (
+    ('W0077vTYPE_', 'object_type'),
+    ('W0077vNAMEAUX_', 'object_name'),
+    ('W0077vENTITYGUID_', 'object_gu_id'),
+    ('W0077vENTITYID_', 'object_entity_id'),
+    ('W0077vOBJOPERATION_', 'object_operation'),
+)
+
+
+def loads(content):
+    '''
+    Decode a json, str or bytes
+    '''
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class KeyTable():
+    '''
+    Keys of the values of each row, computed once for each row
+    '''
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.__rows = [()]
+
+    def get(self, row):
+        '''
+        Keys of the row with the field of each one
+        Params:
+        ------
+            row: int (row starting in 1)
+        Returns:
+        -------
+            keys: Tuple<Tuple<String, String>> (key and field)
+        '''
+        while len(self.__rows) <= row:
+            sufix = str(len(self.__rows)).zfill(4)
+            self.__rows.append(tuple(
+                (f'{prefix}{sufix}', field) for prefix, field in self.fields))
+        return self.__rows[row]
+
+
+REVISION_KEYS = KeyTable(REVISION_FIELDS)
+OBJECT_KEYS = KeyTable(OBJECT_FIELDS)
+
+
+class ResponseParser():
+    '''
+    Parser of the responses of the grid and of the objects of revisions
+    '''
+
+    def __init__(self, limit_per_revision=1000):
+        '''
+        Params:
+        ------
+            limit_per_revision: int (limit of objects of a revision)
+        '''
+        self.limit_per_revision = limit_per_revision
+
+    def loads(self, content):
+        '''
+        Decode the response
+        Params:
+        ------
+            content: String or bytes
+        Returns:
+        -------
+            response_json: Dict
+        '''
+        return loads(content)
+
+    def get_count(self, response_json):
+        '''
+        Number of rows of the page of the grid
+        Params:
+        ------
+            response_json: Dict (response of the grid)
+        Returns:
+        -------
+            count: int
+        '''
+        grids = response_json.get('gxGrids')
+        if grids:
+            return grids[0]['Count']
+        return 0
+
+    def get_rows(self, response_json, count):
+        '''
+        Rows of the page of the grid, revisions without the objects
+        Params:
+        ------
+            response_json: Dict (response of the grid)
+            count: int (rows of the page)
+        Returns:
+        -------
+            rows: List<Tuple<int, Revision>> (row of grid and revision)
+        '''
+        rows = []
+        for values in response_json['gxValues']:
+            for row in range(1, count + 1):
+                rows.append((row, Revision(*[
+                    values[key] for key, _ in REVISION_KEYS.get(row)])))
+        return rows
+
+    def get_objects(self, response_json):
+        '''
+        Objects of a revision, from the response of the event
+        ACTIVITYGRID.ONLINEACTIVATE
+        Params:
+        ------
+            response_json: Dict
+        Returns:
+        -------
+            objects: List<RevisionObject>
+        '''
+        values = response_json['gxValues'][1]
+        objects = []
+        for row in range(1, self.limit_per_revision):
+            keys = OBJECT_KEYS.get(row)
+            if keys[0][0] not in values:
+                break
+            objects.append(RevisionObject(*[values[key] for key, _ in keys]))
+        return objects
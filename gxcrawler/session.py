@@ -0,0 +1,386 @@
+'''
+Authenticated session in genexus server 16
+
+Login once and reuse the cookies and tokens between requests
+'''
+import json
+import time
+import threading
+
+import requests
+from lxml import etree
+
+from cache import CachedSession
+from throttle import get_backoff, RETRY_STATUS
+
+
+def is_expired(status, content, redirected=False):
+    '''
+    Check if the server answered a request with the end of session, by
+    status, by a redirect to the login page or by the command of redirect
+    to it in the body
+    Params:
+    ------
+        status:     int (status of the response)
+        content:    bytes (body of the response, only its start is read)
+        redirected: bool (the request was redirected to the login page)
+    Returns:
+    -------
+        expired: bool
+    '''
+    if status in (401, 403) or redirected:
+        return True
+    # The start of the body, without decoding the whole response
+    content = content[:512]
+    return b'"redirect"' in content and b'main.aspx' in content
+
+
+class GxSession():
+    '''
+    Authenticated session in genexus server 16
+    '''
+
+    def __init__(self, user_login, user_password, url_base, kb_name,
+                 max_connections=10, cache=None, max_retries=3, backoff=0.5,
+                 max_backoff=30.0, limiter=None, adapter=None):
+        '''
+        Session that logs in the server once and keeps the cookies and
+        the tokens of authentication, logging in again only when the
+        server signals that the session expired
+        Params:
+        ------
+        user_login:         String (user login server)
+        user_password:      String (password login server)
+        url_base:           String (initial url of address of gxserver)
+        kb_name:            String (name of kb of data)
+        max_connections:    int (connections kept in the pool)
+        cache:              ResponseCache (responses recorded in disk)
+        max_retries:        int (attempts repeated after a connection error
+                            or a status of RETRY_STATUS)
+        backoff:            float (seconds of the first wait between
+                            attempts, doubled at each attempt, with jitter)
+        max_backoff:        float (limit of the wait between attempts)
+        limiter:            AdaptiveLimiter (limit of requests in flight
+                            adjusted by the latency and errors)
+        adapter:            HTTPAdapter (pool of connections shared with
+                            the sessions of other knowledge bases of the
+                            same server, max_connections is ignored)
+
+        Ex: session = GxSession('user', 'password',
+                                'http://192.168.1.1/GeneXusServer16',
+                                kb_name='App')
+            gxcrawler = GxCrawler('user', 'password',
+                                  'http://192.168.1.1/GeneXusServer16',
+                                  kb_name='App', session=session)
+        '''
+        if cache is None:
+            self.session = requests.Session()
+        else:
+            self.session = CachedSession(cache, kb_name)
+        self.user = user_login
+        self.password = user_password
+        self.url_base = url_base
+        self.kb_name = kb_name
+        self.host = self.__get_host(url_base)
+        self.X_GXAUTH_TOKEN = None
+        self.GX_AUTH_ACTIVITY = None
+        self.authenticated = False
+        self.logins = 0
+        self.max_retries = max(0, int(max_retries))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter
+        # Callables hook(event, data) called after each request
+        self.hooks = []
+        self.__lock = threading.Lock()
+
+        # The workers of the crawlers share the session, so the pool must
+        # hold a connection for each of them
+        if adapter is None:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=max_connections,
+                pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def add_hook(self, hook):
+        '''
+        Register a callable hook(event, data), called after each request
+        with the event 'request' and data with endpoint (login, grid or
+        objects), method, url, status, seconds, bytes and retry
+        '''
+        if hook not in self.hooks:
+            self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        '''
+        Remove a hook registered by add_hook
+        '''
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+
+    def __get_endpoint(self, method, url):
+        '''
+        Endpoint of the request, to group the metrics
+        '''
+        if 'gxajaxGridRefresh' in url:
+            return 'grid'
+        if method.upper() == 'POST' and 'activity.aspx' in url:
+            return 'objects'
+        return 'login'
+
+    def __send(self, method, url, retry=False, **kwargs):
+        '''
+        Make the request, repeating it after a connection error or a
+        response of server overloaded, waiting an exponential backoff with
+        jitter between the attempts
+        Returns:
+        -------
+            response: Request
+        '''
+        attempt = 0
+        while True:
+            response, error = self.__attempt(method, url, retry or attempt > 0,
+                                             **kwargs)
+            if error is None and \
+                    response.status_code not in RETRY_STATUS:
+                return response
+            if attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            time.sleep(self.__get_wait(attempt, response))
+
+    def __attempt(self, method, url, retry, **kwargs):
+        '''
+        Make one attempt of request, limited by the limiter, and call the
+        hooks
+        Returns:
+        -------
+            response, error: Tuple<Request, Exception>
+        '''
+        if self.limiter is not None:
+            self.limiter.acquire()
+        response = error = None
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as request_error:
+            error = request_error
+        except BaseException:
+            if self.limiter is not None:
+                self.limiter.release(error=True)
+            raise
+        seconds = time.perf_counter() - start
+        if self.limiter is not None:
+            self.limiter.release(seconds, error is not None or
+                                 response.status_code in RETRY_STATUS)
+
+        if self.hooks:
+            data = {
+                'endpoint': self.__get_endpoint(method, url),
+                'method': method.upper(),
+                'url': url,
+                'status': response.status_code if response is not None
+                else None,
+                'seconds': seconds,
+                'bytes': len(response.content) if response is not None
+                else 0,
+                'retry': retry,
+            }
+            for hook in self.hooks:
+                hook('request', data)
+        return response, error
+
+    def __get_wait(self, attempt, response=None):
+        '''
+        Seconds to wait before the attempt, at least the Retry-After of
+        the response
+        '''
+        wait = get_backoff(attempt, self.backoff, self.max_backoff)
+        retry_after = (response.headers.get('Retry-After')
+                       if response is not None else None)
+        if retry_after and retry_after.isdigit():
+            wait = max(wait, min(float(retry_after), self.max_backoff))
+        return wait
+
+    def __get_host(self, url_base):
+        '''
+        Method of get host in url base
+        Params:
+        ------
+        url_base: String
+
+        Returns:
+        -------
+        host: String (host of url base)
+        '''
+        if url_base:
+            index = url_base.index('//')+2
+            return url_base[index: url_base.index('/', index)]
+        return None
+
+    def __get_x_auth_token(self, response):
+        '''
+        Method get token
+        Params:
+        ------
+            response: Request
+        Returns:
+        -------
+            x-auth-token: String
+        '''
+        tree = etree.HTML(response.text)
+        tree = tree.xpath('./body/form/div[2]//input')[0]
+        response_json = json.loads(tree.attrib.get('value'))
+        return response_json.get('GX_AUTH_W0010MAINLOGIN')
+
+    def __get_gx_auth_activity(self, response):
+        '''
+        Method get token page activity
+        Params:
+        ------
+            response: Request
+        Returns:
+        -------
+            x-auth-token: String
+        '''
+        tree = etree.HTML(response.text)
+        tree = tree.xpath('./body/script')[0]
+        index = tree.text.index('GX_AUTH_ACTIVITY')
+        index_final = tree.text.index('"', index+19)
+        return tree.text[index+19: index_final]
+
+    def login(self):
+        '''
+        Method of login in server, obtaining the cookies of session and the
+        tokens of authentication of login and of the page activity
+        '''
+        url = f'{self.url_base}/main.aspx'
+        headers = {
+            'Host': self.host,
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1'
+        }
+        # A new login must not reuse the cookies of the expired session
+        self.session.cookies.clear()
+        response = self.__send('GET', url, headers=headers)
+
+        self.X_GXAUTH_TOKEN = self.__get_x_auth_token(response)
+
+        # login page
+        url = f'{self.url_base}/main.aspx?gxfullajaxEvt,gx-no-cache=1603735860022'
+        headers = {
+            'Host': self.host,
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
+            'Accept': '*/*',
+            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
+            'Accept-Encoding': 'gzip, deflate',
+            'GxAjaxRequest': '1',
+            'Content-Type': 'application/json',
+            'X-GXAUTH-TOKEN': self.X_GXAUTH_TOKEN,
+            'Content-Length': '230',
+            'Connection': 'keep-alive',
+            'Referer': f'{self.url_base}/main.aspx',
+        }
+        payload = '{"MPage":false,"cmpCtx":"W0010","parms":[{"s":"Local","v":[["Local","Local"]]},"Local","'+self.user+'","'+self.password+'","",false,false],"hsh":[],"objClass":"mainlogin","pkgName":"Artech.GeneXusServer","events":["ENTER"],"grids":{}}'
+
+        response = self.__send('GET', url, headers=headers, data=payload)
+        # Expected {"gxCommands":[{"redirect":{"url":"/GeneXusServer16/dashboard.aspx"}}]}
+
+        # Page after login (dashboard)
+        url = f'{self.url_base}/dashboard.aspx'
+        headers = {
+            'Host': self.host,
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
+            'Accept': '*/*',
+            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
+            'Accept-Encoding': 'gzip, deflate',
+            'X-SPA-MP': 'masterpagebeforelogin',
+            'X-SPA-REQUEST': '1',
+            'Connection': 'keep-alive',
+            'Referer': f'{self.url_base}/main.aspx',
+        }
+        response = self.__send('GET', url, headers=headers)
+        url = f'{self.url_base}/activity.aspx?{self.kb_name}'
+        headers = {
+            'Host': self.host,
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:68.0) Gecko/20100101 Firefox/68.0',
+            'Accept': '*/*',
+            'Accept-Language': 'pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3',
+            'Accept-Encoding': 'gzip, deflate',
+            'X-SPA-MP': 'masterpage',
+            'X-SPA-REQUEST': '1',
+            'Connection': 'keep-alive',
+            'Referer': f'{self.url_base}/dashboard.aspx',
+        }
+        response = self.__send('GET', url, headers=headers)
+
+        # Defining the authentication key to obtain the list of objects
+        # in the event activity
+        self.GX_AUTH_ACTIVITY = self.__get_gx_auth_activity(response)
+        self.authenticated = True
+        self.logins += 1
+
+    def ensure_login(self):
+        '''
+        Login in server only if the session is not authenticated
+        '''
+        with self.__lock:
+            if not self.authenticated:
+                self.login()
+
+    def is_expired(self, response):
+        '''
+        Check if the server answered the request with the end of session,
+        by status or redirecting to the login page
+        Params:
+        ------
+            response: Request
+        Returns:
+        -------
+            expired: bool
+        '''
+        return is_expired(
+            response.status_code, response.content,
+            bool(response.history) and '/main.aspx' in response.url)
+
+    def request(self, method, url, headers=None, data=None,
+                activity_token=False):
+        '''
+        Make a request with the authenticated session, logging in again
+        and repeating the request once when the session expired
+        Params:
+        ------
+            method:         String (GET or POST)
+            url:            String
+            headers:        Dict
+            data:           String
+            activity_token: bool (send the token of the page activity in
+                            header X-GXAUTH-TOKEN)
+        Returns:
+        -------
+            response: Request
+        '''
+        self.ensure_login()
+        headers = dict(headers or {})
+        logins = self.logins
+        if activity_token:
+            headers['X-GXAUTH-TOKEN'] = self.GX_AUTH_ACTIVITY
+        response = self.__send(method, url, headers=headers, data=data)
+        if not self.is_expired(response):
+            return response
+
+        with self.__lock:
+            # Other thread may have logged in again meanwhile
+            if self.logins == logins:
+                self.login()
+        if activity_token:
+            headers['X-GXAUTH-TOKEN'] = self.GX_AUTH_ACTIVITY
+        return self.__send(method, url, retry=True, headers=headers,
+                           data=data)
@@ -0,0 +1,113 @@
+'''
+Control of the requests in flight to the genexus server
+
+The limit of requests in flight grows while the server answers fast and
+is halved when it slows down or fails (AIMD, as the congestion control
+of TCP)
+'''
+import random
+import threading
+
+# Status of the responses of a server overloaded or unavailable
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class AdaptiveLimiter():
+    '''
+    Limit of requests in flight adjusted by the latency and the errors
+    '''
+
+    def __init__(self, initial=4, minimum=1, maximum=32, latency_target=None,
+                 tolerance=2.0, decrease=0.5):
+        '''
+        Params:
+        ------
+            initial: int (requests in flight at start)
+            minimum: int
+            maximum: int
+            latency_target: float (seconds, slower responses reduce the
+                            limit, by default tolerance times the fastest
+                            latency observed)
+            tolerance: float
+            decrease: float (factor of the limit on a slow response or on
+                      an error)
+
+        Ex: session = GxSession('user', 'password', url_base, 'App',
+                                limiter=AdaptiveLimiter(maximum=16))
+        '''
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self.__base_latency = None
+        # Responses to wait after a decrease before the next one, the
+        # requests in flight were made with the previous limit
+        self.__cooldown = 0
+        self.__condition = threading.Condition()
+
+    def acquire(self):
+        '''
+        Wait for a slot of request
+        '''
+        with self.__condition:
+            while self.in_flight >= int(self.limit):
+                self.__condition.wait()
+            self.in_flight += 1
+
+    def release(self, seconds=None, error=False):
+        '''
+        Free the slot and adjust the limit by the result of the request
+        Params:
+        ------
+            seconds: float (latency of the request)
+            error: bool (failure or refusal of the server)
+        '''
+        with self.__condition:
+            self.in_flight -= 1
+            if self.__cooldown:
+                self.__cooldown -= 1
+            if error or self.__is_slow(seconds):
+                if not self.__cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.decreases += 1
+                    self.__cooldown = self.in_flight + 1
+            elif self.limit < self.maximum:
+                # Additive increase: one request more per limit of
+                # successful responses
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.increases += 1
+            self.__condition.notify_all()
+
+    def __is_slow(self, seconds):
+        '''
+        Check if the latency is above the target
+        '''
+        if seconds is None:
+            return False
+        if self.latency_target is not None:
+            return seconds > self.latency_target
+        if self.__base_latency is None or seconds < self.__base_latency:
+            self.__base_latency = seconds
+            return False
+        # Latency is measured with some noise, small values are ignored
+        return seconds > max(self.__base_latency * self.tolerance, 0.05)
+
+
+def get_backoff(attempt, backoff=0.5, max_backoff=30.0):
+    '''
+    Time to wait before the attempt, exponential with full jitter
+    Params:
+    ------
+        attempt: int (starting in 1)
+        backoff: float (seconds of the first attempt)
+        max_backoff: float
+    Returns:
+    -------
+        seconds: float
+    '''
+    return random.uniform(0, min(max_backoff, backoff * 2 ** (attempt - 1)))
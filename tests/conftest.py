@@ -0,0 +1,101 @@
+'''
+Fixtures of the tests, run against the local fake server and temporary
+sqlite files
+
+Ex: python -m pytest tests
+'''
+import os
+import sys
+import datetime
+
+import pytest
+
+# The modules import each other by name, as in gxcrawler/cli.py
+GXCRAWLER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                         'gxcrawler')
+sys.path.insert(0, GXCRAWLER)
+
+from fakeserver import FakeGxServer  # noqa: E402
+from database import DataBase  # noqa: E402
+from records import Revision, RevisionObject  # noqa: E402
+
+# Day of the last revision of the fake server in the tests of past days
+LAST_DAY = datetime.date(2020, 11, 3)
+
+
+@pytest.fixture
+def server():
+    '''
+    Fake server with 20 revisions per day until LAST_DAY
+    '''
+    with FakeGxServer(revisions_per_day=20, last_day=LAST_DAY) as fake:
+        yield fake
+
+
+@pytest.fixture
+def config(server, monkeypatch):
+    '''
+    Config of the environment variables with the fake server
+    '''
+    from config import Config
+
+    monkeypatch.setenv('GX_USER', 'user')
+    monkeypatch.setenv('GX_PASSWORD', 'password')
+    monkeypatch.setenv('GX_URL', server.url_base)
+    monkeypatch.setenv('GX_KBNAME', server.kb_name)
+    return Config(method='ENV')
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    '''
+    Path of a new database with the schema
+    '''
+    path = str(tmp_path / 'database.db')
+    database = DataBase(path)
+    database.construct_schema()
+    database.conn.close()
+    return path
+
+
+def get_day(date):
+    '''
+    datetime of the start of the day, as the dates of Process
+    '''
+    return datetime.datetime.combine(date, datetime.time())
+
+
+def get_builds(server, initial_date, final_date):
+    '''
+    Builds of the fake server in the period, the newest first
+    '''
+    return [revision['build']
+            for revision in server.get_revisions(initial_date, final_date)]
+
+
+def count_revisions(path):
+    '''
+    Revisions in the database of the path
+    '''
+    database = DataBase(path)
+    try:
+        return database.conn.execute(
+            'SELECT COUNT(*) FROM revision').fetchone()[0]
+    finally:
+        database.conn.close()
+
+
+def make_revision(build, revision_kb='', user='user0', day=2, objects=2,
+                  comment=None):
+    '''
+    Revision with objects of the build, for the tests of database
+    '''
+    return Revision(
+        f'11/{day:02d}/20 10:00 AM', build % 60, user,
+        comment or f'Change {build}', f'Revision {build}', 'Commit', build,
+        [RevisionObject('Procedure' if index % 2 else 'Transaction',
+                        f'Object{build % 5 + index}',
+                        f'guid-{build % 5 + index}', build % 5 + index,
+                        'Update')
+         for index in range(objects)],
+        revision_kb)
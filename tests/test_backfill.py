@@ -0,0 +1,96 @@
+'''
+Tests of Backfill and of the checkpoints of its jobs
+'''
+import datetime
+
+from backfill import Backfill
+from database import DataBase
+from cache import ResponseCache
+from metrics import Metrics
+
+from conftest import LAST_DAY, get_day, get_builds, count_revisions
+
+FIRST_DAY = LAST_DAY - datetime.timedelta(days=2)
+
+
+def test_backfill_with_deferred_indexes(config, database_path):
+    backfill = Backfill(workers=2, max_workers=2)
+
+    statistics = backfill.run(get_day(FIRST_DAY), get_day(LAST_DAY),
+                              config=config,
+                              database=DataBase(database_path))
+
+    assert statistics['revisions'] == 60
+    assert backfill.failed_partitions == []
+    assert count_revisions(database_path) == 60
+    assert DataBase(database_path).has_indexes()
+
+
+def test_backfill_with_cache_and_hooks(server, config, database_path,
+                                       tmp_path):
+    metrics = Metrics()
+    backfill = Backfill(workers=2, max_retries=0,
+                        cache=ResponseCache(str(tmp_path / 'cache')))
+    backfill.add_hook(metrics)
+
+    backfill.run(get_day(FIRST_DAY), get_day(LAST_DAY), config=config,
+                 database=DataBase(database_path))
+
+    # The requests of the workers and the writes of the database
+    assert metrics.requests['objects'] == 60
+    assert metrics.pages == 6
+    assert metrics.revisions == 60
+
+    # The workers read the responses recorded, without the server
+    requests = dict(server.requests)
+    database = DataBase(str(tmp_path / 'replay.db'))
+    database.construct_schema()
+    replay = Backfill(workers=2, cache=ResponseCache(str(tmp_path / 'cache'),
+                                                     mode='replay'))
+    statistics = replay.run(get_day(FIRST_DAY), get_day(LAST_DAY),
+                            config=config, database=database)
+    assert statistics['revisions'] == 60
+    assert replay.failed_partitions == []
+    assert server.requests == requests
+
+
+def test_job_resumes_failed_revision(server, config, database_path):
+    day = FIRST_DAY + datetime.timedelta(days=1)
+    failed_build = get_builds(server, day, day)[12]
+    server.failed_builds.add(failed_build)
+    backfill = Backfill(workers=2, max_workers=4)
+
+    backfill.run(get_day(FIRST_DAY), get_day(LAST_DAY), config=config,
+                 database=DataBase(database_path), job_id='job')
+
+    assert [failed['partition'][0].date()
+            for failed in backfill.failed_partitions] == [day]
+    checkpoints = DataBase(database_path).get_checkpoints('job')
+    assert not checkpoints[day.isoformat()]['finished']
+    # The pages before the failed one are kept
+    assert count_revisions(database_path) == 40 + 10
+
+    server.failed_builds.clear()
+    objects = server.requests['objects']
+    backfill.run(get_day(FIRST_DAY), get_day(LAST_DAY), config=config,
+                 database=DataBase(database_path), job_id='job')
+
+    assert backfill.failed_partitions == []
+    assert count_revisions(database_path) == 60
+    # Only the pages after the checkpoint are requested again
+    assert server.requests['objects'] - objects == 10
+    checkpoints = DataBase(database_path).get_checkpoints('job')
+    assert all(checkpoint['finished'] for checkpoint in checkpoints.values())
+
+
+def test_finished_job_makes_no_requests(server, config, database_path):
+    backfill = Backfill(workers=2)
+    backfill.run(get_day(FIRST_DAY), get_day(LAST_DAY), config=config,
+                 database=DataBase(database_path), job_id='job')
+    grid = server.requests['grid']
+
+    backfill.run(get_day(FIRST_DAY), get_day(LAST_DAY), config=config,
+                 database=DataBase(database_path), job_id='job')
+
+    assert server.requests['grid'] == grid
+    assert count_revisions(database_path) == 60
@@ -0,0 +1,74 @@
+'''
+Tests of ResponseCache with the sessions of the crawler
+'''
+import pytest
+
+from gxcrawler import GxCrawler
+from cache import ResponseCache, CacheMiss
+
+from conftest import LAST_DAY, get_day
+
+
+def get_builds(gxcrawler):
+    '''
+    Builds of LAST_DAY obtained by the crawler
+    '''
+    day = get_day(LAST_DAY)
+    return [rev['revision_build']
+            for page in gxcrawler.get_data(day, day) for rev in page]
+
+
+def test_replay_without_server(server, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache'))
+    builds = get_builds(GxCrawler('user', 'password', server.url_base,
+                                  server.kb_name, cache=cache))
+    requests = dict(server.requests)
+
+    replay = ResponseCache(str(tmp_path / 'cache'), mode='replay')
+    gxcrawler = GxCrawler('user', 'password', server.url_base,
+                          server.kb_name, cache=replay)
+
+    assert get_builds(gxcrawler) == builds
+    assert server.requests == requests
+
+
+def test_expired_session_not_recorded(server, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache'))
+    gxcrawler = GxCrawler('user', 'password', server.url_base,
+                          server.kb_name, cache=cache)
+    gxcrawler.gx_session.ensure_login()
+    server.expire_sessions()
+
+    assert len(get_builds(gxcrawler)) == 20
+    # A new login with the same cache reads the objects, not the redirect
+    # of the expired session
+    gxcrawler = GxCrawler('user', 'password', server.url_base,
+                          server.kb_name, cache=cache)
+    objects = server.requests['objects']
+    day = get_day(LAST_DAY)
+    revisions = [rev for page in gxcrawler.get_data(day, day) for rev in page]
+    assert all(len(rev['revision_objects']) == 3 for rev in revisions)
+    assert server.requests['objects'] == objects
+
+
+def test_grid_cached_by_knowledge_base(server, tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache'))
+    get_builds(GxCrawler('user', 'password', server.url_base, 'App',
+                         cache=cache))
+    grid = server.requests['grid']
+
+    # The url of the grid is the same, the server takes the knowledge base
+    # of the session
+    get_builds(GxCrawler('user', 'password', server.url_base, 'Backoffice',
+                         cache=cache))
+    assert server.requests['grid'] > grid
+
+    grid = server.requests['grid']
+    get_builds(GxCrawler('user', 'password', server.url_base, 'App',
+                         cache=cache))
+    assert server.requests['grid'] == grid
+
+    replay = ResponseCache(str(tmp_path / 'cache'), mode='replay')
+    with pytest.raises(CacheMiss):
+        get_builds(GxCrawler('user', 'password', server.url_base, 'Other',
+                             cache=replay))
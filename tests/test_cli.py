@@ -0,0 +1,72 @@
+'''
+Tests of the commands of the command line of the database
+'''
+import json
+import subprocess
+import sys
+
+import cli
+from database import DataBase
+
+from conftest import GXCRAWLER, make_revision
+
+
+def run(path, *argv):
+    '''
+    Run the command with the database of the path
+    '''
+    assert cli.main(['--database', path, *argv]) == 0
+
+
+def get_rows(capsys):
+    '''
+    JSON lines printed by the command
+    '''
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_init_db_migrate_and_rebuild(database_path):
+    database = DataBase(database_path)
+    database.insert_revisions([make_revision(build) for build in range(1, 6)])
+    database.conn.close()
+
+    run(database_path, 'init-db', '--migrate', 'normalized', '--indexes',
+        '--rebuild-rollups', '--rebuild-search')
+
+    database = DataBase(database_path)
+    assert database.get_storage() == 'normalized'
+    assert database.has_indexes()
+    assert len(database.get_revisions(range(1, 6))) == 5
+
+
+def test_export_import_and_query(database_path, tmp_path, capsys):
+    database = DataBase(database_path)
+    database.insert_revisions(
+        [make_revision(build, 'App') for build in range(1, 4)] +
+        [make_revision(2, 'Hr', comment='Fix invoice')])
+    database.conn.close()
+    path = str(tmp_path / 'revisions.jsonl.gz')
+
+    run(database_path, 'export', path)
+    assert 'Next export: --since-build App=3,Hr=2' in \
+        capsys.readouterr().out
+    imported = str(tmp_path / 'imported.db')
+    run(imported, 'import', path)
+    capsys.readouterr()
+
+    run(imported, 'query', 'search', 'invoice')
+    assert [(row['revision_kb'], row['revision_build'])
+            for row in get_rows(capsys)] == [('Hr', 2)]
+    run(imported, 'query', 'revision', '3', '--kb', 'App')
+    revision, = get_rows(capsys)
+    assert len(revision['revision_objects']) == 2
+
+
+def test_database_module_runs_init_db(tmp_path):
+    # python gxcrawler/database.py is the command init-db
+    subprocess.run([sys.executable, f'{GXCRAWLER}/database.py',
+                    '--storage', 'normalized'], cwd=tmp_path, check=True,
+                   capture_output=True)
+
+    assert DataBase(str(tmp_path / 'database.db')).get_storage() == \
+        'normalized'
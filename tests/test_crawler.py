@@ -0,0 +1,187 @@
+'''
+Tests of GxCrawler and AsyncGxCrawler against the fake server
+'''
+import asyncio
+
+import pytest
+
+from gxcrawler import GxCrawler
+from async_gxcrawler import AsyncGxCrawler
+from fakeserver import FakeGxServer
+from response_parser import ResponseParser
+
+from conftest import LAST_DAY, get_day, get_builds
+
+
+def get_revisions(pages):
+    '''
+    Revisions of the pages as dicts, with the objects as dicts
+    '''
+    return [{**rev, 'revision_objects': [dict(rev_obj) for rev_obj in
+                                         rev['revision_objects']]}
+            for page in pages for rev in page]
+
+
+def get_async_data(server, initial_date, final_date, **kwargs):
+    '''
+    Pages of AsyncGxCrawler.get_data
+    '''
+    async def run():
+        async with AsyncGxCrawler('user', 'password', server.url_base,
+                                  server.kb_name, **kwargs) as gxcrawler:
+            return await gxcrawler.get_data(initial_date, final_date)
+    return asyncio.run(run())
+
+
+def test_async_same_revisions_as_sync(server):
+    initial_date = get_day(LAST_DAY.replace(day=1))
+    final_date = get_day(LAST_DAY)
+    gxcrawler = GxCrawler('user', 'password', server.url_base,
+                          server.kb_name, max_workers=4)
+
+    revisions = get_revisions(gxcrawler.get_data(initial_date, final_date))
+    async_revisions = get_revisions(get_async_data(
+        server, initial_date, final_date, max_concurrency=4))
+
+    assert len(revisions) == 60
+    assert async_revisions == revisions
+    assert [rev['revision_build'] for rev in revisions] == \
+        get_builds(server, LAST_DAY.replace(day=1), LAST_DAY)
+    assert all(len(rev['revision_objects']) == 3 for rev in revisions)
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_failed_revision_recorded(server, max_workers):
+    day = get_day(LAST_DAY)
+    builds = get_builds(server, LAST_DAY, LAST_DAY)
+    server.failed_builds.add(builds[5])
+    gxcrawler = GxCrawler('user', 'password', server.url_base,
+                          server.kb_name, max_workers=max_workers)
+
+    revisions = get_revisions(gxcrawler.get_data(day, day))
+
+    # The other rows of the page are kept, in the order of the grid
+    assert [rev['revision_build'] for rev in revisions] == \
+        builds[:5] + builds[6:]
+    assert [failure['revision']['revision_build']
+            for failure in gxcrawler.failed_revisions] == [builds[5]]
+    assert gxcrawler.failed_revisions[0]['grid_row'] == 6
+
+
+def test_async_unexpected_error_recorded(server, monkeypatch):
+    day = get_day(LAST_DAY)
+    builds = get_builds(server, LAST_DAY, LAST_DAY)
+    server.failed_builds.add(builds[5])
+    get_objects = ResponseParser.get_objects
+    calls = []
+
+    def fail_once(parser, response_json):
+        calls.append(response_json)
+        if len(calls) == 3:
+            raise RuntimeError('Unexpected error')
+        return get_objects(parser, response_json)
+
+    monkeypatch.setattr(ResponseParser, 'get_objects', fail_once)
+
+    async def run():
+        async with AsyncGxCrawler('user', 'password', server.url_base,
+                                  server.kb_name) as gxcrawler:
+            return (await gxcrawler.get_data(day, day),
+                    gxcrawler.failed_revisions)
+
+    pages, failed = asyncio.run(run())
+
+    revisions = get_revisions(pages)
+    assert len(revisions) == 18
+    assert sorted(type(failure['error']).__name__ for failure in failed) == \
+        ['RuntimeError', 'ValueError']
+    assert {rev['revision_build'] for rev in revisions} | \
+        {failure['revision']['revision_build'] for failure in failed} == \
+        set(builds)
+
+
+def test_async_login_again_after_expiry(server):
+    day = get_day(LAST_DAY)
+
+    async def run():
+        async with AsyncGxCrawler('user', 'password', server.url_base,
+                                  server.kb_name) as gxcrawler:
+            await gxcrawler.ensure_login()
+            server.expire_sessions()
+            return (await gxcrawler.get_data(day, day), gxcrawler.logins,
+                    gxcrawler.failed_revisions)
+
+    pages, logins, failed = asyncio.run(run())
+
+    assert logins == 2
+    assert failed == []
+    revisions = get_revisions(pages)
+    assert len(revisions) == 20
+    assert all(len(rev['revision_objects']) == 3 for rev in revisions)
+
+
+def test_async_early_close_cancels_requests():
+    with FakeGxServer(revisions_per_day=20, last_day=LAST_DAY,
+                      latency=0.05) as server:
+        day = get_day(LAST_DAY)
+
+        async def run():
+            async with AsyncGxCrawler('user', 'password', server.url_base,
+                                      server.kb_name, max_concurrency=2,
+                                      rows_per_page=5) as gxcrawler:
+                pages = gxcrawler.iter_data(day, day)
+                async for page in pages:
+                    break
+                await pages.aclose()
+                return page, [task for task in asyncio.all_tasks()
+                              if task is not asyncio.current_task()]
+
+        page, running = asyncio.run(run())
+
+        assert len(page) == 5
+        assert running == []
+
+
+def test_stream_requests_pages_lazily(server):
+    day = get_day(LAST_DAY)
+    gxcrawler = GxCrawler('user', 'password', server.url_base,
+                          server.kb_name, rows_per_page=5)
+
+    pages = gxcrawler.get_data(day, day, stream=True)
+    assert server.requests['grid'] == 0
+    first_page = list(next(pages))
+    # Only the first page and its objects, until the next one is consumed
+    assert server.requests['grid'] == 1
+    assert server.requests['objects'] == 5
+
+    revisions = get_revisions([first_page, *pages])
+    assert len(revisions) == 20
+    assert revisions == get_revisions(gxcrawler.get_data(day, day))
+
+
+def test_short_first_page_of_server_limit():
+    '''
+    A server that caps the rows per page returns a short first page that
+    is not the last one
+    '''
+    with FakeGxServer(revisions_per_day=74, last_day=LAST_DAY,
+                      max_rows_per_page=25) as server:
+        day = get_day(LAST_DAY)
+        gxcrawler = GxCrawler('user', 'password', server.url_base,
+                              server.kb_name, rows_per_page=50)
+
+        revisions = get_revisions(gxcrawler.get_data(day, day))
+        async_revisions = get_revisions(get_async_data(
+            server, day, day, rows_per_page=50))
+
+        assert len(revisions) == 74
+        assert len({rev['revision_build'] for rev in revisions}) == 74
+        assert async_revisions == revisions
+        # The limit found is the page size of the next calls
+        assert gxcrawler.rows_per_page == 25
+        assert len(get_revisions(gxcrawler.get_data(day, day))) == 74
+
+        adaptive = GxCrawler('user', 'password', server.url_base,
+                             server.kb_name, adaptive_page_size=True)
+        assert get_revisions(adaptive.get_data(day, day)) == revisions
+        assert adaptive.rows_per_page == 25
@@ -0,0 +1,352 @@
+'''
+Tests of the schema, of the writing and of the export of DataBase
+'''
+import sqlite3
+import datetime
+import collections
+
+import pytest
+
+from database import DataBase
+
+from conftest import make_revision
+
+
+# Schema of the first version, without revision_kb, rollups, full text
+# index and the unique index of revision_objects
+BASELINE_SCHEMA = '''
+    CREATE TABLE revision(
+        revision_build INTEGER PRIMARY KEY,
+        revision_date TEXT,
+        revision_seconds INTEGER,
+        revision_user TEXT,
+        revision_comment TEXT,
+        revision_name TEXT,
+        revision_operation TEXT
+    );
+
+    CREATE TABLE revision_objects(
+        revision_build INTEGER,
+        object_type TEXT,
+        object_name TEXT,
+        object_gu_id TEXT,
+        object_entity_id INTEGER,
+        object_operation TEXT,
+        FOREIGN KEY(revision_build) REFERENCES revision(revision_build)
+    );
+'''
+
+
+def get_rollups(database):
+    '''
+    Rows of the rollup tables
+    '''
+    return (
+        database.conn.execute(
+            'SELECT * FROM rollup_user_day ORDER BY 1, 2, 3').fetchall(),
+        database.conn.execute(
+            'SELECT * FROM rollup_object_type_day ORDER BY 1, 2, 3, 4'
+        ).fetchall())
+
+
+def assert_rollups_consistent(database):
+    '''
+    The rollups updated by the writes are the ones computed again
+    '''
+    rollups = get_rollups(database)
+    database.rebuild_rollups()
+    assert get_rollups(database) == rollups
+
+
+@pytest.fixture
+def baseline_path(tmp_path):
+    '''
+    Database of the first version with three revisions, one of them with
+    an object repeated
+    '''
+    path = str(tmp_path / 'database.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    for build in (1, 2, 3):
+        conn.execute(
+            'INSERT INTO revision VALUES(?, ?, ?, ?, ?, ?, ?)',
+            (build, '11/02/20 10:00 AM', build, f'user{build % 2}',
+             f'Fix invoice {build}', f'Revision {build}', 'Commit'))
+        conn.execute(
+            'INSERT INTO revision_objects VALUES(?, ?, ?, ?, ?, ?)',
+            (build, 'Procedure', f'Invoice{build}', f'guid-{build}', build,
+             'Update'))
+    conn.execute(
+        'INSERT INTO revision_objects VALUES(?, ?, ?, ?, ?, ?)',
+        (3, 'Procedure', 'Invoice3', 'guid-3', 3, 'Update'))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_insert_revisions_in_batches(tmp_path):
+    database = DataBase(str(tmp_path / 'database.db'))
+    database.construct_schema()
+    writes = []
+    database.add_hook(lambda event, data: writes.append(data['revisions']))
+
+    statistics = database.insert_revisions(
+        (make_revision(build) for build in range(10)), batch_size=4,
+        journal_mode='wal', synchronous='off')
+
+    # One transaction per batch
+    assert writes == [4, 4, 2]
+    assert statistics['revisions'] == 10
+    assert statistics['objects'] == 20
+    assert statistics['rows_per_second'] > 0
+    assert database.conn.execute(
+        'PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert database.conn.execute('PRAGMA synchronous').fetchone()[0] == 0
+
+    # The batch with a revision in database is rolled back, the previous
+    # batches are kept
+    with pytest.raises(sqlite3.IntegrityError):
+        database.insert_revisions(
+            [make_revision(build) for build in (10, 11, 3)], batch_size=2)
+    assert database.conn.execute(
+        'SELECT COUNT(*) FROM revision').fetchone()[0] == 12
+
+    with pytest.raises(ValueError):
+        database.insert_revisions([], journal_mode='fast')
+
+
+def test_migrate_baseline_schema(baseline_path):
+    database = DataBase(baseline_path)
+    database.conn.execute('PRAGMA foreign_keys=ON')
+    database.construct_schema()
+
+    assert database.get_storage() == 'flat'
+    revision = database.get_revision(3)
+    assert revision['revision_kb'] == ''
+    assert revision['revision_comment'] == 'Fix invoice 3'
+    assert len(revision['revision_objects']) == 1
+    assert [rev['revision_build'] for rev in database.search('invoice')] == \
+        [1, 2, 3]
+    day = datetime.date(2020, 11, 2)
+    assert sum(row['revisions'] for row in
+               database.get_activity_by_user(day, day)) == 3
+    assert_rollups_consistent(database)
+
+    # The objects reference the key of revision_kb and revision_build
+    database.insert_revisions([make_revision(4), make_revision(4, 'Other')])
+    assert database.get_last_revision()['revision_build'] == 4
+    assert database.conn.execute('PRAGMA foreign_key_check').fetchall() == []
+    with pytest.raises(sqlite3.IntegrityError):
+        database.insert_revisions([make_revision(4)])
+
+    database.construct_schema()
+    assert len(database.get_revisions([1, 2, 3, 4])) == 4
+    assert len(database.get_revisions([4], revision_kb='Other')[0]
+               ['revision_objects']) == 2
+
+
+def test_migrate_baseline_to_normalized(baseline_path):
+    database = DataBase(baseline_path)
+    database.construct_schema()
+    revisions = database.get_revisions([1, 2, 3])
+
+    database.migrate_storage('normalized')
+    assert database.get_storage() == 'normalized'
+    assert database.get_revisions([1, 2, 3]) == revisions
+
+    database.migrate_storage('flat')
+    assert database.get_revisions([1, 2, 3]) == revisions
+
+
+def test_normalized_storage_stores_objects_once(tmp_path):
+    revisions = [make_revision(build, objects=3) for build in range(40)]
+    flat = DataBase(str(tmp_path / 'flat.db'))
+    flat.construct_schema('flat')
+    flat.insert_revisions(revisions)
+    normalized = DataBase(str(tmp_path / 'normalized.db'))
+    normalized.construct_schema('normalized')
+    normalized.insert_revisions(revisions, batch_size=7)
+
+    assert normalized.get_revisions(range(40)) == \
+        flat.get_revisions(range(40))
+    # The objects repeated by the revisions are rows of objects once
+    objects = {(rev_obj['object_gu_id'], rev_obj['object_type'])
+               for rev in revisions for rev_obj in rev['revision_objects']}
+    assert normalized.conn.execute(
+        'SELECT COUNT(*) FROM objects').fetchone()[0] == len(objects) == 12
+    assert normalized.conn.execute(
+        'SELECT COUNT(*) FROM object_types').fetchone()[0] == 2
+    assert normalized.conn.execute(
+        'SELECT COUNT(*) FROM revision_objects').fetchone()[0] == 120
+
+
+def test_history_queries(tmp_path):
+    database = DataBase(str(tmp_path / 'database.db'))
+    database.construct_schema()
+    revisions = [make_revision(build, user=f'user{build % 3}',
+                               day=1 + build % 2)
+                 for build in range(30)]
+    database.insert_revisions(revisions +
+                              [make_revision(build, 'B', user='user1')
+                               for build in range(3)],
+                              defer_indexes=True)
+    assert database.has_indexes()
+
+    history = database.get_object_history('guid-2', revision_kb='')
+    assert [rev['revision_build'] for rev in history] == sorted(
+        (rev['revision_build'] for rev in revisions
+         if any(rev_obj['object_gu_id'] == 'guid-2'
+                for rev_obj in rev['revision_objects'])), reverse=True)
+    assert {rev['object_name'] for rev in history} == {'Object2'}
+    assert len(database.get_object_history('guid-2')) == len(history) + 2
+
+    day = datetime.date(2020, 11, 2)
+    assert [rev['revision_build'] for rev in database.get_revisions_by_user(
+        'user1', day, day, revision_kb='')] == [
+        build for build in range(29, -1, -1) if build % 3 == 1 and build % 2]
+    assert len(database.get_revisions_by_user('user1')) == 10 + 3
+
+    changes = collections.Counter(
+        rev_obj['object_gu_id'] for rev in revisions
+        for rev_obj in rev['revision_objects'])
+    most_changed = database.get_most_changed_objects(
+        datetime.date(2020, 11, 1), day, limit=3, revision_kb='')
+    assert [obj['changes'] for obj in most_changed] == \
+        [count for _, count in changes.most_common(3)]
+    assert all(changes[obj['object_gu_id']] == obj['changes']
+               for obj in most_changed)
+
+    # The same results without the secondary indexes
+    database.drop_indexes()
+    assert not database.has_indexes()
+    assert database.get_object_history('guid-2', revision_kb='') == history
+
+
+def test_search_comments_and_object_names(tmp_path):
+    database = DataBase(str(tmp_path / 'database.db'))
+    database.construct_schema()
+    database.insert_revisions([
+        make_revision(1, comment='Fix invoice total'),
+        make_revision(2, comment='Ajuste de cálculo'),
+        make_revision(3, comment='Refactor'),
+        make_revision(4, 'B', comment='Fix invoice'),
+    ])
+
+    def search(text, **kwargs):
+        return sorted((rev['revision_kb'], rev['revision_build'])
+                      for rev in database.search(text, **kwargs))
+
+    assert search('invoice') == [('', 1), ('B', 4)]
+    assert search('INVOICE', revision_kb='') == [('', 1)]
+    assert search('inv*') == [('', 1), ('B', 4)]
+    # Without diacritics
+    assert search('calculo') == [('', 2)]
+    # Names of the objects, Object3 and Object4 of the builds 3 and 4
+    assert search('object4') == [('', 3), ('B', 4)]
+    # The characters of the query syntax are searched as text
+    assert search('fix "invoice') == [('', 1), ('B', 4)]
+    assert search('revision_comment: refactor OR fix', raw=True) == \
+        [('', 1), ('', 3), ('B', 4)]
+    assert database.search('invoice')[0]['revision_objects']
+
+
+def test_rollups_of_activity_and_churn(tmp_path):
+    database = DataBase(str(tmp_path / 'database.db'))
+    database.construct_schema()
+    revisions = [make_revision(build, user=f'user{build % 2}',
+                               day=1 + build % 3, objects=1 + build % 3)
+                 for build in range(12)]
+    database.insert_revisions(revisions, batch_size=5)
+
+    day = datetime.date(2020, 11, 2)
+    activity = database.get_activity_by_user(day, day)
+    assert [(row['revision_user'], row['revisions'], row['objects'])
+            for row in activity] == [('user0', 2, 4), ('user1', 2, 4)]
+    assert database.get_activity_by_user(
+        day, day, revision_user='user1', revision_kb='B') == []
+
+    churn = database.get_object_churn(datetime.date(2020, 11, 1),
+                                      datetime.date(2020, 11, 3),
+                                      object_type='Procedure')
+    assert sum(row['changes'] for row in churn) == sum(
+        rev_obj['object_type'] == 'Procedure'
+        for rev in revisions for rev_obj in rev['revision_objects'])
+    assert_rollups_consistent(database)
+
+
+@pytest.mark.parametrize('storage', DataBase.STORAGES)
+def test_upsert_keeps_rollups_and_search(tmp_path, storage):
+    database = DataBase(str(tmp_path / 'database.db'))
+    database.construct_schema(storage)
+    database.insert_revisions([make_revision(build) for build in range(10)],
+                              batch_size=4)
+
+    # Overlapping revisions, changed and repeated in the batch
+    database.insert_revisions(
+        [make_revision(build, user='user9', objects=3, comment='Refactor')
+         for build in range(5, 15)] + [make_revision(14, day=3)],
+        batch_size=4, upsert=True)
+
+    assert database.conn.execute(
+        'SELECT COUNT(*) FROM revision').fetchone()[0] == 15
+    assert len(database.get_revision(7)['revision_objects']) == 3
+    assert database.get_revision(14)['revision_date'].startswith('11/03')
+    assert {rev['revision_build'] for rev in database.search(
+        'refactor', limit=100)} == set(range(5, 15)) - {14}
+    assert {rev['revision_build'] for rev in database.search(
+        'change', limit=100)} == set(range(5)) | {14}
+    assert_rollups_consistent(database)
+
+    # Without upsert a revision in database is an error
+    with pytest.raises(sqlite3.IntegrityError):
+        database.insert_revisions([make_revision(1)])
+    assert_rollups_consistent(database)
+
+
+def test_export_since_build_by_knowledge_base(tmp_path):
+    database = DataBase(str(tmp_path / 'database.db'))
+    database.construct_schema()
+    database.insert_revisions(
+        [make_revision(build, 'A') for build in range(1000, 1005)] +
+        [make_revision(build, 'B') for build in range(1, 4)])
+
+    statistics = database.export_revisions(str(tmp_path / 'all.jsonl.gz'))
+    assert statistics['revisions'] == 8
+    assert statistics['last_builds'] == {'A': 1004, 'B': 3}
+
+    database.insert_revisions([make_revision(4, 'B')])
+    statistics = database.export_revisions(
+        str(tmp_path / 'new.jsonl.gz'), since_build=statistics['last_builds'])
+    assert statistics['revisions'] == 1
+    assert statistics['last_builds'] == {'A': 1004, 'B': 4}
+
+    # A build of a knowledge base does not filter the other ones
+    with pytest.raises(ValueError):
+        database.export_revisions(str(tmp_path / 'new.jsonl.gz'),
+                                  since_build=1004)
+    assert database.export_revisions(
+        str(tmp_path / 'new.jsonl.gz'), since_build=2,
+        revision_kb='B')['revisions'] == 2
+
+
+@pytest.mark.parametrize('extension', ['.jsonl.gz', '.parquet'])
+def test_export_import_round_trip(tmp_path, extension):
+    if extension == '.parquet':
+        pytest.importorskip('pyarrow')
+    database = DataBase(str(tmp_path / 'database.db'))
+    database.construct_schema()
+    database.insert_revisions(
+        [make_revision(build, 'A') for build in range(1, 30)] +
+        [make_revision(build, 'B', objects=0) for build in range(1, 5)] +
+        [make_revision(build) for build in range(1, 3)])
+    path = str(tmp_path / f'revisions{extension}')
+    database.export_revisions(path, chunk_size=7)
+
+    imported = DataBase(str(tmp_path / 'imported.db'))
+    statistics = imported.import_revisions(path, batch_size=5)
+
+    assert statistics['revisions'] == 35
+    for revision_kb in ('A', 'B', ''):
+        assert imported.get_revisions(range(1, 30), revision_kb) == \
+            database.get_revisions(range(1, 30), revision_kb)
+    assert_rollups_consistent(imported)
@@ -0,0 +1,74 @@
+'''
+Tests of the hooks of the crawler and of the metrics of the capture
+'''
+import json
+
+from gxcrawler import GxCrawler
+from process import Process
+from metrics import Metrics
+
+from conftest import LAST_DAY, get_day
+
+
+def test_hooks_of_requests_and_pages(server):
+    day = get_day(LAST_DAY)
+    gxcrawler = GxCrawler('user', 'password', server.url_base,
+                          server.kb_name)
+    events = []
+
+    def hook(event, data):
+        events.append((event, data.get('endpoint'), data.get('status')))
+
+    gxcrawler.add_hook(hook)
+    gxcrawler.get_data(day, day)
+
+    assert events.count(('request', 'objects', 200)) == 20
+    # Two full pages, and the empty page that ends the paging
+    assert events.count(('request', 'grid', 200)) == 3
+    assert events.count(('page', None, None)) == 2
+    assert {endpoint for _, endpoint, _ in events} == \
+        {'login', 'grid', 'objects', None}
+
+    gxcrawler.remove_hook(hook)
+    events.clear()
+    gxcrawler.get_data(day, day)
+    assert events == []
+
+
+def test_process_exports_metrics(server, config, database_path, tmp_path):
+    day = get_day(LAST_DAY)
+    path = str(tmp_path / 'metrics.json')
+    server.failed_builds.add(server.get_revisions(LAST_DAY, LAST_DAY)[0]
+                             ['build'])
+    process = Process(database_path=database_path, max_retries=0,
+                      metrics='json', metrics_file=path)
+
+    process.capture_data(day, day, config=config)
+
+    with open(path) as f_metrics:
+        summary = json.load(f_metrics)
+    assert summary['endpoints']['objects']['requests'] == 20
+    assert summary['endpoints']['objects']['errors'] == 1
+    assert summary['pages'] == 2
+    assert summary['rows'] == 20
+    assert summary['revisions'] == 19
+    assert summary['objects'] == 57
+    assert process.metrics.summary()['revisions'] == 19
+    assert 'gxcrawler_requests_total{endpoint="objects"} 20' in \
+        process.metrics.to_prometheus()
+
+
+def test_metrics_quantiles():
+    metrics = Metrics()
+    for seconds in (0.001, 0.02, 0.02, 0.3, 3.0):
+        metrics('request', {'endpoint': 'grid', 'status': 200,
+                            'seconds': seconds, 'bytes': 10,
+                            'retry': seconds > 1})
+
+    grid = metrics.summary()['endpoints']['grid']
+    assert grid['requests'] == 5
+    assert grid['retries'] == 1
+    assert grid['bytes'] == 50
+    # Upper bounds of the buckets
+    assert grid['p50_seconds'] == 0.025
+    assert grid['p99_seconds'] == 5.0
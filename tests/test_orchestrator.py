@@ -0,0 +1,34 @@
+'''
+Tests of Orchestrator with several knowledge bases in one database
+'''
+import datetime
+
+from orchestrator import Orchestrator
+from database import DataBase
+
+from conftest import LAST_DAY, get_day, get_builds
+
+FIRST_DAY = LAST_DAY - datetime.timedelta(days=2)
+
+
+def test_knowledge_bases_with_the_same_builds(server, database_path):
+    # The fake server answers the same grid to both knowledge bases
+    targets = [{'url': server.url_base, 'kb_name': kb_name, 'user': 'user',
+                'password': 'password'} for kb_name in ('App', 'Backoffice')]
+    orchestrator = Orchestrator(targets, workers_per_server=2)
+    database = DataBase(database_path)
+    database.conn.execute('PRAGMA foreign_keys=ON')
+
+    statistics = orchestrator.run(get_day(FIRST_DAY), get_day(LAST_DAY),
+                                  database=database)
+
+    builds = get_builds(server, FIRST_DAY, LAST_DAY)
+    assert statistics['revisions'] == 2 * len(builds)
+    assert orchestrator.failed_partitions == []
+    assert orchestrator.revisions == {'App': 60, 'Backoffice': 60}
+    for kb_name in ('App', 'Backoffice'):
+        revisions = database.get_revisions(builds, revision_kb=kb_name)
+        assert [rev['revision_build'] for rev in revisions] == builds
+        assert all(rev['revision_kb'] == kb_name and
+                   len(rev['revision_objects']) == 3 for rev in revisions)
+    assert database.conn.execute('PRAGMA foreign_key_check').fetchall() == []
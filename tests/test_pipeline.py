@@ -0,0 +1,49 @@
+'''
+Tests of the capture in stages of Pipeline
+'''
+import datetime
+
+from pipeline import Pipeline
+from process import Process
+from database import DataBase
+
+from conftest import LAST_DAY, get_day, get_builds, count_revisions
+
+FIRST_DAY = LAST_DAY - datetime.timedelta(days=2)
+
+
+def test_pipeline_writes_the_period(server, config, database_path):
+    pipeline = Pipeline(detail_workers=4, queue_size=5, batch_size=7)
+
+    statistics = pipeline.run(get_day(FIRST_DAY), get_day(LAST_DAY),
+                              config=config, database=DataBase(database_path))
+
+    assert statistics['revisions'] == 60
+    assert statistics['objects'] == 180
+    assert pipeline.failed_revisions == []
+    database = DataBase(database_path)
+    builds = get_builds(server, FIRST_DAY, LAST_DAY)
+    assert [rev['revision_build']
+            for rev in database.get_revisions(builds)] == builds
+
+    # Only the revisions after the build
+    pipeline.run(get_day(FIRST_DAY), get_day(LAST_DAY), config=config,
+                 database=DataBase(database_path), since_build=builds[0])
+    assert count_revisions(database_path) == 60
+
+
+def test_pipeline_failed_revision_returned(server, config, database_path,
+                                           capsys):
+    failed_build = get_builds(server, LAST_DAY, LAST_DAY)[7]
+    server.failed_builds.add(failed_build)
+    process = Process(database_path=database_path, pipeline=True,
+                      max_workers=4, max_retries=0)
+
+    failed = process.capture_data(get_day(LAST_DAY), get_day(LAST_DAY),
+                                  config=config)
+
+    assert [failure['revision']['revision_build']
+            for failure in failed] == [failed_build]
+    assert count_revisions(database_path) == 19
+    # Reported once, by Process
+    assert capsys.readouterr().out.count(str(failed_build)) == 1
@@ -0,0 +1,151 @@
+'''
+Tests of the capture and of the sync of Process, with failures of the
+objects of revisions
+'''
+import sqlite3
+import datetime
+
+import pytest
+
+from process import Process
+from database import DataBase
+from fakeserver import FakeGxServer
+
+from conftest import get_day, get_builds, count_revisions
+
+
+@pytest.fixture
+def server():
+    '''
+    Fake server with revisions until today, for sync
+    '''
+    with FakeGxServer(revisions_per_day=20) as fake:
+        yield fake
+
+
+def capture_first_day(server, config, path, **kwargs):
+    '''
+    Process with the revisions of two days ago in database
+    '''
+    process = Process(database_path=path, max_retries=0, **kwargs)
+    day = get_day(server.last_day - datetime.timedelta(days=2))
+    assert process.capture_data(day, day, config=config) == []
+    assert count_revisions(path) == 20
+    return process
+
+
+def get_journal_mode(path):
+    '''
+    Journal mode of the database of the path
+    '''
+    database = DataBase(path)
+    try:
+        return database.conn.execute('PRAGMA journal_mode').fetchone()[0]
+    finally:
+        database.conn.close()
+
+
+def test_capture_keeps_journal_mode(server, config, database_path):
+    day = get_day(server.last_day)
+
+    Process(database_path=database_path).capture_data(day, day,
+                                                      config=config)
+    assert count_revisions(database_path) == 20
+    assert get_journal_mode(database_path) == 'delete'
+
+    # The journal mode of the ingestion is chosen by the caller
+    Process(database_path=database_path, journal_mode='WAL',
+            upsert=True).capture_data(day, day, config=config)
+    assert get_journal_mode(database_path) == 'wal'
+
+
+def test_sync_new_revisions(server, config, database_path):
+    process = capture_first_day(server, config, database_path, max_workers=4)
+    objects = server.requests['objects']
+
+    assert process.sync(config=config) == []
+
+    assert count_revisions(database_path) == 60
+    # The objects only of the new revisions
+    assert server.requests['objects'] - objects == 40
+
+
+@pytest.mark.parametrize('options', [{'max_workers': 4},
+                                     {'stream': True, 'batch_size': 10}])
+def test_sync_failed_revision_requested_again(server, config, database_path,
+                                              options):
+    process = capture_first_day(server, config, database_path, **options)
+    builds = get_builds(server, server.last_day - datetime.timedelta(days=1),
+                        server.last_day)
+    server.failed_builds.add(builds[30])
+
+    failed = process.sync(config=config)
+
+    assert [failure['revision']['revision_build']
+            for failure in failed] == [builds[30]]
+    assert process.failed_revisions == failed
+    # The revisions after the failed one are left to the next sync
+    assert count_revisions(database_path) == 20 + len(builds[31:])
+
+    server.failed_builds.clear()
+    assert process.sync(config=config) == []
+    assert count_revisions(database_path) == 60
+
+
+def test_interrupted_sync_leaves_no_gap(server, config, database_path,
+                                        monkeypatch):
+    process = capture_first_day(server, config, database_path, stream=True,
+                                batch_size=10)
+    builds = get_builds(server, server.last_day - datetime.timedelta(days=1),
+                        server.last_day)
+    write_batch = DataBase._DataBase__write_batch
+    batches = []
+
+    def fail_second_batch(database, *args, **kwargs):
+        batches.append(args)
+        if len(batches) == 2:
+            raise sqlite3.OperationalError('disk I/O error')
+        return write_batch(database, *args, **kwargs)
+
+    monkeypatch.setattr(DataBase, '_DataBase__write_batch',
+                        fail_second_batch)
+    with pytest.raises(sqlite3.OperationalError):
+        process.sync(config=config)
+    # Only the oldest new revisions, the next sync starts after them
+    database = DataBase(database_path)
+    assert sorted(rev['revision_build'] for rev in database.get_revisions(
+        builds)) == sorted(builds[-10:])
+    database.conn.close()
+
+    monkeypatch.undo()
+    assert process.sync(config=config) == []
+    assert count_revisions(database_path) == 60
+
+
+def test_capture_returns_failed_revisions(server, config, database_path):
+    day = server.last_day - datetime.timedelta(days=2)
+    failed_build = get_builds(server, day, day)[3]
+    server.failed_builds.add(failed_build)
+    process = Process(database_path=database_path, max_workers=4,
+                      max_retries=0)
+
+    failed = process.capture_data(get_day(day), get_day(day), config=config)
+
+    assert [failure['revision']['revision_build']
+            for failure in failed] == [failed_build]
+    assert count_revisions(database_path) == 19
+
+
+def test_watch_writes_new_revisions(server, config, database_path):
+    process = capture_first_day(server, config, database_path, max_workers=4)
+
+    revisions = process.watch(interval=0, config=config, max_polls=2)
+
+    assert revisions == 40
+    assert count_revisions(database_path) == 60
+
+    # Without new revisions, only the first page of the grid is requested
+    requests = dict(server.requests)
+    assert process.watch(interval=0, config=config, max_polls=1) == 0
+    assert server.requests['grid'] - requests['grid'] == 1
+    assert server.requests['objects'] == requests['objects']
@@ -0,0 +1,51 @@
+'''
+Tests of the records read as the dicts of the parser of previous versions
+'''
+from records import Revision
+from response_parser import (ResponseParser, REVISION_FIELDS, OBJECT_FIELDS,
+                             REVISION_KEYS, OBJECT_KEYS)
+
+
+def get_values(fields, rows):
+    '''
+    gxValues of the rows, with the numbers as strings as in the responses
+    '''
+    return {f'{prefix}{str(row).zfill(4)}': f'{field} {row}'
+            if not field.endswith(('_seconds', '_build', '_entity_id'))
+            else str(row * 10)
+            for row in range(1, rows + 1) for prefix, field in fields}
+
+
+def get_dict(values, keys, row, integers):
+    '''
+    Dict of the row as built by the parser of previous versions
+    '''
+    return {field: int(values[key]) if field in integers else values[key]
+            for key, field in keys.get(row)}
+
+
+def test_revision_same_dict_as_parser():
+    parser = ResponseParser()
+    grid = {'gxValues': [get_values(REVISION_FIELDS, 2)]}
+    objects = {'gxValues': [{}, get_values(OBJECT_FIELDS, 3)]}
+
+    for row, revision in parser.get_rows(grid, 2):
+        revision['revision_objects'] = parser.get_objects(objects)
+        expected = get_dict(grid['gxValues'][0], REVISION_KEYS, row,
+                            Revision.INTEGERS)
+        expected['revision_objects'] = [
+            get_dict(objects['gxValues'][1], OBJECT_KEYS, obj_row,
+                     ('object_entity_id',))
+            for obj_row in range(1, 4)]
+
+        assert dict(revision) == expected
+        assert list(revision) == list(expected)
+        assert len(revision) == len(expected)
+        assert revision.to_dict() == expected
+        assert 'revision_kb' not in revision
+        assert revision['revision_kb'] == ''
+
+        # The knowledge base is a key once informed
+        revision['revision_kb'] = 'App'
+        assert dict(revision) == {**expected, 'revision_kb': 'App'}
+        assert Revision.from_dict(revision.to_dict()) == revision
@@ -0,0 +1,28 @@
+'''
+Tests of GxSession shared between crawlers
+'''
+from gxcrawler import GxCrawler
+from session import GxSession
+
+from conftest import LAST_DAY, get_day
+
+
+def test_session_reused_and_logged_in_again(server):
+    day = get_day(LAST_DAY)
+    session = GxSession('user', 'password', server.url_base, server.kb_name)
+    crawlers = [GxCrawler('user', 'password', server.url_base,
+                          server.kb_name, session=session)
+                for _ in range(2)]
+
+    for gxcrawler in crawlers:
+        assert len(gxcrawler.get_data(day, day)[0]) == 10
+    # One login for the crawlers and the calls
+    assert session.logins == 1
+    assert server.requests['login'] == 1
+
+    server.expire_sessions()
+    revisions = [rev for page in crawlers[0].get_data(day, day)
+                 for rev in page]
+    assert len(revisions) == 20
+    assert all(len(rev['revision_objects']) == 3 for rev in revisions)
+    assert session.logins == 2
@@ -0,0 +1,85 @@
+'''
+Tests of AdaptiveLimiter, of the backoff and of the retries of the
+session against an overloaded server
+'''
+import random
+import threading
+
+from gxcrawler import GxCrawler
+from session import GxSession
+from fakeserver import FakeGxServer
+from throttle import AdaptiveLimiter, get_backoff
+
+from conftest import LAST_DAY, get_day
+
+
+def test_limiter_grows_and_halves():
+    limiter = AdaptiveLimiter(initial=2, maximum=4, latency_target=0.1)
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(0.01)
+    assert limiter.limit == 4
+
+    for _ in range(3):
+        limiter.acquire()
+    limiter.release(error=True)
+    assert limiter.limit == 2
+    # The requests in flight were made with the previous limit
+    limiter.release(0.5)
+    limiter.release(error=True)
+    assert limiter.limit == 2
+    assert limiter.decreases == 1
+
+    limiter.acquire()
+    limiter.release(0.5)
+    assert limiter.limit == 1
+    limiter.acquire()
+    limiter.release(error=True)
+    assert limiter.limit == limiter.minimum == 1
+
+
+def test_limiter_waits_for_a_slot():
+    limiter = AdaptiveLimiter(initial=1, maximum=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release(0.01)
+    assert acquired.wait(1)
+    thread.join()
+    assert limiter.in_flight == 1
+
+
+def test_backoff_exponential_with_jitter():
+    random.seed(1)
+    for attempt in range(1, 10):
+        waits = [get_backoff(attempt, 0.5, 4.0) for _ in range(50)]
+        limit = min(4.0, 0.5 * 2 ** (attempt - 1))
+        assert all(0 <= wait <= limit for wait in waits)
+        assert max(waits) > limit / 2
+
+
+def test_retries_of_overloaded_server():
+    with FakeGxServer(revisions_per_day=20, last_day=LAST_DAY,
+                      latency=0.01, max_in_flight=2) as server:
+        day = get_day(LAST_DAY)
+        limiter = AdaptiveLimiter(initial=8, maximum=8)
+        session = GxSession('user', 'password', server.url_base,
+                            server.kb_name, max_retries=20, backoff=0.01,
+                            max_backoff=0.1, limiter=limiter)
+        gxcrawler = GxCrawler('user', 'password', server.url_base,
+                              server.kb_name, max_workers=8, session=session)
+
+        revisions = [rev for page in gxcrawler.get_data(day, day)
+                     for rev in page]
+
+        assert server.requests['errors'] > 0
+        assert len(revisions) == 20
+        assert gxcrawler.failed_revisions == []
+        assert limiter.decreases > 0